@@ -3,15 +3,18 @@ Device.py
 
 This module provides a class to simulate a network device.
 This device can be used to test a system monitoring the health of devices.
+By default each poll is an independent draw, given a mean time to repair
+the device instead stays up or down between polls, failing and recovering
+like a two state Markov chain.
 
 Classes:
     Device: A simulated network device.
 
 """
 
-from typing import Dict, Union
-from random import uniform
-import json
+from typing import Dict, Optional, Union
+from random import Random, random, uniform
+from .encoding import dumps
 
 class Device:
     """
@@ -23,9 +26,12 @@ class Device:
         ipAddress (str): This devices own address.
         isAwake (bool): The current status of the device.
             (True is up, False is Down)
+        isGateway (bool): Whether other devices are reached through this one.
         Availability (float): A value between 0 and 1 representing a devices expected availability.
+        gateway (Device): The device this one is reached through, while it is down so is this one.
     """
-    def __init__(self, id: int, name: str, ipAddress: str, **kwargs: Dict[str, float]) -> None:
+    def __init__(self, id: int, name: str, ipAddress: str, gateway: Optional['Device'] = None,
+                 rng: Optional[Random] = None, **kwargs: Dict[str, float]) -> None:
         """
         Constructor for the Device object.
 
@@ -33,40 +39,95 @@ class Device:
             id (int): The unique identifier for this device.
             name (str): A user friendly name to identify this device.
             ipAddress (str): This devices own address.
+            gateway (Device, optional): The device this one is reached through, e.g. its subnets router.
+            rng (random.Random, optional): Random generator to draw from, for repeatable devices.
+                Defaults to the shared random module.
             **kwargs:
                 Keyword Arguments:
                 avail (float): A value between 0 and 1 representing a devices expected availability.
+                mttr (float): Mean polls a device stays down for once failed, at least 1.
+                    Makes the status persist between polls.
+                mtbf (float): Mean polls a device stays up for between failures, requires mttr.
+                    Defaults to the value giving avail, and replaces avail if given.
 
         Returns:
             None
         
         Raises:
-            ValueError: If Keyword Availability is named and outside of range 0-1.
+            ValueError: If Keyword Availability is named and outside of range 0-1,
+                or the mean times are out of range.
         """
         # Validate ID
         if isinstance(id, int):
             pass
         else:
             raise TypeError(f'Expected id to be int, got {type(id).__name__}')
-        
+
+        self.__random = rng.random if rng is not None else random
+
         # Validate avail if passed as arg.
         try:
-            avail: float = float(kwargs.get('avail', uniform(0.8, 1)))
+            avail: float = float(kwargs.get('avail', (rng.uniform if rng is not None else uniform)(0.8, 1)))
+            mttr: Optional[float] = None if kwargs.get('mttr') is None else float(kwargs['mttr'])
+            mtbf: Optional[float] = None if kwargs.get('mtbf') is None else float(kwargs['mtbf'])
         except ValueError:
-            raise ValueError(f'Could not cast avail as float.')
-        
+            raise ValueError(f'Could not cast avail, mttr or mtbf as float.')
+
+        if mtbf is not None:
+            if mttr is None or mtbf <= 0:
+                raise ValueError('mtbf must be above 0, and given with mttr.')
+            avail = mtbf / (mtbf + mttr)
+
         if ((avail > 1) or (avail < 0)):
             raise ValueError(f'Attempted to create a device with {round(avail*100)}% availability.')
 
+        # Chances per poll of an up device failing, and a down device being repaired.
+        self.__failChance: Optional[float] = None
+        self.__repairChance: Optional[float] = None
+        if mttr is not None:
+            if mttr < 1:
+                raise ValueError('mttr must be at least 1 poll.')
+            self.__repairChance = 1 / mttr if avail else 0.0 # Devices with no availability stay down.
+            # Failing once every mtbf polls keeps the device up for avail of the time.
+            self.__failChance = 1 / mtbf if mtbf is not None else (1 - avail) / (avail * mttr) if avail else 1.0
+
         self.__id: int = id
         self.__name: str = name
         self.__ipAddress: str = ipAddress
         self.__availability: float = avail
-        self.__isAwake: bool = self.generateStatus()
+        self.__gateway: Optional[Device] = gateway
+        self.__isGateway: bool = False
+        if gateway is not None:
+            gateway.__isGateway = True
+        self.__isAwake: bool = self.__random() <= avail # Start in the long run state.
+        self.__json: tuple = (dumps(self.__record(False)), dumps(self.__record(True))) # Encoded once per status.
+
+    @property
+    def id(self) -> int:
+        """
+        The unique identifier for this device.
+        """
+        return self.__id
+
+    @property
+    def isAwake(self) -> bool:
+        """
+        The status of the device after its latest poll, without polling it.
+        """
+        return self.__isAwake
+
+    @property
+    def isGateway(self) -> bool:
+        """
+        Whether other devices are reached through this one.
+        """
+        return self.__isGateway
 
     def generateStatus(self) -> bool:
         """
-        Randomly generate if a device is up or down based on its expected availability.
+        Generate if a device is up or down based on its expected availability.
+        Without a mean time to repair every poll is an independent random chance,
+        otherwise an up device fails, or a down device is repaired, with a chance per poll.
 
         Args:
             None
@@ -74,12 +135,72 @@ class Device:
         Returns:
             bool: The status of the device based on a random chance.
         """
-        roll: float = uniform(0, 1) # generate random value.
-        if roll > self.__availability: # If value is higher than availability, device is down.
-            return False
-        return True
+        roll: float = self.__random() # generate random value.
+        if self.__repairChance is None:
+            self.__isAwake = roll <= self.__availability # If value is higher than availability, device is down.
+        elif self.__isAwake:
+            self.__isAwake = roll >= self.__failChance
+        else:
+            self.__isAwake = roll < self.__repairChance
+        return self.__isAwake
 
 
+    def poll(self) -> bool:
+        """
+        Simulate the device getting a generic request.
+        Generates a new status, reported down while the devices gateway is down.
+
+        Args:
+            None
+
+        Returns:
+            bool: The reported status of the device.
+        """
+        if self.__gateway is None:
+            return self.generateStatus()
+        return self.generateStatus() and self.__gateway.__isAwake
+
+    def report(self) -> bool:
+        """
+        The reported status of the device for a poll whose gateways have already been drawn.
+        Gateways keep the status drawn for this poll, every other device draws its own,
+        and is reported down while its gateway is down.
+
+        Args:
+            None
+
+        Returns:
+            bool: The reported status of the device.
+        """
+        if self.__isGateway:
+            up: bool = self.__isAwake
+        else:
+            up: bool = self.generateStatus()
+        return up and (self.__gateway is None or self.__gateway.__isAwake)
+
+    def __record(self, status: bool) -> Dict[str, Union[int, str, bool]]:
+        """
+        The devices information with a given status.
+        """
+        return {
+            'id': self.__id,
+            'name': self.__name,
+            'ip_address': self.__ipAddress,
+            'status': status
+        }
+
+    def metadata(self) -> Dict[str, Union[int, str]]:
+        """
+        The devices information without its status, which never changes.
+
+        Args:
+            None
+
+        Returns:
+            Dict[str, (int|str)]: The id, name and ip_address of the device.
+        """
+        return {'id': self.__id, 'name': self.__name, 'ip_address': self.__ipAddress}
+
     def __call__(self) -> Dict[str, Union[int, str, bool]]:
         """
         Overloader for the inbuilt call method.
@@ -92,14 +213,49 @@ class Device:
         Returns:
             Dict[str, (int|str|bool)]: The current device information.
         """
-        deviceInfo: Dict[str, Union[int, str, bool]] = {
-            'id': self.__id,
-            'name': self.__name,
-            'ip_address': self.__ipAddress,
-            'status': self.generateStatus()
-        }
-        return deviceInfo
+        return self.__record(self.poll())
+
+    def toJson(self, status: Optional[bool] = None) -> str:
+        """
+        Generate a JSON string for the devices status.
+        The fields never change, so the JSON for each status is encoded once when the device is created.
+
+        Args:
+            status (bool, optional): The status to report. Defaults to polling the device.
+
+        Returns:
+            str: The same JSON as encoding.dumps(self()).
+        """
+        if status is None: # As poll, without the extra call on this hot path.
+            status = self.generateStatus()
+            if self.__gateway is not None:
+                status = status and self.__gateway.__isAwake
+        return self.__json[status]
     
+    def reportJson(self) -> str:
+        """
+        The JSON of the devices reported status, for a poll whose gateways have already been drawn.
+        The same as toJson(self.report()), in one call on the hot path of every poll.
+
+        Args:
+            None
+
+        Returns:
+            str: The same JSON as encoding.dumps of the reported status record.
+        """
+        status: bool = self.__isAwake
+        if not self.__isGateway: # As generateStatus, without the extra call.
+            roll: float = self.__random()
+            if self.__repairChance is None:
+                status = self.__isAwake = roll <= self.__availability
+            elif status:
+                status = self.__isAwake = roll >= self.__failChance
+            else:
+                status = self.__isAwake = roll < self.__repairChance
+        if self.__gateway is not None:
+            status = status and self.__gateway.__isAwake
+        return self.__json[status]
+
     def __repr__(self):
         """
         Generate a JSON string for the devices status.
@@ -111,4 +267,4 @@ class Device:
         Returns:
             str: A JSON string for the current status of the device.
         """
-        return json.dumps(self())
\ No newline at end of file
+        return self.toJson()
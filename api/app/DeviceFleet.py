@@ -0,0 +1,353 @@
+"""
+DeviceFleet.py
+
+This module provides a class to simulate a large fleet of network devices.
+Rather than one Device object per device, the fleet is stored as contiguous arrays
+and the status of every device is generated with a single vectorised draw.
+Like Device, given a mean time to repair the status of each device persists between polls,
+and with correlated failures a subnet is down whenever its router is.
+
+Classes:
+    DeviceFleet: A fleet of simulated network devices.
+
+"""
+
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+from ipaddress import IPv4Address
+from .encoding import STATUS_SUFFIXES, statusPrefix
+import numpy as np
+
+OCTETS: List[str] = [str(octet) for octet in range(256)] # Avoids formatting every address octet.
+GATEWAY_TYPE: str = 'Router' # With correlated failures, devices are reached through their subnets first router.
+
+class DeviceFleet:
+    """
+    A fleet of generic network enabled devices.
+    Each device is named '<type>_<id>', matching the names created by generateDevices.
+
+    Attributes:
+        ids (numpy.ndarray): The unique identifier of each device.
+        types (numpy.ndarray): Index into typeNames for each device.
+        typeNames (Tuple[str]): The device types used to prefix device names.
+        ipAddresses (numpy.ndarray): Each devices IPv4 address as an unsigned integer.
+        availabilities (numpy.ndarray): Values between 0 and 1 representing each devices expected availability.
+        gateways (numpy.ndarray): Index of the router each device is reached through, -1 if none.
+    """
+    def __init__(self, ids: Sequence[int], types: Sequence[int], typeNames: Sequence[str],
+                 ipAddresses: Sequence[int], availabilities: Sequence[float], seed: Optional[int] = None,
+                 mttr: Union[float, Sequence[float], None] = None, correlated: bool = False) -> None:
+        """
+        Constructor for the DeviceFleet object.
+
+        Args:
+            ids (Sequence[int]): The unique identifier of each device.
+            types (Sequence[int]): Index into typeNames for each device.
+            typeNames (Sequence[str]): The device types used to prefix device names.
+            ipAddresses (Sequence[int]): Each devices IPv4 address as an integer.
+            availabilities (Sequence[float]): Values between 0 and 1 for each device.
+            seed (int, optional): Seed for the random generator, for repeatable fleets.
+            mttr (float | Sequence[float], optional): Mean polls each device stays down for once failed,
+                at least 1. Makes statuses persist between polls. Defaults to an independent draw each poll.
+            correlated (bool): Take every device in a /24 subnet down while the subnets first router is down.
+
+        Returns:
+            None
+
+        Raises:
+            TypeError: If ids are not integers.
+            ValueError: If the arrays differ in length, an availability is outside of range 0-1,
+                or a mean time to repair is below 1.
+        """
+        ids = np.asarray(ids)
+        if ids.size and not np.issubdtype(ids.dtype, np.integer):
+            raise TypeError(f'Expected ids to be int, got {ids.dtype}')
+
+        availabilities = np.asarray(availabilities, dtype=np.float64)
+        if ((availabilities > 1) | (availabilities < 0)).any():
+            raise ValueError('Attempted to create a fleet with availability outside of 0-100%.')
+
+        lengths = {len(ids), len(types), len(ipAddresses), len(availabilities)}
+        if len(lengths) != 1:
+            raise ValueError('All device arrays must be the same length.')
+
+        self.__ids: np.ndarray = ids.astype(np.int64)
+        self.__types: np.ndarray = np.asarray(types, dtype=np.uint8)
+        self.__typeNames: tuple = tuple(typeNames)
+        self.__ipAddresses: np.ndarray = np.asarray(ipAddresses, dtype=np.uint32)
+        self.__availabilities: np.ndarray = availabilities
+        self.__rng: np.random.Generator = np.random.default_rng(seed)
+        self.__positions: Dict[int, int] = None # id -> array index, built on first lookup.
+        self.__json: List[str] = None # Encoded fields of each device which never change, built on first use.
+
+        # Chances per poll of an up device failing, and a down device being repaired.
+        self.__failChance: Optional[np.ndarray] = None
+        self.__repairChance: Optional[np.ndarray] = None
+        if mttr is not None:
+            mttr = np.broadcast_to(np.asarray(mttr, dtype=np.float64), availabilities.shape)
+            if (mttr < 1).any():
+                raise ValueError('mttr must be at least 1 poll.')
+            self.__repairChance = np.where(availabilities > 0, 1 / mttr, 0.0) # Devices with no availability stay down.
+            # Failing once every mtbf polls keeps each device up for its availability of the time.
+            self.__failChance = np.divide(
+                1 - availabilities, availabilities * mttr,
+                out=np.ones_like(availabilities), where=availabilities > 0,
+            )
+
+        self.__gateways: np.ndarray = self.__findGateways() if correlated else np.full(len(ids), -1, dtype=np.int64)
+        self.__routers: np.ndarray = np.unique(self.__gateways[self.__gateways >= 0]) # Devices others are reached through.
+        self.__isGateway: np.ndarray = np.zeros(len(ids), dtype=bool)
+        self.__isGateway[self.__routers] = True
+        self.__up: np.ndarray = self.__rng.random(len(ids)) <= availabilities # Start in the long run state.
+
+    def __findGateways(self) -> np.ndarray:
+        """
+        The index of the first router in each devices /24 subnet, -1 for routers and subnets without one.
+        """
+        isRouter: np.ndarray = np.isin(
+            self.__types, [t for t, name in enumerate(self.__typeNames) if name == GATEWAY_TYPE]
+        )
+        subnets: np.ndarray = self.__ipAddresses >> 8
+        routers: np.ndarray = np.flatnonzero(isRouter)
+        gateways: np.ndarray = np.full(len(subnets), -1, dtype=np.int64)
+        if len(routers):
+            routerSubnets, first = np.unique(subnets[routers], return_index=True) # Sorted, with each subnets first router.
+            slot: np.ndarray = np.searchsorted(routerSubnets, subnets).clip(max=len(routerSubnets) - 1)
+            routed: np.ndarray = (routerSubnets[slot] == subnets) & ~isRouter
+            gateways[routed] = routers[first][slot[routed]]
+        return gateways
+
+    @classmethod
+    def generate(cls, numDevices: int, names: Sequence[str], ipPrefix: str, seed: Optional[int] = None,
+                 mttr: Optional[float] = None, mtbf: Optional[float] = None, correlated: bool = False) -> 'DeviceFleet':
+        """
+        Randomly generate a fleet of devices.
+        Addresses count up from the prefix, carrying into the higher octets past 255.
+
+        Args:
+            numDevices (int): Number of devices to generate.
+            names (Sequence[str]): Device types to prefix the device names with.
+            ipPrefix (str): The prefix for the ip address range, e.g. '192.168.0.'.
+            seed (int, optional): Seed for the random generator, for repeatable fleets.
+            mttr (float, optional): Mean polls devices stay down for once failed.
+                Defaults to an independent draw each poll.
+            mtbf (float, optional): Mean polls devices stay up for between failures, requires mttr.
+                Defaults to a random availability per device.
+            correlated (bool): Take every device in a subnet down while its router is down.
+
+        Returns:
+            DeviceFleet: The generated fleet.
+
+        Raises:
+            ValueError: If mtbf is given without mttr, or is not above 0.
+        """
+        rng: np.random.Generator = np.random.default_rng(seed)
+        base: int = int(IPv4Address(f'{ipPrefix.rstrip(".")}.0'))
+
+        availabilities: np.ndarray = rng.uniform(0.8, 1, size=numDevices) # Same range as Device
+        if mtbf is not None:
+            if mttr is None or mtbf <= 0:
+                raise ValueError('mtbf must be above 0, and given with mttr.')
+            availabilities = np.full(numDevices, mtbf / (mtbf + mttr))
+
+        return cls(
+            ids=np.arange(numDevices, dtype=np.int64),
+            types=rng.integers(0, len(names), size=numDevices, dtype=np.uint8),
+            typeNames=names,
+            ipAddresses=base + np.arange(numDevices, dtype=np.uint32),
+            availabilities=availabilities,
+            seed=seed,
+            mttr=mttr,
+            correlated=correlated,
+        )
+
+    def __len__(self) -> int:
+        """
+        The number of devices in the fleet.
+        """
+        return len(self.__ids)
+
+    def __draw(self, index: Union[slice, np.ndarray]) -> np.ndarray:
+        """
+        Draw a new status for the devices at index, from their availability or their previous status.
+        """
+        rolls: np.ndarray = self.__rng.random(len(self.__up[index]))
+        if self.__repairChance is None:
+            return rolls <= self.__availabilities[index]
+        return np.where(self.__up[index], rolls >= self.__failChance[index], rolls < self.__repairChance[index])
+
+    def drawGateways(self) -> None:
+        """
+        Draw the status of every router other devices are reached through, for the next poll.
+        Polls split into ranges draw the routers once first,
+        so every range sees the same router status whichever range a router is in.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if len(self.__routers):
+            self.__up[self.__routers] = self.__draw(self.__routers)
+
+    def generateStatus(self, start: int = 0, stop: Optional[int] = None, gatewaysDrawn: bool = False) -> np.ndarray:
+        """
+        Generate if each device is up or down based on its expected availability.
+        One random draw covers every device in the range.
+        Without a mean time to repair every poll is independent, otherwise an up device fails,
+        or a down device is repaired, with a chance per poll.
+        With correlated failures, devices are reported down while their router is,
+        as drawn for this poll by drawGateways.
+
+        Args:
+            start (int): Index of the first device.
+            stop (int, optional): Index after the last device. Defaults to the end of the fleet.
+            gatewaysDrawn (bool): Whether drawGateways was already called for this poll,
+                by a caller polling the fleet one range at a time.
+
+        Returns:
+            numpy.ndarray: Boolean status per device (True is up, False is Down).
+        """
+        if not gatewaysDrawn:
+            self.drawGateways()
+
+        span: slice = slice(start, stop)
+        up: np.ndarray = self.__draw(span)
+        if len(self.__routers): # Routers keep the status drawn for this poll.
+            up = np.where(self.__isGateway[span], self.__up[span], up)
+        self.__up[span] = up
+
+        gateways: np.ndarray = self.__gateways[span]
+        reachable: np.ndarray = gateways < 0
+        if not reachable.all():
+            reachable |= self.__up[gateways] # -1 reads the last device, but is already reachable.
+        return up & reachable
+
+    @property
+    def ids(self) -> np.ndarray:
+        """
+        The unique identifier of each device.
+        """
+        return self.__ids
+
+    def records(self, start: int = 0, stop: Optional[int] = None,
+                gatewaysDrawn: bool = False) -> List[Dict[str, Union[int, str, bool]]]:
+        """
+        Generate status dictionaries for a range of devices.
+        Matches the schema of Device.__call__.
+
+        Args:
+            start (int): Index of the first device.
+            stop (int, optional): Index after the last device. Defaults to the end of the fleet.
+            gatewaysDrawn (bool): Whether drawGateways was already called for this poll.
+
+        Returns:
+            List[Dict[str, (int|str|bool)]]: The current device information.
+        """
+        return self.__describe(self.generateStatus(start, stop, gatewaysDrawn).tolist(), start, stop)
+
+    def __describe(self, status: Sequence[bool], start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Union[int, str, bool]]]:
+        """
+        Build the status dictionaries of a range of devices with the given statuses.
+        """
+        ids: List[int] = self.__ids[start:stop].tolist()
+        types: List[int] = self.__types[start:stop].tolist()
+        ips: np.ndarray = self.__ipAddresses[start:stop]
+        networks: List[int] = (ips >> 8).tolist() # Vectorised address split.
+        hosts: List[int] = (ips & 255).tolist()
+
+        prefixes: List[str] = [f'{name}_' for name in self.__typeNames]
+        networkPrefix: Dict[int, str] = {} # 'a.b.c.' is shared by up to 256 consecutive devices.
+        records: List[Dict[str, Union[int, str, bool]]] = []
+
+        for i, t, network, host, s in zip(ids, types, networks, hosts, status):
+            prefix: str = networkPrefix.get(network)
+            if prefix is None:
+                prefix = networkPrefix[network] = f'{network >> 16}.{(network >> 8) & 255}.{network & 255}.'
+
+            records.append({
+                'id': i,
+                'name': prefixes[t] + str(i),
+                'ip_address': prefix + OCTETS[host],
+                'status': s,
+            })
+        return records
+
+    def toJson(self, status: np.ndarray, start: int = 0) -> List[str]:
+        """
+        Encode the status of a range of devices as JSON, one string per device.
+        The fields which never change are encoded once for the fleet,
+        so each poll only adds the status of each device.
+
+        Args:
+            status (numpy.ndarray): The status of each device in the range, from generateStatus.
+            start (int): Index of the first device.
+
+        Returns:
+            List[str]: The same JSON as encoding.dumps of each record.
+        """
+        if self.__json is None: # Racing threads build identical lists, either may be kept.
+            self.__json = [statusPrefix(r) for r in self.__describe([False] * len(self))]
+
+        prefixes: List[str] = self.__json[start:start + len(status)]
+        return [prefix + STATUS_SUFFIXES[s] for prefix, s in zip(prefixes, status.tolist())]
+
+    def metadata(self) -> List[Dict[str, Union[int, str]]]:
+        """
+        The information of every device without its status, which never changes.
+
+        Args:
+            None
+
+        Returns:
+            List[Dict[str, (int|str)]]: The id, name and ip_address of each device.
+        """
+        records: List[Dict[str, Union[int, str, bool]]] = self.__describe([False] * len(self))
+        for record in records:
+            del record['status']
+        return records
+
+    def chunks(self, chunkSize: int) -> Iterator[List[Dict[str, Union[int, str, bool]]]]:
+        """
+        Generate status dictionaries for the fleet, one chunk of devices at a time.
+
+        Args:
+            chunkSize (int): Number of devices per chunk.
+
+        Returns:
+            Iterator[List[Dict[str, (int|str|bool)]]]: The current device information.
+        """
+        self.drawGateways() # Once for every chunk.
+        for start in range(0, len(self), chunkSize):
+            yield self.records(start, start + chunkSize, gatewaysDrawn=True)
+
+    def status(self, id: int) -> Optional[Dict[str, Union[int, str, bool]]]:
+        """
+        Generate the status dictionary for a single device.
+
+        Args:
+            id (int): The unique identifier of the device.
+
+        Returns:
+            Dict[str, (int|str|bool)] | None: The device information, or None if the id is unknown.
+        """
+        if self.__positions is None:
+            self.__positions = {deviceId: index for index, deviceId in enumerate(self.__ids.tolist())}
+
+        index: Optional[int] = self.__positions.get(id)
+        if index is None:
+            return None
+        return self.records(index, index + 1)[0]
+
+    def __call__(self) -> List[Dict[str, Union[int, str, bool]]]:
+        """
+        Overloader for the inbuilt call method.
+        Generates the status of every device in the fleet.
+
+        Args:
+            None
+
+        Returns:
+            List[Dict[str, (int|str|bool)]]: The current device information.
+        """
+        return self.records()
@@ -0,0 +1,101 @@
+"""
+StatusJournal.py
+
+This module provides a sequence numbered history of device status changes.
+It lets clients which have already seen the fleet fetch only the devices
+whose status has changed since their last poll.
+
+Classes:
+    StatusJournal: A bounded journal of status changes.
+
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+from collections import deque
+import threading
+import numpy as np
+
+class StatusJournal:
+    """
+    A bounded journal of device status changes.
+    Each recorded poll is given the next sequence number,
+    and stores the positions of the devices whose status changed.
+
+    Attributes:
+        seq (int): The sequence number of the latest recorded poll.
+        history (int): Number of polls for which changes are kept.
+        snapshotInterval (int): A full snapshot is sent whenever a client crosses a multiple of this.
+    """
+    def __init__(self, history: int = 100, snapshotInterval: int = 100) -> None:
+        """
+        Constructor for the StatusJournal object.
+
+        Args:
+            history (int): Number of polls for which changes are kept.
+            snapshotInterval (int): Sequence numbers between periodic full snapshots.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If history or snapshotInterval are less than 1.
+        """
+        if history < 1 or snapshotInterval < 1:
+            raise ValueError('history and snapshotInterval must be at least 1.')
+
+        self.__seq: int = 0
+        self.__status: np.ndarray = None
+        self.__changes: deque = deque(maxlen=history) # (seq, positions, statuses) per poll.
+        self.__snapshotInterval: int = snapshotInterval
+        self.__lock: threading.Lock = threading.Lock()
+
+    @property
+    def seq(self) -> int:
+        """
+        The sequence number of the latest recorded poll.
+        """
+        return self.__seq
+
+    def advance(self, status: Sequence[bool], since: int) -> Tuple[int, Optional[Dict[int, bool]]]:
+        """
+        Record a new poll and collect the changes a client has not yet seen.
+
+        Args:
+            status (Sequence[bool]): The status of every device, in a fixed order.
+            since (int): The sequence number of the clients previous poll (0 if none).
+
+        Returns:
+            Tuple[int, Dict[int, bool] | None]: The new sequence number,
+                and the latest status of each changed device by position,
+                or None if the client needs a full snapshot.
+        """
+        status = np.asarray(status, dtype=bool)
+
+        with self.__lock:
+            if self.__status is None or len(self.__status) != len(status):
+                changed: np.ndarray = np.arange(len(status)) # Fleet changed shape, everything is new.
+            else:
+                changed: np.ndarray = np.flatnonzero(status != self.__status)
+
+            self.__seq += 1
+            self.__changes.append((self.__seq, changed, status[changed]))
+            self.__status = status
+            return self.__seq, self.__changesSince(since)
+
+    def __changesSince(self, since: int) -> Optional[Dict[int, bool]]:
+        """
+        Merge the changes recorded after a sequence number.
+        Must be called while holding the lock.
+        """
+        if since <= 0 or since >= self.__seq:
+            return None # New client, or a sequence number from a previous run.
+        if since + 1 < self.__changes[0][0]:
+            return None # Changes the client needs have been discarded.
+        if self.__seq // self.__snapshotInterval > since // self.__snapshotInterval:
+            return None # Periodic full snapshot.
+
+        merged: Dict[int, bool] = {}
+        for seq, positions, statuses in self.__changes:
+            if seq > since:
+                merged.update(zip(positions.tolist(), statuses.tolist())) # Later polls win.
+        return merged
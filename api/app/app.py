@@ -1,19 +1,258 @@
 import argparse
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional, Sequence, Tuple, Union
 from .Device import Device
-from flask import Flask, Response, current_app
-from random import choice
+from .DeviceFleet import DeviceFleet, GATEWAY_TYPE
+from .StatusJournal import StatusJournal
+from .encoding import BITSET, dumps, encodeBitset, listVersion
+from flask import Flask, Response, current_app, request
+from werkzeug.serving import WSGIRequestHandler
+from random import Random, choice
 import sys
-import json
+import threading
 import os
 
 app = Flask(__name__)
+journalLock = threading.Lock()
+deviceListLock = threading.Lock()
+gatewayLock = threading.Lock()
+gatewayCache: Tuple[Optional[List[Device]], List[Device]] = (None, []) # The devices, and the gateways among them.
+
+NDJSON: str = 'application/x-ndjson'
+STREAM_CHUNK_SIZE: int = 1000 # Devices serialised per chunk when streaming.
+JOURNAL_HISTORY: int = 100 # Polls of status changes kept for ?since= clients.
+SNAPSHOT_INTERVAL: int = 100 # ?since= clients get a full snapshot every this many polls.
+
+def wantsStream() -> bool:
+    """
+    Check if the client asked for newline delimited JSON.
+    Either with ?format=ndjson or an Accept header preferring application/x-ndjson.
+
+    Args:
+        None
+
+    Returns:
+        bool: True if the response should be streamed.
+    """
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+def wantsBitset() -> bool:
+    """
+    Check if the client asked for statuses as a bitset.
+    Either with ?format=bitset or an Accept header preferring application/x-device-bitset.
+
+    Args:
+        None
+
+    Returns:
+        bool: True if the response should be a bitset.
+    """
+    if request.args.get('format') == 'bitset':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON, BITSET]) == BITSET
+
+def getGateways(devices: List[Device]) -> List[Device]:
+    """
+    Get the devices other devices are reached through.
+    They are found once whenever a different list of devices is polled.
+
+    Args:
+        devices (List[Device]): The devices being polled.
+
+    Returns:
+        List[Device]: The gateways among the devices.
+    """
+    global gatewayCache
+    with gatewayLock: # Requests are served on multiple threads.
+        if gatewayCache[0] is not devices:
+            gatewayCache = (devices, [device for device in devices if device.isGateway])
+        return gatewayCache[1]
+
+def drawGateways(devices: Union[List[Device], DeviceFleet]) -> None:
+    """
+    Draw the status of every gateway for the next poll, before any other device is polled.
+    A poll split into ranges calls this once, so each range sees the same gateway status.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices being polled.
+
+    Returns:
+        None
+    """
+    if isinstance(devices, DeviceFleet):
+        devices.drawGateways()
+        return
+    for gateway in getGateways(devices):
+        gateway.generateStatus()
+
+def pollStatus(devices: Union[List[Device], DeviceFleet], start: int = 0, stop: Optional[int] = None,
+               gatewaysDrawn: bool = False) -> Sequence[bool]:
+    """
+    Poll a range of devices for their status.
+    Every gateway draws its status for the poll before the range is polled, as DeviceFleet does,
+    so a device sees its routers status from this poll wherever the router is listed.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices to report on.
+        start (int): Index of the first device.
+        stop (int, optional): Index after the last device. Defaults to the end of the devices.
+        gatewaysDrawn (bool): Whether drawGateways was already called for this poll,
+            by a caller polling the devices one range at a time.
+
+    Returns:
+        Sequence[bool]: The status of each device in the range.
+    """
+    if isinstance(devices, DeviceFleet):
+        return devices.generateStatus(start, stop, gatewaysDrawn) # One vectorised draw for the range.
+    if not gatewaysDrawn:
+        drawGateways(devices)
+    return [device.report() for device in devices[start:stop]]
+
+def statusJson(devices: Union[List[Device], DeviceFleet], status: Optional[Sequence[bool]] = None,
+               start: int = 0, stop: Optional[int] = None, gatewaysDrawn: bool = False) -> List[str]:
+    """
+    Encode the status of a range of devices, one JSON object per device.
+    Each devices fields which never change are pre-encoded, only its status is added.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices to report on.
+        status (Sequence[bool], optional): The status of each device in the range, from pollStatus.
+            Defaults to polling the devices.
+        start (int): Index of the first device.
+        stop (int, optional): Index after the last device. Defaults to the end of the devices.
+        gatewaysDrawn (bool): Whether drawGateways was already called for this poll.
+
+    Returns:
+        List[str]: The JSON of each device.
+    """
+    if isinstance(devices, DeviceFleet):
+        if status is None:
+            status = devices.generateStatus(start, stop, gatewaysDrawn)
+        return devices.toJson(status, start)
+    if status is None: # Polled and encoded in a single pass.
+        if not gatewaysDrawn:
+            drawGateways(devices)
+        return [device.reportJson() for device in devices[start:stop]]
+    return [device.toJson(s) for device, s in zip(devices[start:start + len(status)], status)]
+
+def streamStatus(devices: Union[List[Device], DeviceFleet], chunkSize: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Generate the status of each device as newline delimited JSON.
+    Only one chunk of devices is polled and serialised at a time,
+    after every gateway is drawn once for the whole poll.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices to report on.
+        chunkSize (int): Number of devices per yielded chunk.
+
+    Returns:
+        Iterator[str]: Chunks of one JSON object per line.
+    """
+    drawGateways(devices)
+    for start in range(0, len(devices), chunkSize):
+        yield '\n'.join(statusJson(devices, start=start, stop=start + chunkSize, gatewaysDrawn=True)) + '\n'
+
+def getJournal(devices: Union[List[Device], DeviceFleet]) -> StatusJournal:
+    """
+    Get the status journal for the current devices.
+    A new journal is started whenever the app is given a different set of devices.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices being served.
+
+    Returns:
+        StatusJournal: The journal for these devices.
+    """
+    with journalLock: # Requests are served on multiple threads.
+        journal: StatusJournal = getattr(current_app, 'journal', None)
+        if journal is None or getattr(current_app, 'journalDevices', None) is not devices:
+            current_app.journal = journal = StatusJournal(JOURNAL_HISTORY, SNAPSHOT_INTERVAL)
+            current_app.journalDevices = devices
+        return journal
+
+def getDeviceList(devices: Union[List[Device], DeviceFleet]) -> Tuple[int, str]:
+    """
+    Get the device list bitsets are ordered by, and its version.
+    It is encoded once whenever the app is given a different set of devices.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices being served.
+
+    Returns:
+        Tuple[int, str]: The version of the list, and the JSON of each devices id, name and ip_address.
+    """
+    with deviceListLock: # Requests are served on multiple threads.
+        cached: Optional[tuple] = getattr(current_app, 'deviceList', None)
+        if cached is None or cached[0] is not devices:
+            metadata: list = devices.metadata() if isinstance(devices, DeviceFleet) else [d.metadata() for d in devices]
+            reply: str = dumps(metadata)
+            current_app.deviceList = cached = (devices, listVersion(reply), reply)
+        return cached[1], cached[2]
+
+def getBitset(devices: Union[List[Device], DeviceFleet]) -> Response:
+    """
+    Poll every device and reply with one bit per device.
+    The X-Device-List-Version header names the device list the bits are ordered by,
+    clients fetch /devices/metadata when it changes.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices to report on.
+
+    Returns:
+        flask.Response: The bitset, as described in encoding.
+    """
+    version, _ = getDeviceList(devices)
+    response: Response = Response(
+        response=encodeBitset(version, pollStatus(devices)),
+        status=200,
+        mimetype=BITSET
+    )
+    response.headers['X-Device-List-Version'] = str(version)
+    return response
+
+def getChanges(devices: Union[List[Device], DeviceFleet], since: int) -> Response:
+    """
+    Poll every device and reply with only those which changed since a previous poll.
+    Clients which are new, too far behind, or due a periodic refresh get a full snapshot.
+
+    Args:
+        devices (List[Device] | DeviceFleet): The devices to report on.
+        since (int): The sequence number of the clients previous poll (0 if none).
+
+    Returns:
+        flask.Response: {"seq": int, "full": bool, "devices": [...]}
+            A full snapshot holds every device record,
+            otherwise only {"id", "status"} of changed devices is sent.
+    """
+    status: Sequence[bool] = pollStatus(devices)
+    seq, changes = getJournal(devices).advance(status, since)
+
+    if changes is None: # The snapshot is spliced together from the pre-encoded devices.
+        reply: str = f'{{"seq":{seq},"full":true,"devices":[{",".join(statusJson(devices, status))}]}}'
+    else:
+        ids: Sequence[int] = devices.ids if isinstance(devices, DeviceFleet) else [device.id for device in devices]
+        reply: str = dumps({
+            'seq': seq,
+            'full': False,
+            'devices': [{'id': int(ids[i]), 'status': s} for i, s in changes.items()],
+        })
+
+    return Response(
+        response=reply,
+        status=200,
+        mimetype='application/json'
+    )
 
 @app.route("/devices", methods=["GET"])
 def getStatus()->Response:
     """
     Query the status of all devices.
-    Returns the status as a JSON string.
+    Returns the status as a JSON string,
+    or streams it as newline delimited JSON if requested.
+    With ?since=<seq> only the devices which changed since that poll are returned.
+    Clients accepting application/x-device-bitset (or asking for ?format=bitset)
+    get one bit per device instead, see /devices/metadata.
 
     Args:
         None
@@ -21,10 +260,19 @@ def getStatus()->Response:
     Returns:
         flask.Response: The HTTP response to forward to the client.
     """
-    devices: List[Device] = current_app.devices # Get devices from setup phase.
-    status: List[Dict[str, (int|bool|str)]] = [device() for device in devices] # Get status of each device.
+    devices: Union[List[Device], DeviceFleet] = current_app.devices # Get devices from setup phase.
+
+    since: int = request.args.get('since', type=int)
+    if len(devices) and since is not None:
+        return getChanges(devices, since)
+
+    if len(devices) and wantsBitset():
+        return getBitset(devices)
 
-    reply: str = json.dumps(status)
+    if len(devices) and wantsStream():
+        return Response(streamStatus(devices), status=200, mimetype=NDJSON)
+
+    reply: str = '[' + ','.join(statusJson(devices)) + ']' # Get status of each device.
 
     if reply == '[]': # Handle case where device list is empty.
         response: Flask.Response = Response(
@@ -46,27 +294,131 @@ def getStatus()->Response:
         )
     return response
 
-def generateDevices(NUM_DEVICES: int, NAMES: List[str], IP_PREFIX: str)->List[Device]:
+@app.route("/devices/metadata", methods=["GET"])
+def getMetadata()->Response:
+    """
+    Query the id, name and ip_address of every device, in the order of a bitset.
+    The version is sent as the ETag, so clients can revalidate their copy.
+
+    Args:
+        None
+
+    Returns:
+        flask.Response: The HTTP response to forward to the client.
+    """
+    version, reply = getDeviceList(current_app.devices)
+    response: Response = Response(
+        response=reply,
+        status=200,
+        mimetype='application/json'
+    )
+    response.headers['X-Device-List-Version'] = str(version)
+    response.set_etag(str(version))
+    return response.make_conditional(request) # 304 Not Modified if the client holds this version.
+
+@app.route("/devices/<int:id>", methods=["GET"])
+def getDeviceStatus(id: int)->Response:
+    """
+    Query the status of a single device.
+    Simulates polling a device on its own endpoint.
+
+    Args:
+        id (int): The unique identifier of the device.
+
+    Returns:
+        flask.Response: The HTTP response to forward to the client.
+    """
+    devices: Union[List[Device], DeviceFleet] = current_app.devices
+
+    if isinstance(devices, DeviceFleet):
+        status: Dict[str, Union[int, bool, str]] = devices.status(id)
+        reply: str = dumps(status) if status else None
+    # Devices from generateDevices are stored by id, fall back to a search otherwise.
+    elif 0 <= id < len(devices) and devices[id].id == id:
+        reply: str = devices[id].toJson()
+    else:
+        device: Device = next((d for d in devices if d.id == id), None)
+        reply: str = device.toJson() if device else None
+
+    if reply is None:
+        return Response(
+            response='{"Error": "Device Not Found"}',
+            status=404,
+            mimetype='application/json'
+        )
+
+    return Response(
+        response=reply,
+        status=200,
+        mimetype='application/json'
+    )
+
+def generateDevices(NUM_DEVICES: int, NAMES: List[str], IP_PREFIX: str, mttr: Optional[float] = None,
+                    mtbf: Optional[float] = None, correlated: bool = False, seed: Optional[int] = None)->List[Device]:
     """
     Randomly generate a list of devices.
+    With correlated failures, devices are grouped into subnets of 256 consecutive ids
+    (as DeviceFleet addresses carry into the next octet), each reached through its first router.
 
     Args:
         NUM_DEVICES (int): Number of devices to generate.
         NAMES: A list of random device types to prefix the device name with.
         IP_PREFIX: The prefix for the ip address range.
+        mttr (float, optional): Mean polls devices stay down for once failed.
+            Defaults to an independent draw each poll.
+        mtbf (float, optional): Mean polls devices stay up for between failures, requires mttr.
+        correlated (bool): Take every device in a subnet down while its router is down.
+        seed (int, optional): Seed for the random generator, for repeatable devices and statuses.
     
     Returns:
         List[Device]: A list of generated Device objects.
     """
-    devices: List[Device] = [
-        Device(id=i, name=f'{choice(NAMES)}_{i}', ipAddress=f'{IP_PREFIX}{i}')
-        for i in range(NUM_DEVICES)
-        ]
+    rng: Optional[Random] = Random(seed) if seed is not None else None
+    pick = rng.choice if rng is not None else choice
+    names: List[str] = [f'{pick(NAMES)}_{i}' for i in range(NUM_DEVICES)]
+    options: Dict[str, float] = {'mttr': mttr, 'mtbf': mtbf}
+
+    gateways: Dict[int, Device] = {} # Subnet -> its router, created first so the subnet can refer to it.
+    if correlated:
+        for i, name in enumerate(names):
+            if name.startswith(f'{GATEWAY_TYPE}_') and i // 256 not in gateways:
+                gateways[i // 256] = Device(id=i, name=name, ipAddress=f'{IP_PREFIX}{i}', rng=rng, **options)
+
+    devices: List[Device] = []
+    for i, name in enumerate(names):
+        gateway: Optional[Device] = gateways.get(i // 256)
+        if gateway is not None and gateway.id == i:
+            devices.append(gateway)
+        else:
+            devices.append(Device(id=i, name=name, ipAddress=f'{IP_PREFIX}{i}', gateway=gateway, rng=rng, **options))
     
     return devices
 
 
-def main(NUM_DEVICES: str)->int:
+def generateFleet(NUM_DEVICES: int, NAMES: List[str], IP_PREFIX: str, mttr: Optional[float] = None,
+                  mtbf: Optional[float] = None, correlated: bool = False, seed: Optional[int] = None)->DeviceFleet:
+    """
+    Randomly generate a fleet of devices stored as arrays.
+    Used instead of generateDevices to simulate very large networks.
+
+    Args:
+        NUM_DEVICES (int): Number of devices to generate.
+        NAMES: A list of random device types to prefix the device name with.
+        IP_PREFIX: The prefix for the ip address range.
+        mttr (float, optional): Mean polls devices stay down for once failed.
+            Defaults to an independent draw each poll.
+        mtbf (float, optional): Mean polls devices stay up for between failures, requires mttr.
+        correlated (bool): Take every device in a /24 subnet down while its router is down.
+        seed (int, optional): Seed for the random generator, for repeatable devices and statuses.
+
+    Returns:
+        DeviceFleet: The generated fleet.
+    """
+    return DeviceFleet.generate(NUM_DEVICES, NAMES, IP_PREFIX, seed=seed, mttr=mttr, mtbf=mtbf, correlated=correlated)
+
+
+def main(NUM_DEVICES: str, FLEET: bool = False, MTTR: Optional[float] = None, MTBF: Optional[float] = None,
+         CORRELATED: bool = False, SEED: Optional[int] = None)->int:
 
     try:
         NUM_DEVICES: int = int(NUM_DEVICES)
@@ -79,7 +431,10 @@ def main(NUM_DEVICES: str)->int:
     NAMES: List[str] = ['Router', 'Switch', 'Phone', 'Firewall', 'PC'] # Default Prefixes for device names.
     IP_PREFIX: str = '192.168.0.' # IP address range for devices.
 
-    devices = generateDevices(NUM_DEVICES, NAMES, IP_PREFIX)
+    if FLEET:
+        devices = generateFleet(NUM_DEVICES, NAMES, IP_PREFIX, MTTR, MTBF, CORRELATED, SEED) # Vectorised simulator for large fleets.
+    else:
+        devices = generateDevices(NUM_DEVICES, NAMES, IP_PREFIX, MTTR, MTBF, CORRELATED, SEED)
     
     app.devices = devices # Add devices to Flask  app environment.
 
@@ -89,13 +444,19 @@ def main(NUM_DEVICES: str)->int:
     else:
         host: str = "127.0.0.1" # Strictly Localhost
 
+    WSGIRequestHandler.protocol_version = "HTTP/1.1" # Allow pollers to reuse connections.
     app.run(host=host, port=8000)
 
 if __name__ == '__main__':
     
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--devices', nargs='?', default=4)
+    parser.add_argument('-f', '--fleet', action='store_true', help='Simulate devices with a vectorised DeviceFleet.')
+    parser.add_argument('--mttr', type=float, help='Mean polls a failed device stays down for, statuses then persist between polls.')
+    parser.add_argument('--mtbf', type=float, help='Mean polls a device stays up for between failures (requires --mttr).')
+    parser.add_argument('--correlated', action='store_true', help='Take each subnet down while its router is down.')
+    parser.add_argument('--seed', type=int, help='Seed for repeatable devices and statuses.')
     args = parser.parse_args()
 
-    status: int = main(args.devices)
+    status: int = main(args.devices, args.fleet, args.mttr, args.mtbf, args.correlated, args.seed)
     sys.exit(status)
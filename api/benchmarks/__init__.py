@@ -0,0 +1,6 @@
+"""
+Benchmarks for the simulated device API.
+
+Each benchmark is a standalone script run from the api directory, e.g.
+    python -m benchmarks.bench_fleet
+"""
@@ -0,0 +1,86 @@
+"""
+Benchmark of /devices requests per second, before and after pre-encoding each devices fields.
+
+The legacy route builds a dictionary for every device on every request and encodes the
+whole list with json.dumps, as /devices did before, but compact like the current route
+so only the encoding work is compared. The current route splices each devices
+status into its pre-encoded JSON. Both are served in process through the Flask test client,
+for a list of Device objects and for a DeviceFleet.
+Exits with status 1 if the list of Device objects is served less than TARGET times faster.
+
+Usage:
+    python -m benchmarks.bench_encoding
+    python -m benchmarks.bench_encoding --sizes 50000 200000 --no-orjson
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List
+
+from flask import Flask, Response
+
+from app import encoding
+from app.app import app, generateDevices, generateFleet
+
+NAMES: List[str] = ['Router', 'Switch', 'Phone', 'Firewall', 'PC']
+TARGET: float = 5.0 # Minimum speedup of the device list route.
+
+legacy = Flask('legacy')
+
+@legacy.route("/devices")
+def legacyStatus() -> Response:
+    devices = legacy.devices
+    records = devices() if callable(devices) else [device() for device in devices]
+    return Response(json.dumps(records, separators=(',', ':')), status=200, mimetype='application/json')
+
+
+def requestsPerSecond(server: Flask, devices, requests: int) -> float:
+    """
+    Serve requests for /devices one after another, returning requests per second.
+    """
+    server.devices = devices
+    client = server.test_client()
+    client.get("/devices") # Warm up, builds the pre-encoded fields.
+
+    began: float = time.perf_counter()
+    for _ in range(requests):
+        assert client.get("/devices").status_code == 200
+    return requests / (time.perf_counter() - began)
+
+
+def main(sizes: List[int], requests: int, seed: int) -> Dict[str, dict]:
+    results: Dict[str, dict] = {"encoder": encoding.ENCODER}
+    for size in sizes:
+        for kind, generate in (("device_list", generateDevices), ("device_fleet", generateFleet)):
+            devices = generate(size, NAMES, '10.0.0.', seed=seed)
+            before: float = requestsPerSecond(legacy, devices, requests)
+            after: float = requestsPerSecond(app, devices, requests)
+            results.setdefault(str(size), {})[kind] = {
+                "legacy_rps": round(before, 1),
+                "rps": round(after, 1),
+                "speedup": round(after / before, 1),
+            }
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', type=int, default=[50000])
+    parser.add_argument('--requests', type=int, default=20, help='Requests timed per route.')
+    parser.add_argument('--no-orjson', action='store_true', help='Encode with the json module even if orjson is installed.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--target', type=float, default=TARGET, help='Minimum speedup of the device list route.')
+    args = parser.parse_args()
+
+    if args.no_orjson:
+        encoding.orjson, encoding.ENCODER = None, 'json'
+
+    results: Dict[str, dict] = main(args.sizes, args.requests, args.seed)
+    print(json.dumps(results, indent=2))
+
+    missed: List[str] = [size for size in map(str, args.sizes) if results[size]["device_list"]["speedup"] < args.target]
+    if missed:
+        print(f'Device list speedup below {args.target}x for sizes {", ".join(missed)}.', file=sys.stderr)
+        sys.exit(1)
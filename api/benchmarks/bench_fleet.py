@@ -0,0 +1,94 @@
+"""
+Benchmark comparing the list of Device objects against a vectorised DeviceFleet.
+
+For each fleet size reports the time to build the devices, the time to draw every
+status, the time to generate one poll of status records, and the memory allocated
+to hold the devices. Also reports the share of devices changing status between polls,
+which outages (--mttr) and correlated router failures (--correlated) bring down to realistic levels.
+
+Usage:
+    python -m benchmarks.bench_fleet
+    python -m benchmarks.bench_fleet --sizes 10000 100000
+    python -m benchmarks.bench_fleet --mttr 20 --correlated --seed 0
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.app import generateDevices, generateFleet
+
+NAMES: List[str] = ['Router', 'Switch', 'Phone', 'Firewall', 'PC']
+
+def measure(build: Callable, draw: Callable, poll: Callable, size: int) -> Dict[str, float]:
+    """
+    Time building and polling a set of devices.
+    """
+    tracemalloc.start()
+    start: float = time.perf_counter()
+    devices = build(size, NAMES, '10.0.0.')
+    buildSeconds: float = time.perf_counter() - start
+    memory: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    draw(devices)
+    drawSeconds: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    poll(devices)
+    pollSeconds: float = time.perf_counter() - start
+
+    return {
+        "build_seconds": round(buildSeconds, 3),
+        "draw_seconds": round(drawSeconds, 4),
+        "poll_seconds": round(pollSeconds, 3),
+        "memory_mb": round(memory / 2**20, 1),
+    }
+
+
+def changeRate(devices, polls: int = 10) -> float:
+    """
+    The mean share of devices whose status changed from one poll to the next.
+    """
+    statuses: List[np.ndarray] = [devices.generateStatus() for _ in range(polls + 1)]
+    return float(np.mean([np.mean(a != b) for a, b in zip(statuses, statuses[1:])]))
+
+
+def main(sizes: List[int], mttr: Optional[float], correlated: bool, seed: Optional[int]) -> Dict[str, dict]:
+    options: dict = {"mttr": mttr, "correlated": correlated, "seed": seed}
+    results: Dict[str, dict] = {}
+    for size in sizes:
+        legacy = measure(
+            partial(generateDevices, **options),
+            lambda devices: [d.generateStatus() for d in devices],
+            lambda devices: [d() for d in devices],
+            size,
+        )
+        fleet = measure(
+            partial(generateFleet, **options), lambda devices: devices.generateStatus(), lambda devices: devices(), size
+        )
+        fleet["change_rate"] = round(changeRate(generateFleet(size, NAMES, '10.0.0.', **options)), 4)
+        results[str(size)] = {
+            "device_list": legacy,
+            "device_fleet": fleet,
+            "draw_speedup": round(legacy["draw_seconds"] / fleet["draw_seconds"]),
+            "poll_speedup": round(legacy["poll_seconds"] / fleet["poll_seconds"], 1),
+        }
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000])
+    parser.add_argument('--mttr', type=float, help='Mean polls a device stays down for, statuses then persist between polls.')
+    parser.add_argument('--correlated', action='store_true', help='Take each subnet down while its router is down.')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.sizes, args.mttr, args.correlated, args.seed), indent=2))
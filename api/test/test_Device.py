@@ -3,6 +3,9 @@ This file contains a test suite for the Device class.
 """
 import pytest
 from app.Device import Device
+from random import Random
+from app.encoding import dumps
+import json
 
 # Fixtures to create reusable Device instances used in later tests
 
@@ -65,6 +68,12 @@ def testConstructorInvalidAvailType():
     with pytest.raises(ValueError):
         Device(1, 'Device', '127.0.0.1', avail='NotAFloat')
 
+def testIdProperty(device):
+    """
+    Test that the id property exposes the device identifier.
+    """
+    assert device.id == 1
+
 def testGenerateStatusUp(always_up):
     """
     Test that generateStatus returns True for a device with 100% availability.
@@ -100,3 +109,84 @@ def testCallDown(always_down):
         'status': False
     }
     assert always_down() == expected
+
+def testMarkovStatusPersists():
+    """
+    Test that with a mean time to repair, the status persists between polls and still meets the availability.
+    """
+    device = Device(4, 'NewDevice4', '192.168.0.4', avail=0.9, mttr=10, rng=Random(1))
+    statuses = [device.generateStatus() for _ in range(50000)]
+
+    changes = sum(a != b for a, b in zip(statuses, statuses[1:])) / len(statuses)
+    assert sum(statuses) / len(statuses) == pytest.approx(0.9, abs=0.02)
+    assert changes == pytest.approx(0.02, abs=0.005) # Rather than 0.18 flipping a coin each poll.
+
+def testMtbf():
+    """
+    Test that a mean time between failures sets the availability.
+    """
+    device = Device(5, 'NewDevice5', '192.168.0.5', mtbf=90, mttr=10, rng=Random(2))
+    statuses = [device.generateStatus() for _ in range(50000)]
+
+    assert sum(statuses) / len(statuses) == pytest.approx(0.9, abs=0.02)
+
+@pytest.mark.parametrize('kwargs', [{'mttr': 0.5}, {'mtbf': 10}, {'mtbf': 0, 'mttr': 5}, {'mttr': 'often'}])
+def testConstructorInvalidMeanTimes(kwargs):
+    """
+    Test that mean times out of range raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        Device(1, 'NewDevice1', '192.168.0.1', **kwargs)
+
+def testGatewayDown(always_up, always_down):
+    """
+    Test that a device is reported down while its gateway is down.
+    """
+    behind = Device(4, 'NewDevice4', '192.168.0.4', gateway=always_down, avail=1)
+    always_down()
+
+    assert behind()['status'] is False
+    assert behind.isAwake is True # The device itself is still up.
+    assert Device(5, 'NewDevice5', '192.168.0.5', gateway=always_up, avail=1)()['status'] is True
+
+def testSeededDevice():
+    """
+    Test that devices drawing from generators with the same seed give the same statuses.
+    """
+    first = Device(6, 'NewDevice6', '192.168.0.6', mttr=3, rng=Random(7))
+    second = Device(6, 'NewDevice6', '192.168.0.6', mttr=3, rng=Random(7))
+
+    assert [first()['status'] for _ in range(100)] == [second()['status'] for _ in range(100)]
+
+def testToJson(always_up, always_down):
+    """
+    Test that the pre-encoded JSON matches encoding the status dictionary.
+    """
+    assert always_up.toJson() == dumps(always_up())
+    assert json.loads(always_down.toJson()) == always_down()
+    assert json.loads(always_down.toJson(True))['status'] is True # A given status is reported without polling.
+    assert repr(always_up) == always_up.toJson()
+
+@pytest.mark.parametrize('kwargs', [{}, {'mttr': 3}])
+def testReportJson(kwargs):
+    """
+    Test that reportJson encodes the same status as report, keeping the status drawn for gateways.
+    """
+    def pair(seed):
+        gateway = Device(7, 'Router_7', '192.168.0.7', rng=Random(seed), **kwargs)
+        return gateway, Device(8, 'Switch_8', '192.168.0.8', gateway=gateway, rng=Random(seed + 1), **kwargs)
+
+    first, second = pair(1), pair(1)
+    assert first[0].isGateway and not first[1].isGateway
+    for _ in range(100):
+        first[0].generateStatus()
+        second[0].generateStatus()
+        assert [d.toJson(d.report()) for d in first] == [d.reportJson() for d in second]
+        assert json.loads(second[0].reportJson())['status'] is second[0].isAwake
+
+def testMetadata():
+    """
+    Test that the metadata is the status record without its status.
+    """
+    device = Device(3, 'Router_3', '192.168.0.3')
+    assert device.metadata() == {'id': 3, 'name': 'Router_3', 'ip_address': '192.168.0.3'}
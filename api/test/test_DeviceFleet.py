@@ -0,0 +1,187 @@
+"""
+This file contains a test suite for the DeviceFleet class.
+"""
+import pytest
+import numpy as np
+from app.DeviceFleet import DeviceFleet
+from app.Device import Device
+from app.encoding import dumps
+
+# Fixtures to create reusable DeviceFleet instances used in later tests
+
+@pytest.fixture
+def fleet():
+    """
+    A generated fleet of 300 devices, large enough to carry into the next address octet.
+    """
+    return DeviceFleet.generate(300, ['Router', 'Switch'], '192.168.0.', seed=1)
+
+@pytest.fixture
+def mixed():
+    """
+    A fleet with one device always up and one always down.
+    """
+    return DeviceFleet(
+        ids=[2, 3],
+        types=[0, 0],
+        typeNames=['NewDevice'],
+        ipAddresses=[3232235522, 3232235523], # 192.168.0.2 and 192.168.0.3
+        availabilities=[1, 0],
+    )
+
+# Test cases for DeviceFleet class behavior
+
+def testGenerate(fleet):
+    """
+    Test that a generated fleet has the requested number of devices.
+    """
+    assert isinstance(fleet, DeviceFleet)
+    assert len(fleet) == 300
+
+def testConstructorInvalidIDs():
+    """
+    Test that passing non-integer ids raises a TypeError.
+    """
+    with pytest.raises(TypeError):
+        DeviceFleet(['ID1'], [0], ['Router'], [1], [0.5])
+
+def testConstructorInvalidAvail():
+    """
+    Test that an availability outside of 0-1 raises a ValueError.
+    """
+    with pytest.raises(ValueError):
+        DeviceFleet([1], [0], ['Router'], [1], [100])
+
+def testConstructorLengthMismatch():
+    """
+    Test that arrays of different lengths raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        DeviceFleet([1, 2], [0], ['Router'], [1], [0.5])
+
+def testGenerateStatus(mixed):
+    """
+    Test that statuses follow each devices availability.
+    """
+    assert mixed.generateStatus().tolist() == [True, False]
+
+def testCallSchema(mixed):
+    """
+    Test that calling the fleet returns the same schema as Device.__call__.
+    """
+    assert mixed() == [
+        Device(2, 'NewDevice_2', '192.168.0.2', avail=1)(),
+        Device(3, 'NewDevice_3', '192.168.0.3', avail=0)(),
+    ]
+
+def testCallNativeTypes(fleet):
+    """
+    Test that records hold plain Python values, so they serialise as JSON.
+    """
+    record = fleet()[0]
+    assert type(record['id']) is int
+    assert type(record['status']) is bool
+
+def testAddressCarry(fleet):
+    """
+    Test that addresses past .255 carry into the next octet.
+    """
+    assert fleet()[256]['ip_address'] == '192.168.1.0'
+
+def testNames(fleet):
+    """
+    Test that names are '<type>_<id>'.
+    """
+    assert all(r['name'].split('_')[0] in ('Router', 'Switch') and r['name'].endswith(f"_{r['id']}") for r in fleet())
+
+def testChunks(fleet):
+    """
+    Test that chunks cover every device exactly once.
+    """
+    chunks = list(fleet.chunks(128))
+    assert [len(c) for c in chunks] == [128, 128, 44]
+    assert [r['id'] for c in chunks for r in c] == list(range(300))
+
+def testStatusLookup(mixed):
+    """
+    Test that a single device can be looked up by id.
+    """
+    assert mixed.status(3)['ip_address'] == '192.168.0.3'
+    assert mixed.status(99) is None
+
+def testSeeded():
+    """
+    Test that fleets generated with the same seed are identical.
+    """
+    first = DeviceFleet.generate(50, ['Router'], '10.0.0.', seed=7)
+    second = DeviceFleet.generate(50, ['Router'], '10.0.0.', seed=7)
+    assert first() == second()
+
+def testAvailability():
+    """
+    Test that the share of devices up matches their availability.
+    """
+    fleet = DeviceFleet(np.arange(100000), np.zeros(100000), ['Router'], np.arange(100000), np.full(100000, 0.9), seed=3)
+    assert fleet.generateStatus().mean() == pytest.approx(0.9, abs=0.01)
+
+def testMarkovChangeRate():
+    """
+    Test that with a mean time to repair few devices change status each poll, while meeting their availability.
+    """
+    fleet = DeviceFleet(np.arange(100000), np.zeros(100000), ['Router'], np.arange(100000), np.full(100000, 0.9),
+                        seed=3, mttr=10)
+    polls = [fleet.generateStatus() for _ in range(20)]
+
+    assert np.mean(polls) == pytest.approx(0.9, abs=0.01)
+    assert np.mean(polls[-1] != polls[-2]) == pytest.approx(0.02, abs=0.005) # Rather than 0.18 flipping a coin each poll.
+
+def testGenerateMtbf():
+    """
+    Test that a generated fleet's mean times set the availability of every device.
+    """
+    fleet = DeviceFleet.generate(100000, ['Router', 'Switch'], '10.0.0.', seed=4, mttr=5, mtbf=45)
+    assert np.mean([fleet.generateStatus() for _ in range(10)]) == pytest.approx(0.9, abs=0.01)
+
+    with pytest.raises(ValueError):
+        DeviceFleet.generate(10, ['Router'], '10.0.0.', mtbf=45)
+    with pytest.raises(ValueError):
+        DeviceFleet.generate(10, ['Router'], '10.0.0.', mttr=0)
+
+def testCorrelatedFailures():
+    """
+    Test that a subnet is reported down while its first router is down, and other subnets are not.
+    """
+    fleet = DeviceFleet(
+        ids=[0, 1, 2, 3, 4],
+        types=[1, 0, 0, 1, 1], # Switch, Router, Router, Switch, Switch
+        typeNames=['Router', 'Switch'],
+        ipAddresses=[0x0A000001, 0x0A000002, 0x0A000003, 0x0A000104, 0x0A000105], # 10.0.0.1-3, 10.0.1.4-5
+        availabilities=[1, 0, 1, 1, 1],
+        seed=5,
+        mttr=10,
+        correlated=True,
+    )
+    assert fleet.generateStatus().tolist() == [False, False, True, True, True]
+    assert [r['status'] for r in fleet.records(0, 1)] == [False] # Read from the routers latest poll.
+
+def testSeededMarkov():
+    """
+    Test that fleets with the same seed go through the same outages.
+    """
+    first = DeviceFleet.generate(1000, ['Router', 'Switch'], '10.0.0.', seed=9, mttr=4, correlated=True)
+    second = DeviceFleet.generate(1000, ['Router', 'Switch'], '10.0.0.', seed=9, mttr=4, correlated=True)
+
+    assert [first() for _ in range(5)] == [second() for _ in range(5)]
+
+def testToJson(mixed):
+    """
+    Test that the pre-encoded JSON of a range matches encoding its status dictionaries.
+    """
+    assert mixed.toJson(np.array([True, False])) == [dumps(record) for record in mixed()]
+    assert mixed.toJson(np.array([True]), start=1) == [dumps({**mixed()[1], 'status': True})]
+
+def testMetadata(mixed):
+    """
+    Test that the metadata matches the records without their status.
+    """
+    assert mixed.metadata() == [{k: v for k, v in r.items() if k != 'status'} for r in mixed.records()]
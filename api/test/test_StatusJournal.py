@@ -0,0 +1,90 @@
+"""
+This file contains a test suite for the StatusJournal class.
+"""
+import pytest
+from app.StatusJournal import StatusJournal
+
+# Fixtures to create reusable StatusJournal instances used in later tests
+
+@pytest.fixture
+def journal():
+    """
+    A journal which has recorded one poll of three devices.
+    """
+    journal = StatusJournal(history=5, snapshotInterval=100)
+    journal.advance([True, True, False], since=0)
+    return journal
+
+# Test cases for StatusJournal class behavior
+
+def testConstructorInvalidHistory():
+    """
+    Test that a journal without history raises a ValueError.
+    """
+    with pytest.raises(ValueError):
+        StatusJournal(history=0)
+
+def testNewClientGetsSnapshot():
+    """
+    Test that a client without a sequence number is told to take a full snapshot.
+    """
+    seq, changes = StatusJournal().advance([True, False], since=0)
+    assert seq == 1
+    assert changes is None
+
+def testChangesOnly(journal):
+    """
+    Test that only devices whose status changed are returned, by position.
+    """
+    seq, changes = journal.advance([True, False, False], since=1)
+    assert seq == 2
+    assert changes == {1: False}
+
+def testNoChanges(journal):
+    """
+    Test that a stable fleet returns an empty set of changes.
+    """
+    _, changes = journal.advance([True, True, False], since=1)
+    assert changes == {}
+
+def testMergesMissedPolls(journal):
+    """
+    Test that changes from polls made by other clients are included, latest status winning.
+    """
+    journal.advance([False, True, False], since=1)
+    journal.advance([True, True, True], since=2)
+    _, changes = journal.advance([True, True, True], since=1)
+    assert changes == {0: True, 2: True}
+
+def testExpiredHistory(journal):
+    """
+    Test that a client older than the kept history gets a full snapshot.
+    """
+    for _ in range(6):
+        journal.advance([True, True, False], since=0)
+    _, changes = journal.advance([True, True, False], since=1)
+    assert changes is None
+
+def testFutureSequence(journal):
+    """
+    Test that a sequence number from a previous run gets a full snapshot.
+    """
+    _, changes = journal.advance([True, True, False], since=50)
+    assert changes is None
+
+def testPeriodicSnapshot():
+    """
+    Test that crossing a snapshot interval forces a full snapshot.
+    """
+    journal = StatusJournal(history=10, snapshotInterval=3)
+    journal.advance([True], since=0) # seq 1
+    assert journal.advance([True], since=1)[1] == {} # seq 2
+    assert journal.advance([True], since=2)[1] is None # seq 3, interval crossed
+    assert journal.advance([True], since=3)[1] == {} # seq 4
+
+def testFleetResize(journal):
+    """
+    Test that a change in the number of devices marks every device as changed.
+    """
+    _, changes = journal.advance([True, True], since=1)
+    assert changes == {0: True, 1: True}
@@ -1,9 +1,12 @@
 """
 This file contains the test suite for a Flask API that simulates network devices.
 """
+import json
+import numpy as np
 import pytest
-from app.app import generateDevices, app, main
+from app.app import generateDevices, generateFleet, app, main, pollStatus, streamStatus
 from app.Device import Device
+from app.encoding import BITSET_HEADER
 
 # Fixture to initialize Flask test client and attach devices to the app.
 
@@ -40,6 +43,206 @@ def testFlaskResponseNoDevices(client):
     response = client.get("/devices")
     assert response.status_code == 202
 
+def testStreamResponse(client):
+    """
+    Test that ?format=ndjson streams one JSON object per device.
+    """
+    response = client.get("/devices?format=ndjson")
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in lines] == [0, 1]
+
+def testStreamAcceptHeader(client):
+    """
+    Test that an Accept header preferring NDJSON streams the response.
+    """
+    response = client.get("/devices", headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+
+def testDefaultResponseIsJSON(client):
+    """
+    Test that clients not asking for NDJSON still receive a JSON array.
+    """
+    response = client.get("/devices", headers={'Accept': '*/*'})
+    assert response.mimetype == 'application/json'
+    assert len(response.get_json()) == 2
+
+def testStreamStatusChunks():
+    """
+    Test that streamStatus yields one chunk per chunkSize devices.
+    """
+    devices = generateDevices(5, ["Router"], "192.168.0.")
+    chunks = list(streamStatus(devices, chunkSize=2))
+
+    assert len(chunks) == 3
+    assert sum(chunk.count('\n') for chunk in chunks) == 5
+
+def testStreamNoDevices():
+    """
+    Test that streaming an empty fleet still returns a 202 (Empty) status code.
+    """
+    app.devices = []
+    response = app.test_client().get("/devices?format=ndjson")
+    assert response.status_code == 202
+
+def testDeviceStatusResponse200(client):
+    """
+    Test that a single device can be queried by id.
+    """
+    response = client.get("/devices/1")
+    assert response.status_code == 200
+    assert response.get_json()['id'] == 1
+
+def testDeviceStatusSchema(client):
+    """
+    Test that a single device response matches the records from /devices.
+    """
+    response = client.get("/devices/0")
+    assert set(response.get_json()) == {'id', 'name', 'ip_address', 'status'}
+
+def testDeviceStatusResponse404(client):
+    """
+    Test that querying an unknown device id returns a 404 (Not Found) status code.
+    """
+    response = client.get("/devices/99")
+    assert response.status_code == 404
+
+def testDeviceStatusUnorderedIds():
+    """
+    Test that devices are found by id when the list is not ordered by id.
+    """
+    app.devices = [Device(7, 'Router_7', '192.168.0.7'), Device(3, 'Switch_3', '192.168.0.3')]
+    response = app.test_client().get("/devices/3")
+    assert response.get_json()['name'] == 'Switch_3'
+
+def testFleetResponse():
+    """
+    Test that /devices serves a DeviceFleet in the same format as a list of devices.
+    """
+    app.devices = generateFleet(3, ["Router"], "192.168.0.")
+    response = app.test_client().get("/devices")
+
+    assert response.status_code == 200
+    assert [d['id'] for d in response.get_json()] == [0, 1, 2]
+
+def testFleetStream():
+    """
+    Test that a DeviceFleet can be streamed.
+    """
+    app.devices = generateFleet(3, ["Router"], "192.168.0.")
+    response = app.test_client().get("/devices?format=ndjson")
+
+    assert len(response.get_data(as_text=True).splitlines()) == 3
+
+def testFleetDeviceStatus():
+    """
+    Test that a single device of a DeviceFleet can be queried by id.
+    """
+    app.devices = generateFleet(3, ["Router"], "192.168.0.")
+    client = app.test_client()
+
+    assert client.get("/devices/2").get_json()['ip_address'] == '192.168.0.2'
+    assert client.get("/devices/5").status_code == 404
+
+def testChangesSnapshot(client):
+    """
+    Test that ?since=0 returns a full snapshot and a sequence number.
+    """
+    payload = client.get("/devices?since=0").get_json()
+
+    assert payload['full'] is True
+    assert payload['seq'] == 1
+    assert set(payload['devices'][0]) == {'id', 'name', 'ip_address', 'status'}
+
+def testChangesDelta():
+    """
+    Test that a later poll only returns the devices whose status changed.
+    """
+    app.devices = [Device(0, 'Router_0', '192.168.0.0', avail=1), Device(1, 'Router_1', '192.168.0.1', avail=1)]
+    client = app.test_client()
+    seq = client.get("/devices?since=0").get_json()['seq']
+
+    app.devices[1] = Device(1, 'Router_1', '192.168.0.1', avail=0) # Device 1 goes down.
+    payload = client.get(f"/devices?since={seq}").get_json()
+
+    # Replacing a device keeps the same list, so the journal carries on.
+    assert payload['full'] is False
+    assert payload['devices'] == [{'id': 1, 'status': False}]
+
+def testChangesNewDevices():
+    """
+    Test that serving a new set of devices starts a new journal.
+    """
+    app.devices = generateDevices(2, ["Router"], "192.168.0.")
+    client = app.test_client()
+    client.get("/devices?since=0")
+
+    app.devices = generateDevices(3, ["Router"], "192.168.0.")
+    payload = client.get("/devices?since=1").get_json()
+
+    assert payload['full'] is True
+    assert len(payload['devices']) == 3
+
+def unpackBitset(payload):
+    """
+    Split a bitset response into its header fields and statuses.
+    """
+    magic, version, count = BITSET_HEADER.unpack_from(payload)
+    bits = np.frombuffer(payload, dtype=np.uint8, offset=BITSET_HEADER.size)
+    return magic, version, np.unpackbits(bits, count=count, bitorder='little').astype(bool).tolist()
+
+@pytest.mark.parametrize('generate', [generateDevices, generateFleet])
+def testBitsetResponse(generate):
+    """
+    Test that the bitset carries one status per device, ordered by the versioned metadata.
+    """
+    app.devices = generate(20, ["Router"], "10.0.0.")
+    client = app.test_client()
+
+    response = client.get("/devices", headers={'Accept': 'application/x-device-bitset'})
+    metadata = client.get("/devices/metadata")
+    magic, version, status = unpackBitset(response.get_data())
+
+    assert response.mimetype == 'application/x-device-bitset'
+    assert magic == b'DVBS'
+    assert len(status) == 20
+    assert int(response.headers['X-Device-List-Version']) == version
+    assert int(metadata.headers['X-Device-List-Version']) == version
+    assert metadata.get_json() == [{k: v for k, v in d.items() if k != 'status'} for d in client.get("/devices").get_json()]
+
+def testBitsetStatus():
+    """
+    Test that each bit is the status of the device at that position.
+    """
+    app.devices = [Device(i, f'Router_{i}', f'192.168.0.{i}', avail=i % 3 != 0) for i in range(10)]
+    client = app.test_client()
+
+    assert unpackBitset(client.get("/devices?format=bitset").get_data())[2] == [i % 3 != 0 for i in range(10)]
+
+def testBitsetNotPreferred(client):
+    """
+    Test that clients preferring JSON still get JSON.
+    """
+    response = client.get("/devices", headers={'Accept': 'application/json, application/x-device-bitset;q=0.5'})
+    assert response.mimetype == 'application/json'
+
+def testMetadataRevalidation():
+    """
+    Test that the device list version is its ETag, and changes with the devices.
+    """
+    app.devices = generateDevices(3, ["Router"], "192.168.0.")
+    client = app.test_client()
+    etag = client.get("/devices/metadata").headers['ETag']
+
+    assert client.get("/devices/metadata", headers={'If-None-Match': etag}).status_code == 304
+
+    app.devices = generateDevices(4, ["Router"], "192.168.0.")
+    response = client.get("/devices/metadata", headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 4
+
 # Main function error handling tests
 
 def testMainTypeError():
@@ -79,4 +282,76 @@ def testGenerateDevicesUniqueIDs():
     devices = generateDevices(5, ["Device"], "10.0.0.")  # Generate 5 devices
     ids = [d()['id'] for d in devices] # Call each device as Dict and parse ID
     # If length of collection and length of set of collection are equal, items are unique.
-    assert len(ids) == len(set(ids))  # IDs should be unique
\ No newline at end of file
+    assert len(ids) == len(set(ids))  # IDs should be unique
+
+def testGenerateDevicesCorrelated():
+    """
+    Test that each block of 256 devices is reached through its first router.
+    """
+    devices = generateDevices(600, ["Router", "Switch"], "10.0.0.", mttr=5, correlated=True, seed=1)
+    routers = [next(d for d in devices[s:s + 256] if d()['name'].startswith("Router_")) for s in (0, 256, 512)]
+
+    for router in routers:
+        while router.isAwake: # Poll the routers until they are all down.
+            router()
+    for device in devices:
+        if device not in routers:
+            assert device()['status'] is False
+
+def testPollStatusGatewaysFirst():
+    """
+    Test that devices listed before their router are reported against the routers status from the same poll.
+    """
+    devices = generateDevices(300, ["Router", "Switch"], "10.0.0.", mttr=2, correlated=True, seed=9)
+    router = next(d for d in devices if d.metadata()['name'].startswith("Router_"))
+    assert router.id > 0 # Some devices are listed before it.
+
+    for _ in range(50):
+        status = pollStatus(devices, 0, 256)
+        if not router.isAwake:
+            assert not any(status[:router.id])
+
+@pytest.mark.parametrize('generate', [generateDevices, generateFleet])
+def testStreamGatewaysAcrossChunks(generate):
+    """
+    Test that streamed devices see their routers status from the same poll, whichever chunk the router is in.
+    """
+    names = ["Router", "Switch", "Phone", "Firewall", "PC"] # Routers are rarely first in their subnet.
+    devices = generate(600, names, "10.0.0.", correlated=True, seed=5) # Independent draws each poll.
+
+    for _ in range(20):
+        records = [json.loads(line) for chunk in streamStatus(devices, chunkSize=7) for line in chunk.splitlines()]
+        gateways = {}
+        for record in records: # Each subnet of 256 ids is reached through its first router.
+            if record['name'].startswith("Router_"):
+                gateways.setdefault(record['id'] // 256, record)
+
+        for record in records:
+            gateway = gateways.get(record['id'] // 256)
+            if record['status'] and gateway is not None and not record['name'].startswith("Router_"):
+                assert gateway['status'], f"{record['name']} is up behind {gateway['name']}, which is down"
+
+def testGenerateDevicesSeeded():
+    """
+    Test that devices generated with the same seed have the same names and statuses.
+    """
+    first = generateDevices(50, ["Router", "Switch"], "10.0.0.", mttr=3, correlated=True, seed=2)
+    second = generateDevices(50, ["Router", "Switch"], "10.0.0.", mttr=3, correlated=True, seed=2)
+
+    assert [[d() for d in first] for _ in range(5)] == [[d() for d in second] for _ in range(5)]
+
+@pytest.mark.parametrize('generate', [generateDevices, generateFleet])
+def testPreEncodedResponses(generate):
+    """
+    Test that responses spliced from pre-encoded devices are the JSON of their status records.
+    """
+    app.devices = generate(300, ["Router", "Switch"], "10.0.0.", mttr=50, seed=4) # Statuses rarely change between polls.
+    client = app.test_client()
+
+    records = client.get("/devices").get_json()
+    snapshot = client.get("/devices?since=0").get_json()
+    lines = client.get("/devices?format=ndjson").get_data(as_text=True).splitlines()
+
+    assert [(r['id'], r['name'], r['ip_address']) for r in records] == [(d['id'], d['name'], d['ip_address']) for d in snapshot['devices']]
+    assert [json.loads(line)['name'] for line in lines] == [r['name'] for r in records]
+    assert client.get("/devices/5").get_json()['name'] == records[5]['name']
@@ -0,0 +1,60 @@
+"""
+This file contains a test suite for the JSON encoding of API responses.
+"""
+import json
+import pytest
+from app import encoding
+import numpy as np
+from app.encoding import BITSET_HEADER, STATUS_SUFFIXES, dumps, encodeBitset, listVersion, statusPrefix
+
+RECORD = {'id': 7, 'name': 'Router_7', 'ip_address': '10.0.0.7', 'status': True}
+
+@pytest.fixture(params=['orjson', 'json'])
+def encoder(request, monkeypatch):
+    """
+    Encode with orjson when installed, and with the json module.
+    """
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(encoding, 'orjson', None)
+    return request.param
+
+def testDumpsCompact(encoder):
+    """
+    Test that both encoders give the same compact JSON.
+    """
+    assert dumps([RECORD, {'a': None}]) == '[{"id":7,"name":"Router_7","ip_address":"10.0.0.7","status":true},{"a":null}]'
+
+def testStatusPrefix(encoder):
+    """
+    Test that a prefix joined with either status suffix encodes the record with that status.
+    """
+    prefix = statusPrefix(RECORD)
+
+    assert prefix + STATUS_SUFFIXES[True] == dumps(RECORD)
+    assert json.loads(prefix + STATUS_SUFFIXES[False]) == {**RECORD, 'status': False}
+
+def testEncodeBitset():
+    """
+    Test that statuses are packed least significant bit first after the header.
+    """
+    status = [True, False, False, True, True, False, False, False, True]
+    payload = encodeBitset(42, status)
+
+    assert BITSET_HEADER.unpack_from(payload) == (b'DVBS', 42, 9)
+    assert payload[BITSET_HEADER.size:] == bytes([0b00011001, 0b00000001])
+
+def testEncodeBitsetSize():
+    """
+    Test that a million devices fit in 125 KB plus the header.
+    """
+    assert len(encodeBitset(0, np.ones(1_000_000, dtype=bool))) == 125_000 + BITSET_HEADER.size
+
+def testListVersion():
+    """
+    Test that the version identifies the device list.
+    """
+    assert listVersion('[{"id":1}]') == listVersion('[{"id":1}]')
+    assert listVersion('[{"id":1}]') != listVersion('[{"id":2}]')
+    assert 0 <= listVersion('[]') < 2 ** 64
@@ -0,0 +1,60 @@
+"""
+Benchmarks for the resourcemonitor project.
+
+Each benchmark is a standalone script run from the resourcemonitor directory, e.g.
+    python -m benchmarks.bench_ingest
+
+Benchmarks never touch db.sqlite3, they run against a throwaway SQLite file.
+"""
+import os
+import tempfile
+
+import django
+
+
+def setupDjango(dbPath: str = None) -> str:
+    """
+    Configure Django against a temporary SQLite database and create the schema.
+
+    Args:
+        dbPath (str, optional): Path of the SQLite file to use.
+            Defaults to a new file in the system temp directory.
+
+    Returns:
+        str: The path of the database in use.
+    """
+    if dbPath is None:
+        handle, dbPath = tempfile.mkstemp(prefix="resourcemonitor-bench-", suffix=".sqlite3")
+        os.close(handle)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "resourcemonitor.settings")
+
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = dbPath # Must happen before the first connection.
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    return dbPath
+
+
+def fakeDevices(count: int, offset: int = 0) -> list:
+    """
+    Build a list of device records shaped like the Flask API response.
+
+    Args:
+        count (int): Number of devices to generate.
+        offset (int): First device id.
+
+    Returns:
+        list: The generated device dictionaries.
+    """
+    return [
+        {
+            "id": i,
+            "name": f"Router_{i}",
+            "ip_address": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            "status": i % 7 != 0,
+        }
+        for i in range(offset, offset + count)
+    ]
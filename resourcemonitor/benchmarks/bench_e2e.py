@@ -0,0 +1,278 @@
+"""
+End-to-end load test of the poll -> ingest -> dashboard pipeline.
+
+Serves the Flask simulator with N devices, seeds a throwaway database with
+history of a configurable size, then starts the Django app (under uvicorn,
+as deployed) and the collector as separate processes against them.
+Pages and API endpoints are requested at a fixed concurrency for a fixed time,
+and throughput, latency percentiles, database size and peak RSS are reported as JSON,
+so results can be compared between releases.
+
+Usage:
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --devices 10000 --history-hours 168 --concurrency 32 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from benchmarks import setupDjango, fakeDevices
+from benchmarks.bench_poller import serveSimulator
+
+PROJECT_DIR: Path = Path(__file__).resolve().parents[1] # The resourcemonitor directory, holding manage.py.
+ENDPOINTS: List[str] = ["/devices", "/", "/dashboard", "/api/metrics/availability", "/api/metrics/timeline"]
+
+
+def freePort() -> int:
+    """
+    A localhost port nothing is listening on.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seedHistory(numDevices: int, hours: int, metricsPerHour: int, samplePolls: int, seed: int) -> Dict[str, int]:
+    """
+    Fill the history tables as a long running install would have them.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from healthstatus.models import DeviceHourlyAvailability, SystemMetric
+    from healthstatus.storage import getSampleStore
+    from healthstatus.utils import ingestDevices
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    now = timezone.now()
+    devices: List[dict] = fakeDevices(numDevices)
+    ingestDevices(devices) # Creates the Device rows.
+
+    hourStart = now.replace(minute=0, second=0, microsecond=0)
+    for hour in range(1, hours + 1):
+        with transaction.atomic():
+            total = 720 # One poll every 5 seconds.
+            up = rng.binomial(total, 0.97, numDevices).tolist()
+            DeviceHourlyAvailability.objects.bulk_create(
+                [DeviceHourlyAvailability(device_id=d["id"], hour=hourStart - timedelta(hours=hour),
+                                          successful_attempts=ok, total_attempts=total)
+                 for d, ok in zip(devices, up)],
+                batch_size=1000,
+            )
+            SystemMetric.objects.bulk_create(
+                [SystemMetric(endpoint=random.choice(ENDPOINTS), status_code=200, success=True,
+                              timestamp=now - timedelta(hours=hour, seconds=random.random() * 3600))
+                 for _ in range(metricsPerHour)],
+                batch_size=1000,
+            )
+
+    store = getSampleStore()
+    for poll in range(samplePolls):
+        with transaction.atomic():
+            store.writeSamples(devices, now - timedelta(seconds=5 * (poll + 1)))
+
+    return {
+        "hourly_rows": numDevices * hours,
+        "metric_rows": metricsPerHour * hours,
+        "sample_rows": numDevices * samplePolls,
+    }
+
+
+def databaseBytes(dbPath: str) -> int:
+    """
+    Size of the database, including its write-ahead log.
+    """
+    return sum(os.path.getsize(p) for p in (dbPath, dbPath + "-wal") if os.path.exists(p))
+
+
+def peakRss(pid: int) -> Optional[int]:
+    """
+    Peak resident set size in bytes of a process and its children (Linux only).
+    """
+    total: int = 0
+    pending: List[int] = [pid]
+    try:
+        while pending:
+            current: int = pending.pop()
+            for line in Path(f"/proc/{current}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    total += int(line.split()[1]) * 1024
+            for task in Path(f"/proc/{current}/task").iterdir():
+                pending.extend(int(c) for c in (task / "children").read_text().split())
+    except OSError:
+        return None
+    return total
+
+
+def startProcess(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    """
+    Start a Django process in the project directory.
+    """
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=PROJECT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, # An unread pipe would block the process once full.
+    )
+
+
+async def waitUntilServing(baseUrl: str, timeout: float = 30.0) -> None:
+    """
+    Wait for the app to answer a request.
+    """
+    deadline: float = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{baseUrl}/dashboard") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("The Django app did not start.")
+            await asyncio.sleep(0.2)
+
+
+async def drive(baseUrl: str, endpoints: List[str], concurrency: int, duration: float) -> Tuple[List[tuple], float]:
+    """
+    Request the endpoints in turn from concurrency clients until duration seconds pass.
+    Returns (endpoint, latency ms, status) of every request, and the elapsed seconds.
+    """
+    results: List[tuple] = []
+    deadline: float = time.monotonic() + duration
+
+    async def client(offset: int, session: aiohttp.ClientSession) -> None:
+        i: int = offset
+        while time.monotonic() < deadline:
+            endpoint: str = endpoints[i % len(endpoints)]
+            i += 1
+            began: float = time.perf_counter()
+            try:
+                async with session.get(baseUrl + endpoint) as resp:
+                    await resp.read()
+                    status: int = resp.status
+            except aiohttp.ClientError:
+                status = 0
+            results.append((endpoint, (time.perf_counter() - began) * 1000, status))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        began: float = time.perf_counter()
+        await asyncio.gather(*(client(c, session) for c in range(concurrency)))
+        return results, time.perf_counter() - began
+
+
+def summarise(requests: List[tuple], elapsed: float) -> dict:
+    """
+    Throughput and latency percentiles of a set of requests.
+    """
+    latencies: np.ndarray = np.array([r[1] for r in requests]) if requests else np.zeros(1)
+    return {
+        "requests": len(requests),
+        "errors": sum(1 for r in requests if not 200 <= r[2] < 400),
+        "throughput_rps": round(len(requests) / elapsed, 1),
+        "latency_ms": {
+            **{f"p{q}": round(float(np.percentile(latencies, q)), 2) for q in (50, 90, 95, 99)},
+            "max": round(float(latencies.max()), 2),
+        },
+    }
+
+
+def main(numDevices: int, hours: int, metricsPerHour: int, samplePolls: int, concurrency: int,
+         duration: float, endpoints: List[str], workers: int, pollInterval: float, mttr: Optional[float],
+         correlated: bool, seed: int) -> dict:
+    random.seed(seed)
+    dbPath: str = setupDjango()
+    server = serveSimulator(numDevices, mttr=mttr, correlated=correlated, seed=seed) # Outages as a real fleet has them.
+    processes: Dict[str, subprocess.Popen] = {}
+
+    try:
+        began: float = time.perf_counter()
+        seeded: Dict[str, int] = seedHistory(numDevices, hours, metricsPerHour, samplePolls, seed)
+        seedSeconds: float = time.perf_counter() - began
+        from django.db import connections
+        connections.close_all()
+
+        port: int = freePort()
+        baseUrl: str = f"http://127.0.0.1:{port}"
+        env: Dict[str, str] = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": "resourcemonitor.settings",
+            "RESOURCEMONITOR_DB": dbPath,
+            "DEVICE_API_URL": f"http://127.0.0.1:{server.server_port}/devices",
+        }
+        processes["collector"] = startProcess(
+            ["manage.py", "collect_devices", "--interval", str(pollInterval)], env
+        )
+        processes["server"] = startProcess(
+            ["-m", "uvicorn", "resourcemonitor.asgi:application", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning", "--no-access-log"], env
+        )
+        asyncio.run(waitUntilServing(baseUrl))
+
+        requests, elapsed = asyncio.run(drive(baseUrl, endpoints, concurrency, duration))
+
+        from healthstatus.models import Device
+        results: dict = {
+            "config": {
+                "devices": numDevices, "history_hours": hours, "concurrency": concurrency,
+                "duration_seconds": duration, "workers": workers, "mttr": mttr, "correlated": correlated, "seed": seed,
+            },
+            "seeded": {**seeded, "seconds": round(seedSeconds, 2)},
+            "total": summarise(requests, elapsed),
+            "endpoints": {
+                endpoint: summarise([r for r in requests if r[0] == endpoint], elapsed) for endpoint in endpoints
+            },
+            "collector_polls": Device.objects.get(device_id=fakeDevices(1)[0]["id"]).total_attempts - 1, # Seeding stored one poll.
+            "db_bytes": databaseBytes(dbPath),
+            "peak_rss_bytes": {name: peakRss(process.pid) for name, process in processes.items()},
+        }
+        results["peak_rss_bytes"]["harness"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return results
+    finally:
+        for process in processes.values():
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        server.shutdown()
+        for path in (dbPath, dbPath + "-wal", dbPath + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--history-hours', type=int, default=24, help='Hours of hourly availability and request logs to seed.')
+    parser.add_argument('--metrics-per-hour', type=int, default=1000, help='Request logs seeded per hour of history.')
+    parser.add_argument('--sample-polls', type=int, default=100, help='Polls of device samples to seed.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to drive load for.')
+    parser.add_argument('--endpoints', nargs='+', default=ENDPOINTS)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes.')
+    parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds between collector polls.')
+    parser.add_argument('--mttr', type=float, default=20.0, help='Mean polls a simulated device stays down for.')
+    parser.add_argument('--independent', action='store_true', help='Draw every status independently, without outages.')
+    parser.add_argument('--uncorrelated', action='store_true', help="Keep subnets up while their router is down.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(main(
+        args.devices, args.history_hours, args.metrics_per_hour, args.sample_polls, args.concurrency,
+        args.duration, args.endpoints, args.workers, args.poll_interval,
+        None if args.independent else args.mttr, not args.uncorrelated, args.seed,
+    ), indent=2))
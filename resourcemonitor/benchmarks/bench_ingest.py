@@ -0,0 +1,79 @@
+"""
+Benchmark for storing one poll of the Flask API in DeviceStatus.
+
+Compares the original path (one DeviceStatus.objects.create per device)
+against the batched ingestDevices path, and reports rows/sec per fleet size.
+
+Usage:
+    python -m benchmarks.bench_ingest
+    python -m benchmarks.bench_ingest --sizes 100 1000 --batch-size 1000
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+from benchmarks import setupDjango, fakeDevices
+
+
+def legacyIngest(devices: List[dict]) -> int:
+    """
+    The original ingestion loop, one autocommit INSERT per device.
+    """
+    from healthstatus.models import DeviceStatus
+
+    for d in devices:
+        DeviceStatus.objects.create(
+            device_id=d["id"],
+            name=d["name"],
+            ip_address=d["ip_address"],
+            status=d["status"],
+        )
+    return len(devices)
+
+
+def timeIngest(func, devices: List[dict], **kwargs) -> float:
+    """
+    Time a single ingestion, returning rows per second.
+    """
+    start: float = time.perf_counter()
+    func(devices, **kwargs)
+    elapsed: float = time.perf_counter() - start
+    return len(devices) / elapsed
+
+
+def main(sizes: List[int], batchSize: int, legacyLimit: int) -> Dict[str, dict]:
+    dbPath: str = setupDjango()
+
+    from healthstatus.models import DeviceStatus
+    from healthstatus.utils import ingestDevices
+
+    results: Dict[str, dict] = {}
+    try:
+        for size in sizes:
+            devices: List[dict] = fakeDevices(size)
+            row: dict = {"batched_rows_per_sec": round(timeIngest(ingestDevices, devices, batchSize=batchSize))}
+
+            if size <= legacyLimit: # The per-row path takes minutes at large sizes.
+                row["legacy_rows_per_sec"] = round(timeIngest(legacyIngest, devices))
+                row["speedup"] = round(row["batched_rows_per_sec"] / row["legacy_rows_per_sec"], 1)
+
+            results[str(size)] = row
+            DeviceStatus.objects.all().delete()
+    finally:
+        os.remove(dbPath)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000, 100000])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='Largest fleet size to run the per-row path for.')
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.sizes, args.batch_size, args.legacy_limit), indent=2))
@@ -0,0 +1,92 @@
+"""
+Benchmark for polling every device on its own endpoint.
+
+Serves the Flask simulator in a background thread with N devices,
+then measures how long one concurrent polling cycle takes per fleet size.
+
+Usage:
+    python -m benchmarks.bench_poller
+    python -m benchmarks.bench_poller --sizes 100 1000 --concurrency 50
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks import setupDjango
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2])) # Repository root, for the api package.
+
+
+class QuietHandler(WSGIRequestHandler):
+    """
+    Keep-alive request handler without per-request access logs.
+    """
+    protocol_version = "HTTP/1.1" # As set in app.main
+
+    def log_request(self, *args, **kwargs) -> None:
+        pass
+
+
+def serveSimulator(numDevices: int, **options):
+    """
+    Start the Flask device simulator on a free localhost port.
+    options are passed to generateDevices, e.g. mttr, correlated and seed.
+
+    Returns:
+        werkzeug.serving.BaseWSGIServer: The running server.
+    """
+    from api.app.app import app, generateDevices
+
+    app.devices = generateDevices(numDevices, ['Router', 'Switch'], '10.0.0.', **options)
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(sizes: List[int], concurrency: int, timeout: float) -> Dict[str, dict]:
+    dbPath: str = setupDjango()
+
+    from healthstatus.client import DeviceApiClient
+    from healthstatus.poller import pollFleet
+
+    results: Dict[str, dict] = {}
+    try:
+        for size in sizes:
+            server = serveSimulator(size)
+            url: str = f"http://127.0.0.1:{server.server_port}/devices"
+
+            client = DeviceApiClient(url, poolSize=concurrency, timeout=timeout)
+
+            start: float = time.perf_counter()
+            devices, failed = pollFleet(client, range(size), concurrency, timeout)
+            elapsed: float = time.perf_counter() - start
+            client.close()
+            server.shutdown()
+
+            results[str(size)] = {
+                "cycle_seconds": round(elapsed, 3),
+                "devices_per_sec": round(size / elapsed),
+                "unreachable": len(failed),
+            }
+    finally:
+        os.remove(dbPath)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 5000, 10000])
+    parser.add_argument('--concurrency', type=int, default=10, help='Requests in flight, and pooled connections.')
+    parser.add_argument('--timeout', type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.sizes, args.concurrency, args.timeout), indent=2))
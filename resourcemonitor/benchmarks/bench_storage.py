@@ -0,0 +1,129 @@
+"""
+Benchmark comparing per-poll samples with interval storage of device history.
+
+Stores the same simulated polls once as a DeviceStatus sample of every device
+per poll (the layout used before every collector mode stored only transitions)
+and once as DeviceInterval rows, then reports the rows and bytes used by each table and
+the time taken to compute availability from each.
+
+Usage:
+    python -m benchmarks.bench_storage
+    python -m benchmarks.bench_storage --devices 5000 --polls 100 --change-rate 0.01
+"""
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import setupDjango, fakeDevices
+
+
+def tableBytes(table: str) -> int:
+    """
+    Bytes used by a table and its indexes, or None if SQLite lacks the dbstat table.
+    """
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                [table, table],
+            )
+        except Exception:
+            return None
+        return cursor.fetchone()[0]
+
+
+def legacyDeviceAvail() -> pd.DataFrame:
+    """
+    The original getDeviceAvail, a pandas aggregation over every sample.
+    """
+    from healthstatus.models import DeviceStatus
+
+    df: pd.DataFrame = pd.DataFrame(DeviceStatus.objects.all().values())
+    return df.groupby('name').agg(SUCCESSFUL_ATTEMPTS=('status', 'sum'), TOTAL_ATTEMPTS=('status', 'count'))
+
+
+def writeSamples(devices: List[dict]) -> None:
+    """
+    Store a sample of every device, as per-poll sample storage did.
+    """
+    from django.utils import timezone
+    from healthstatus.storage import getSampleStore
+
+    getSampleStore().writeSamples(devices, timezone.now(), 500)
+
+
+def simulate(numDevices: int, numPolls: int, changeRate: float, seed: int, ingest: Callable[[List[dict]], object]) -> None:
+    """
+    Ingest numPolls polls where changeRate of the devices flip status each poll.
+    """
+    rng: np.random.Generator = np.random.default_rng(seed)
+    devices: List[dict] = fakeDevices(numDevices)
+    status: np.ndarray = rng.random(numDevices) < 0.95
+
+    for _ in range(numPolls):
+        status ^= rng.random(numDevices) < changeRate
+        for device, up in zip(devices, status.tolist()):
+            device["status"] = up
+        ingest(devices)
+
+
+def timed(func, *args) -> float:
+    start: float = time.perf_counter()
+    func(*args)
+    return round(time.perf_counter() - start, 4)
+
+
+def main(numDevices: int, numPolls: int, changeRate: float, seed: int) -> Dict[str, dict]:
+    dbPath: str = setupDjango()
+
+    from django.conf import settings
+    from django.utils import timezone
+    from healthstatus.models import DeviceInterval, DeviceStatus
+    from healthstatus.utils import getIntervalAvail, ingestDevices
+
+    results: Dict[str, dict] = {}
+    try:
+        simulate(numDevices, numPolls, changeRate, seed, writeSamples)
+        results["samples"] = {
+            "rows": DeviceStatus.objects.count(),
+            "bytes": tableBytes(DeviceStatus._meta.db_table),
+            "availability_seconds": timed(legacyDeviceAvail),
+        }
+
+        settings.DEVICE_STORAGE_MODE = "intervals"
+        started = timezone.now()
+        simulate(numDevices, numPolls, changeRate, seed, ingestDevices)
+        results["intervals"] = {
+            "rows": DeviceInterval.objects.count(),
+            "bytes": tableBytes(DeviceInterval._meta.db_table),
+            "availability_seconds": timed(getIntervalAvail, started),
+        }
+
+        results["row_reduction"] = round(results["samples"]["rows"] / results["intervals"]["rows"], 1)
+        results["query_speedup"] = round(
+            results["samples"]["availability_seconds"] / results["intervals"]["availability_seconds"], 1
+        )
+    finally:
+        os.remove(dbPath)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--polls', type=int, default=200)
+    parser.add_argument('--change-rate', type=float, default=0.02, help='Share of devices changing status per poll.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.devices, args.polls, args.change_rate, args.seed), indent=2))
@@ -0,0 +1,104 @@
+"""
+Benchmark comparing the SampleStore backends.
+
+Writes the same simulated polls to the ORM (DeviceStatus) and Parquet backends,
+then reports ingestion speed, storage size, and the time taken to read a range
+of samples and to compute availability from each.
+
+Usage:
+    python -m benchmarks.bench_timeseries
+    python -m benchmarks.bench_timeseries --devices 10000 --polls 100
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks import setupDjango, fakeDevices
+
+
+def simulate(store, numDevices: int, numPolls: int, start: datetime, seed: int) -> float:
+    """
+    Write numPolls polls 5 seconds apart, returning samples written per second.
+    """
+    from django.db import transaction
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    devices: List[dict] = fakeDevices(numDevices)
+    status: np.ndarray = rng.random(numDevices) < 0.95
+
+    elapsed: float = 0.0
+    for poll in range(numPolls):
+        status ^= rng.random(numDevices) < 0.02
+        for device, up in zip(devices, status.tolist()):
+            device["status"] = up
+
+        began: float = time.perf_counter()
+        with transaction.atomic(): # One commit per poll, as ingestDevices does, Parquet writes on commit.
+            store.writeSamples(devices, start + timedelta(seconds=5 * poll))
+        elapsed += time.perf_counter() - began
+    return numDevices * numPolls / elapsed
+
+
+def timed(func, *args, **kwargs) -> float:
+    began: float = time.perf_counter()
+    func(*args, **kwargs)
+    return round(time.perf_counter() - began, 4)
+
+
+def main(numDevices: int, numPolls: int, seed: int) -> Dict[str, dict]:
+    dbPath: str = setupDjango()
+    root: str = tempfile.mkdtemp(prefix="resourcemonitor-bench-parquet-")
+
+    from healthstatus.storage import OrmSampleStore, ParquetSampleStore
+
+    start: datetime = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    end: datetime = start + timedelta(seconds=5 * numPolls)
+    middle: datetime = start + (end - start) / 2
+    stores = {"orm": OrmSampleStore(), "parquet": ParquetSampleStore(root)}
+
+    results: Dict[str, dict] = {}
+    try:
+        for name, store in stores.items():
+            results[name] = {"samples_per_sec": round(simulate(store, numDevices, numPolls, start, seed))}
+
+        results["orm"]["bytes"] = os.path.getsize(dbPath)
+        results["parquet"]["bytes"] = sum(p.stat().st_size for p in Path(root).rglob("*.parquet"))
+        results["parquet"]["segments"] = sum(1 for _ in Path(root).rglob("*.parquet"))
+
+        for name, store in stores.items():
+            results[name]["range_seconds"] = timed(store.queryRange, middle, end)
+            results[name]["device_range_seconds"] = timed(store.queryRange, start, end, deviceIds=[1, 2, 3])
+            results[name]["availability_seconds"] = timed(store.availability, start, end)
+
+        stores["parquet"].compact(start.date()) # As the retention job does once the day is over.
+        results["parquet_compacted"] = {
+            "segments": sum(1 for _ in Path(root).rglob("*.parquet")),
+            "range_seconds": timed(stores["parquet"].queryRange, middle, end),
+            "availability_seconds": timed(stores["parquet"].availability, start, end),
+        }
+    finally:
+        for path in (dbPath, dbPath + "-wal", dbPath + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(root)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--polls', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.devices, args.polls, args.seed), indent=2))
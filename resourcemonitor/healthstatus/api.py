@@ -0,0 +1,300 @@
+"""
+This file contains the JSON metrics API used by the metrics dashboard.
+Responses carry an ETag and Last-Modified built from the data versions,
+so a client revalidating unchanged data receives a 304 without the data
+being queried again. Request logs are written on every request without a
+version bump, so the timeline is instead refreshed every TIMELINE_REFRESH seconds.
+
+Query parameters:
+    window: One of WINDOWS (e.g. 24h), ignored if start is given. Defaults to DEFAULT_WINDOW.
+    start, end: ISO 8601 datetimes bounding the time range. end defaults to now.
+    device: Device ids to include, comma separated or repeated (availability and history only).
+    endpoint: Endpoints to include, repeated (timeline only).
+    page, page_size: Pagination (availability and history only).
+"""
+from healthstatus.storage import getSampleStore
+from healthstatus.utils import addSlo, availabilityQuery, getIntervalAvail, getMetricTimeline, getTimelineBucket, getWindowStart, storesIntervals
+from healthstatus.versions import getLastModified, getVersions, DEVICES, METRICS
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.http import HttpRequest, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition, require_GET
+from datetime import datetime, timezone as tz
+from typing import Callable, Dict, List, Optional, Tuple
+import pandas as pd
+
+MAX_PAGE_SIZE: int = 1000
+
+def parseTime(value: str) -> datetime:
+    """
+    Parse an ISO 8601 datetime, treating naive times as UTC.
+
+    Args:
+        value (str): The datetime string.
+
+    Returns:
+        datetime: The aware datetime.
+
+    Raises:
+        ValueError: If value is not a datetime.
+    """
+    parsed: Optional[datetime] = parse_datetime(value.replace(" ", "+")) # An unencoded + arrives as a space.
+    if parsed is None:
+        raise ValueError(f"Invalid datetime: {value!r}")
+    return parsed if timezone.is_aware(parsed) else parsed.replace(tzinfo=tz.utc)
+
+def parseRange(request: HttpRequest) -> Tuple[datetime, datetime]:
+    """
+    The time range a request asks for, from start/end or a window.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        Tuple[datetime, datetime]: Start and end of the range.
+
+    Raises:
+        ValueError: If a datetime is invalid, or start is not before end.
+    """
+    end: datetime = parseTime(request.GET["end"]) if request.GET.get("end") else timezone.now()
+    if request.GET.get("start"):
+        start: datetime = parseTime(request.GET["start"])
+    else:
+        _, start = getWindowStart(request.GET.get("window"), end)
+
+    if start >= end:
+        raise ValueError("start must be before end.")
+    return start, end
+
+def parseDevices(request: HttpRequest) -> Optional[List[int]]:
+    """
+    The device ids a request is filtered to.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        List[int] | None: The device ids, or None for every device.
+
+    Raises:
+        ValueError: If an id is not an integer.
+    """
+    values: List[str] = [v for param in request.GET.getlist("device") for v in param.split(",") if v.strip()]
+    if not values:
+        return None
+    try:
+        return [int(v) for v in values]
+    except ValueError:
+        raise ValueError("device must be a list of integer ids.")
+
+def getState(request: HttpRequest, dataset: str, slot: Callable[[datetime, datetime], datetime],
+             refresh: Optional[float] = None) -> Optional[dict]:
+    """
+    The version and modification time of the data a request would return.
+    Windows ending now change as they slide, not only when data is stored,
+    so the start of the current time slot is part of both.
+    Data written without a version bump is picked up once the refresh period
+    containing the end of the range (or now, if sooner) has passed.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+        dataset (str): The data version the response is built from.
+        slot (Callable[[datetime, datetime], datetime]): Start of the slot the range falls in.
+        refresh (float, optional): Seconds per refresh period. Defaults to changing only with the version.
+
+    Returns:
+        dict | None: The ETag and Last-Modified, or None if the request is invalid.
+    """
+    if not hasattr(request, "_metricsState"): # Both condition callbacks share one lookup.
+        try:
+            start, end = parseRange(request)
+        except ValueError:
+            request._metricsState = None
+            return None
+
+        slotStart: datetime = slot(start, end)
+        (version,) = getVersions(dataset)
+        updated: Optional[datetime] = getLastModified(dataset)
+        etag: str = f"{dataset}-{version}-{int(slotStart.timestamp())}"
+        if refresh:
+            latest: float = min(end, timezone.now()).timestamp()
+            refreshed: datetime = datetime.fromtimestamp(latest // refresh * refresh, tz=tz.utc)
+            etag += f"-{int(refreshed.timestamp())}"
+            slotStart = max(slotStart, refreshed)
+
+        request._metricsState = {
+            "etag": f'"{etag}"',
+            "modified": max(updated, slotStart) if updated else slotStart,
+        }
+    return request._metricsState
+
+def hourSlot(start: datetime, end: datetime) -> datetime:
+    """
+    Availability is summed by the hour, so it only changes as the hour containing start turns.
+    """
+    return start.replace(minute=0, second=0, microsecond=0)
+
+def bucketSlot(start: datetime, end: datetime) -> datetime:
+    """
+    The timeline only changes as start crosses into a new bucket.
+    """
+    size: int = getTimelineBucket(start, end)
+    return datetime.fromtimestamp(start.timestamp() // size * size, tz=tz.utc)
+
+def timelineRefresh() -> float:
+    """
+    Seconds between timeline refreshes, no shorter than the metric writer takes to store a log.
+    """
+    return max(getattr(settings, "TIMELINE_REFRESH", 10.0), getattr(settings, "METRIC_FLUSH_INTERVAL", 1.0))
+
+def addUptime(results: List[dict], start: datetime, end: datetime) -> List[dict]:
+    """
+    Add the share of the window each device spent up, when history is stored as intervals.
+    Unlike availability, which counts polls, uptime weighs each status by how long it lasted.
+
+    Args:
+        results (List[dict]): A page of availabilityQuery rows.
+        start (datetime): Start of the window.
+        end (datetime): End of the window.
+
+    Returns:
+        List[dict]: The rows with uptime (%), None when intervals are not stored.
+    """
+    uptime: Dict[int, float] = {}
+    if storesIntervals() and results:
+        df: pd.DataFrame = getIntervalAvail(start, end, [r["device_id"] for r in results])
+        uptime = dict(zip(df["DEVICE_ID"].tolist(), df["AVAILABILITY"].tolist()))
+    return [{**r, "uptime": uptime.get(r["device_id"])} for r in results]
+
+class StoredChanges:
+    """
+    The status changes stored in a time range, read from the SampleStore one slice at a time,
+    so a Paginator only reads the page it serves and counts the rest.
+    """
+    def __init__(self, start: datetime, end: datetime, deviceIds: Optional[List[int]]) -> None:
+        self.start, self.end, self.deviceIds = start, end, deviceIds
+
+    def count(self) -> int:
+        return getSampleStore().countRange(self.start, self.end, self.deviceIds)
+
+    def __getitem__(self, page: slice) -> List[dict]:
+        df: pd.DataFrame = getSampleStore().queryRange(
+            self.start, self.end, self.deviceIds, limit=page.stop - page.start, offset=page.start
+        )
+        df["timestamp"] = df["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return df.astype(object).to_dict("records") # Python numbers, for the JSON encoder.
+
+def cached(key: str, build: Callable[[], dict]) -> dict:
+    """
+    Fetch a response body from the cache, building it on a miss.
+    Keys include the ETag, so new data is never served stale.
+    """
+    return cache.get_or_set(f"metrics-api:{key}", build, getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 60))
+
+@require_GET
+@condition(
+    etag_func=lambda request: (getState(request, DEVICES, hourSlot) or {}).get("etag"),
+    last_modified_func=lambda request: (getState(request, DEVICES, hourSlot) or {}).get("modified"),
+)
+def availability(request: HttpRequest) -> JsonResponse:
+    """
+    Serve device availability over a time range, one page at a time.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        JsonResponse: A page of devices, best performing first, or a 400 error.
+    """
+    try:
+        start, end = parseRange(request)
+        deviceIds: Optional[List[int]] = parseDevices(request)
+        pageSize: int = min(int(request.GET.get("page_size", 100)), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    def build() -> dict:
+        page = Paginator(availabilityQuery(start, end, deviceIds), max(pageSize, 1)).get_page(request.GET.get("page"))
+        return {
+            "start": start,
+            "end": end,
+            "count": page.paginator.count,
+            "page": page.number,
+            "pages": page.paginator.num_pages,
+            "results": addUptime(addSlo(list(page.object_list), end), start, end),
+        }
+
+    return JsonResponse(cached(f"availability:{request._metricsState['etag']}:{request.GET.urlencode()}", build))
+
+@require_GET
+@condition(
+    etag_func=lambda request: (getState(request, METRICS, bucketSlot, timelineRefresh()) or {}).get("etag"),
+    last_modified_func=lambda request: (getState(request, METRICS, bucketSlot, timelineRefresh()) or {}).get("modified"),
+)
+def timeline(request: HttpRequest) -> JsonResponse:
+    """
+    Serve the System Events Timeline over a time range, aggregated into time buckets.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        JsonResponse: The bucket size and one point per endpoint per bucket, or a 400 error.
+    """
+    try:
+        start, end = parseRange(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    endpoints: List[str] = request.GET.getlist("endpoint")
+
+    def build() -> dict:
+        df: pd.DataFrame = getMetricTimeline(start, end)
+        df["bucket"] = pd.to_datetime(df["bucket"], utc=True).dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+        if endpoints:
+            df = df[df["endpoint"].isin(endpoints)]
+        return {
+            "start": start,
+            "end": end,
+            "bucket_seconds": getTimelineBucket(start, end),
+            "points": df.astype(object).to_dict("records"), # Python numbers, for the JSON encoder.
+        }
+
+    return JsonResponse(cached(f"timeline:{request._metricsState['etag']}:{request.GET.urlencode()}", build))
+
+@require_GET
+@condition(
+    etag_func=lambda request: (getState(request, DEVICES, hourSlot) or {}).get("etag"),
+    last_modified_func=lambda request: (getState(request, DEVICES, hourSlot) or {}).get("modified"),
+)
+def history(request: HttpRequest) -> JsonResponse:
+    """
+    Serve the device status changes stored over a time range, read from the SampleStore, one page at a time.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        JsonResponse: A page of status changes, oldest first, or a 400 error.
+    """
+    try:
+        start, end = parseRange(request)
+        deviceIds: Optional[List[int]] = parseDevices(request)
+        pageSize: int = min(int(request.GET.get("page_size", 100)), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    def build() -> dict:
+        page = Paginator(StoredChanges(start, end, deviceIds), max(pageSize, 1)).get_page(request.GET.get("page"))
+        return {
+            "start": start,
+            "end": end,
+            "count": page.paginator.count,
+            "page": page.number,
+            "pages": page.paginator.num_pages,
+            "results": list(page.object_list),
+        }
+
+    return JsonResponse(cached(f"history:{request._metricsState['etag']}:{request.GET.urlencode()}", build))
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class HealthstatusConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'healthstatus'
+
+    def ready(self):
+        from .database import configureSqlite
+        connection_created.connect(configureSqlite, dispatch_uid="healthstatus.configureSqlite") # Pragmas on every new connection.
@@ -0,0 +1,242 @@
+"""
+This file contains the HTTP client the health status app uses to reach the Flask device API.
+One client is shared by every thread of a process, so polls reuse pooled keep-alive
+connections instead of opening a new TCP connection each time.
+Failed requests are retried with backoff, and a circuit breaker fails fast while the API is down,
+so an outage does not hold callers for the full timeout on every request.
+"""
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional
+import requests
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+def getDeviceApiUrl() -> str:
+    """
+    Resolve the address of the Flask device API, settings.DEVICE_API_URL if set.
+
+    Args:
+        None
+
+    Returns:
+        str: The URL of the /devices endpoint.
+    """
+    if getattr(settings, "DEVICE_API_URL", None):
+        return settings.DEVICE_API_URL
+
+    # Determine if Django is running as part of Docker compose or not
+    if os.getenv("RUN_ENV") == "docker":
+        return "http://network_devices_api:8000/devices" # Address of dependant container.
+    return "http://127.0.0.1:8000/devices" # Fallback for local instances.
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Stops requests to an API after repeated failures.
+    Once open for resetTimeout seconds, one trial request is let through,
+    its success closes the breaker and its failure opens it again.
+
+    Attributes:
+        threshold (int): Consecutive failures which open the breaker.
+        resetTimeout (float): Seconds the breaker stays open before a trial request.
+    """
+    def __init__(self, threshold: int = 5, resetTimeout: float = 30.0) -> None:
+        """
+        Constructor for a closed CircuitBreaker.
+
+        Args:
+            threshold (int): Consecutive failures which open the breaker.
+            resetTimeout (float): Seconds the breaker stays open before a trial request.
+
+        Returns:
+            None
+        """
+        self.threshold: int = threshold
+        self.resetTimeout: float = resetTimeout
+        self.__lock: threading.Lock = threading.Lock()
+        self.__failures: int = 0
+        self.__openedAt: Optional[float] = None
+        self.__trial: Optional[int] = None # Thread running the trial request.
+
+    @property
+    def state(self) -> str:
+        """
+        "closed", "open" or "half-open".
+        """
+        with self.__lock:
+            if self.__openedAt is None:
+                return "closed"
+            if self.__trial is not None or time.monotonic() - self.__openedAt >= self.resetTimeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """
+        Whether a request may be sent now.
+
+        Args:
+            None
+
+        Returns:
+            bool: True if closed, or if this caller is the trial request.
+        """
+        with self.__lock:
+            if self.__openedAt is None:
+                return True
+            if self.__trial is None and time.monotonic() - self.__openedAt >= self.resetTimeout:
+                self.__trial = threading.get_ident() # Only one caller tests the API, the rest keep failing fast.
+                return True
+            return False
+
+    def release(self) -> None:
+        """
+        End the calling thread's trial request if it recorded no outcome, e.g. because it
+        raised an unexpected error, so the next caller may try again instead of the breaker
+        failing fast forever.
+        """
+        with self.__lock:
+            if self.__trial == threading.get_ident():
+                self.__trial = None
+
+    def success(self) -> None:
+        """
+        Record a successful request, closing the breaker.
+        """
+        with self.__lock:
+            self.__failures, self.__openedAt, self.__trial = 0, None, None
+
+    def failure(self) -> None:
+        """
+        Record a failed request, opening the breaker after threshold failures in a row.
+        """
+        with self.__lock:
+            self.__failures += 1
+            if self.__trial is not None or self.__failures >= self.threshold:
+                if self.__openedAt is None or self.__trial is not None:
+                    logger.warning("Device API circuit opened after %d failures", self.__failures)
+                self.__openedAt, self.__trial = time.monotonic(), None
+
+
+class DeviceApiClient:
+    """
+    A pooled, retrying HTTP client for the Flask device API.
+    The requests Session is only used for GETs, without cookies or auth changing,
+    so its urllib3 connection pool can be shared between threads.
+
+    Attributes:
+        url (str): The URL of the /devices endpoint.
+        poolSize (int): Keep-alive connections held open to the API.
+        timeout (float): Seconds to wait for the API to respond.
+        breaker (CircuitBreaker): Fails requests fast while the API is down.
+    """
+    def __init__(self, url: str, poolSize: int = 10, retries: int = 2, backoff: float = 0.2,
+                 timeout: float = 5.0, breaker: Optional[CircuitBreaker] = None) -> None:
+        """
+        Constructor for the DeviceApiClient object.
+
+        Args:
+            url (str): The URL of the /devices endpoint.
+            poolSize (int): Keep-alive connections held open to the API.
+            retries (int): Retries of a request which failed to connect or was answered 502, 503 or 504.
+            backoff (float): Seconds before the first retry, doubling for each retry after it.
+            timeout (float): Seconds to wait for the API to respond.
+            breaker (CircuitBreaker, optional): Defaults to a CircuitBreaker with default settings.
+
+        Returns:
+            None
+        """
+        self.url: str = url
+        self.poolSize: int = poolSize
+        self.timeout: float = timeout
+        self.breaker: CircuitBreaker = breaker or CircuitBreaker()
+        retry = Retry(
+            total=retries, backoff_factor=backoff,
+            status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"}),
+            raise_on_status=False, # Return the last response, callers check its status.
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize, max_retries=retry)
+        self.session: requests.Session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path: str = "", **kwargs) -> requests.Response:
+        """
+        Send a GET request to the device API.
+
+        Args:
+            path (str): Appended to the /devices URL, e.g. "/3".
+            **kwargs: Passed on to requests, e.g. params, headers or stream.
+
+        Returns:
+            requests.Response: The response.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+            requests.RequestException: If the API cannot be reached.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Device API circuit is open, not requesting {self.url}{path}")
+
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            try:
+                resp: requests.Response = self.session.get(self.url + path, **kwargs)
+            except requests.RequestException:
+                self.breaker.failure()
+                raise
+
+            if resp.status_code >= 500:
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+            return resp
+        finally:
+            self.breaker.release() # A trial which raised anything else must not hold the breaker half-open.
+
+    def close(self) -> None:
+        """
+        Close every pooled connection.
+        """
+        self.session.close()
+
+
+_client: Optional[DeviceApiClient] = None
+_clientLock: threading.Lock = threading.Lock()
+
+def getDeviceClient() -> DeviceApiClient:
+    """
+    The process wide DeviceApiClient, configured from settings on first use.
+    The API address is resolved once here, rather than on every request.
+
+    Args:
+        None
+
+    Returns:
+        DeviceApiClient: The shared client.
+    """
+    global _client
+    if _client is None:
+        with _clientLock:
+            if _client is None:
+                _client = DeviceApiClient(
+                    getDeviceApiUrl(),
+                    poolSize=getattr(settings, "DEVICE_API_POOL_SIZE", 10),
+                    retries=getattr(settings, "DEVICE_API_RETRIES", 2),
+                    backoff=getattr(settings, "DEVICE_API_BACKOFF", 0.2),
+                    timeout=getattr(settings, "DEVICE_API_TIMEOUT", 5.0),
+                    breaker=CircuitBreaker(
+                        getattr(settings, "DEVICE_API_BREAKER_THRESHOLD", 5),
+                        getattr(settings, "DEVICE_API_BREAKER_RESET", 30.0),
+                    ),
+                )
+    return _client
@@ -0,0 +1,254 @@
+"""
+This file contains the device collector for the health status app.
+The collector polls the Flask API and stores the results,
+so page views can be served from the latest stored snapshot.
+"""
+from healthstatus.models import Device
+from .client import getDeviceClient
+from .utils import ingestDevices, ingestChanges
+from django.conf import settings
+from django.utils import timezone
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+import requests
+import struct
+import json
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+NDJSON: str = "application/x-ndjson"
+BITSET: str = "application/x-device-bitset"
+BITSET_MAGIC: bytes = b"DVBS"
+BITSET_HEADER: struct.Struct = struct.Struct("<4sQI") # Magic, device list version, device count.
+BITSET_RESYNC_INTERVAL: int = 100 # Bitset polls between full comparisons with the stored state.
+
+_snapshotLock = threading.Lock()
+_snapshot: dict = {"devices": None, "loadedAt": 0.0} # Per-process copy of the latest snapshot.
+_changes: dict = {"seq": 0} # Sequence number of the latest poll made with pollDeviceChanges.
+_bitset: dict = {"version": None, "devices": None, "ids": None, "status": None, "polls": 0} # State of pollDeviceBitset.
+
+def readDevices(resp: requests.Response) -> Iterator[dict]:
+    """
+    Read device records from a Flask API response.
+    Newline delimited JSON is parsed one line at a time as it arrives,
+    a plain JSON array (from servers which do not stream) is parsed whole.
+
+    Args:
+        resp (requests.Response): A response opened with stream=True.
+
+    Returns:
+        Iterator[dict]: The device records.
+    """
+    if resp.headers.get("Content-Type", "").startswith(NDJSON):
+        for line in resp.iter_lines():
+            if line:
+                yield json.loads(line)
+    else:
+        yield from resp.json()
+
+def pollDevices() -> int:
+    """
+    Fetch every device from the Flask API and store the transitions.
+    The poll is streamed, so memory use does not grow with the size of the fleet.
+
+    Args:
+        None
+
+    Returns:
+        int: The number of devices polled.
+
+    Raises:
+        requests.RequestException: If the API cannot be reached or returns an error.
+    """
+    with getDeviceClient().get(headers={"Accept": NDJSON}, stream=True) as resp:
+        resp.raise_for_status()
+        stored: int = ingestDevices(readDevices(resp)) # Stored as it is read, a short transaction per batch.
+
+    logger.info("Stored a poll of %d devices", stored)
+    return stored
+
+def pollDeviceChanges() -> int:
+    """
+    Fetch the devices whose status changed since the previous poll and store the transitions.
+    The first poll, and any poll the API cannot answer with changes, receives a full snapshot.
+
+    Args:
+        None
+
+    Returns:
+        int: The number of state transitions stored.
+
+    Raises:
+        requests.RequestException: If the API cannot be reached or returns an error.
+    """
+    resp: requests.Response = getDeviceClient().get(params={"since": _changes["seq"]})
+    resp.raise_for_status()
+    payload: dict = resp.json()
+
+    stored: int = ingestChanges(payload["devices"], full=payload["full"])
+    _changes["seq"] = payload["seq"] # Only advance once the poll is stored.
+
+    logger.info("Received %d %s, stored %d transitions",
+                len(payload["devices"]), "devices" if payload["full"] else "changes", stored)
+    return stored
+
+def decodeBitset(payload: bytes) -> Tuple[int, np.ndarray]:
+    """
+    Decode a bitset of device statuses from the Flask API.
+    The header and bits are sliced from the payload without copying it,
+    only the unpacked statuses are allocated.
+
+    Args:
+        payload (bytes): The response body.
+
+    Returns:
+        Tuple[int, numpy.ndarray]: The device list version, and the status of each device as booleans.
+
+    Raises:
+        ValueError: If the payload is not a complete bitset.
+    """
+    view: memoryview = memoryview(payload)
+    if len(view) < BITSET_HEADER.size:
+        raise ValueError("Bitset is shorter than its header")
+
+    magic, version, count = BITSET_HEADER.unpack_from(view)
+    if magic != BITSET_MAGIC:
+        raise ValueError("Not a device bitset")
+
+    size: int = (count + 7) // 8
+    body: memoryview = view[BITSET_HEADER.size:BITSET_HEADER.size + size]
+    if len(body) < size:
+        raise ValueError(f"Bitset holds fewer than {count} devices")
+
+    bits: np.ndarray = np.frombuffer(body, dtype=np.uint8) # A view of the payload.
+    return version, np.unpackbits(bits, count=count, bitorder="little").view(bool)
+
+def fetchDeviceList(version: int) -> List[dict]:
+    """
+    Fetch the id, name and ip_address of every device, in the order of a bitset.
+
+    Args:
+        version (int): The device list version of the bitset.
+
+    Returns:
+        List[dict]: The devices.
+
+    Raises:
+        ValueError: If the device list changed since the bitset was sent.
+        requests.RequestException: If the API cannot be reached or returns an error.
+    """
+    resp: requests.Response = getDeviceClient().get("/metadata")
+    resp.raise_for_status()
+    if int(resp.headers.get("X-Device-List-Version", -1)) != version:
+        raise ValueError("Device list changed while polling, it is fetched again on the next poll")
+    return resp.json()
+
+def pollDeviceBitset() -> int:
+    """
+    Fetch the status of every device as a bitset and store the transitions.
+    The device list is only fetched when its version changes, each poll is then
+    one bit per device (125 KB for a million devices) rather than a JSON record each.
+    Servers which cannot send a bitset reply with JSON, which is compared in full.
+
+    Args:
+        None
+
+    Returns:
+        int: The number of state transitions (or devices polled, from JSON) stored.
+
+    Raises:
+        ValueError: If the bitset cannot be decoded.
+        requests.RequestException: If the API cannot be reached or returns an error.
+    """
+    with getDeviceClient().get(headers={"Accept": f"{BITSET}, {NDJSON};q=0.5"}, stream=True) as resp:
+        resp.raise_for_status()
+        if not resp.headers.get("Content-Type", "").startswith(BITSET):
+            _bitset.update(version=None, status=None) # Compare the next bitset in full.
+            stored: int = ingestDevices(readDevices(resp))
+            logger.info("Stored a poll of %d devices", stored)
+            return stored
+        version, status = decodeBitset(resp.content)
+
+    if version != _bitset["version"]:
+        devices: List[dict] = fetchDeviceList(version)
+        if len(devices) != len(status):
+            raise ValueError(f"Device list holds {len(devices)} devices, the bitset {len(status)}")
+        _bitset.update(version=None, devices=devices, ids=np.array([d["id"] for d in devices], dtype=np.int64))
+
+    devices, ids = _bitset["devices"], _bitset["ids"]
+    if _bitset["version"] is None or _bitset["polls"] >= BITSET_RESYNC_INTERVAL:
+        full: bool = True # Compare every device with the stored state.
+        records: List[dict] = [{**d, "status": s} for d, s in zip(devices, status.tolist())]
+    else:
+        full = False
+        changed: np.ndarray = np.flatnonzero(status != _bitset["status"])
+        records = [{"id": i, "status": s} for i, s in zip(ids[changed].tolist(), status[changed].tolist())]
+
+    stored: int = ingestChanges(records, full=full)
+    _bitset.update(version=version, status=status, polls=0 if full else _bitset["polls"] + 1) # Only advance once stored.
+
+    logger.info("Received %d statuses as a bitset, stored %d transitions", len(status), stored)
+    return stored
+
+def loadSnapshot(maxAge: float) -> Optional[List[dict]]:
+    """
+    Read the latest status of every device from the Device table.
+
+    Args:
+        maxAge (float): Seconds after which the stored snapshot is considered stale.
+
+    Returns:
+        List[dict] | None: The device records, or None if no recent poll has been stored.
+    """
+    rows = list(Device.objects.order_by("device_id").values("device_id", "name", "ip_address", "status", "last_seen"))
+    if not rows:
+        return None
+
+    newest = max(r["last_seen"] for r in rows)
+    if (timezone.now() - newest).total_seconds() > maxAge:
+        return None
+
+    return [
+        {"id": r["device_id"], "name": r["name"], "ip_address": r["ip_address"], "status": r["status"]}
+        for r in rows
+    ]
+
+def getLatestDevices() -> List[dict]:
+    """
+    Get the latest status of every device without polling the API on every call.
+    The stored snapshot is re-read at most once per DEVICE_SNAPSHOT_REFRESH seconds.
+    If the collector is not running and the snapshot is stale, one caller polls the API
+    for a bitset of statuses while concurrent callers wait for its result.
+
+    Args:
+        None
+
+    Returns:
+        List[dict]: The device records.
+    """
+    refresh: float = getattr(settings, "DEVICE_SNAPSHOT_REFRESH", 1)
+    maxAge: float = getattr(settings, "DEVICE_SNAPSHOT_MAX_AGE", 15)
+
+    with _snapshotLock:
+        if _snapshot["devices"] is not None and time.monotonic() - _snapshot["loadedAt"] < refresh:
+            return _snapshot["devices"]
+
+        devices: Optional[List[dict]] = loadSnapshot(maxAge)
+        if devices is None: # No collector is running, poll on demand.
+            pollDeviceBitset()
+            devices = loadSnapshot(maxAge) or []
+
+        _snapshot["devices"] = devices
+        _snapshot["loadedAt"] = time.monotonic()
+        return devices
+
+def clearSnapshot() -> None:
+    """
+    Discard this process's copy of the latest snapshot.
+    """
+    with _snapshotLock:
+        _snapshot["devices"] = None
+        _snapshot["loadedAt"] = 0.0
@@ -0,0 +1,200 @@
+"""
+This file contains the SQLite concurrency profile for the health status app.
+Every new SQLite connection is configured with SQLITE_PRAGMAS, by default
+WAL journaling so readers never wait for a writer, and a writer never waits for readers.
+SQLite still allows one writer at a time, so within each process every write
+is handed to a single writer thread and run there in order, rather than
+concurrent requests and pollers contending for the write lock.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from concurrent.futures import Future
+from functools import wraps
+from typing import Any, Callable, Optional, TypeVar
+import atexit
+import logging
+import os
+import queue
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRAGMA_NAME = re.compile(r"^[a-z_]+$")
+
+def configureSqlite(sender: Any, connection: BaseDatabaseWrapper, **kwargs) -> None:
+    """
+    Apply SQLITE_PRAGMAS to a new connection, connected to the connection_created signal.
+
+    Args:
+        sender (Any): The database wrapper class.
+        connection (BaseDatabaseWrapper): The new connection.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If a pragma name is not a plain identifier.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas: dict = getattr(settings, "SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if not PRAGMA_NAME.match(name):
+                raise ValueError(f"Invalid SQLite pragma: {name!r}")
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+class DatabaseWriter:
+    """
+    A single thread which runs database writes one at a time, in the order they are submitted.
+    Callers block until their write has run, so its result or exception is theirs.
+
+    Attributes:
+        maxSize (int): Maximum writes waiting, further callers wait for room.
+    """
+    def __init__(self, maxSize: int = 1000) -> None:
+        """
+        Constructor for the DatabaseWriter object.
+
+        Args:
+            maxSize (int): Maximum writes waiting, further callers wait for room.
+
+        Returns:
+            None
+        """
+        self.maxSize: int = maxSize
+        self.__queue: queue.Queue = queue.Queue(maxsize=maxSize)
+        self.__lock: threading.Lock = threading.Lock()
+        self.__stop: threading.Event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__pid: Optional[int] = None
+
+    def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Run a write on the writer thread and wait for it.
+        Writes made from the writer thread itself, or after close, run immediately.
+
+        Args:
+            fn (Callable[..., T]): The write.
+            *args, **kwargs: Passed on to fn.
+
+        Returns:
+            T: The result of fn.
+        """
+        if self.__stop.is_set() or threading.current_thread() is self.__thread:
+            return fn(*args, **kwargs)
+
+        self.__ensureThread()
+        future: Future = Future()
+        self.__queue.put((future, fn, args, kwargs))
+        return future.result()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stop the writer thread once the writes already submitted have run.
+
+        Args:
+            timeout (float): Seconds to wait for the thread.
+
+        Returns:
+            None
+        """
+        self.__stop.set()
+        thread = self.__thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            self.__queue.put(None)
+            thread.join(timeout)
+
+        while True: # Writes submitted while stopping run here instead.
+            try:
+                job = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self.__execute(*job)
+
+    def __ensureThread(self) -> None:
+        """
+        Start the writer thread on first use, and again in a forked worker.
+        """
+        if self.__pid == os.getpid():
+            return
+        with self.__lock:
+            if self.__pid == os.getpid():
+                return
+            self.__pid = os.getpid()
+            self.__thread = threading.Thread(target=self.__run, name="DatabaseWriter", daemon=True)
+            self.__thread.start()
+
+    def __run(self) -> None:
+        """
+        Background loop running writes until stopped.
+        """
+        try:
+            while (job := self.__queue.get()) is not None:
+                self.__execute(*job)
+        finally:
+            connections.close_all() # Connections are per thread.
+
+    @staticmethod
+    def __execute(future: Future, fn: Callable, args: tuple, kwargs: dict) -> None:
+        """
+        Run one write, passing its outcome to the caller waiting on future.
+        """
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+
+_writer: Optional[DatabaseWriter] = None
+_writerLock: threading.Lock = threading.Lock()
+
+def getDatabaseWriter() -> DatabaseWriter:
+    """
+    The process wide DatabaseWriter, stopped when the process exits.
+
+    Args:
+        None
+
+    Returns:
+        DatabaseWriter: The shared writer.
+    """
+    global _writer
+    if _writer is None:
+        with _writerLock:
+            if _writer is None:
+                _writer = DatabaseWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+def serializedWrite(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Decorate a function which writes to the database, to run it on the writer thread
+    when SQLITE_SINGLE_WRITER is enabled and the database is SQLite.
+    Callers already inside a transaction write inline, as part of it. Their transaction
+    may hold the write lock, which the writer thread would otherwise wait on until the
+    busy timeout while the caller waits on the writer thread.
+
+    Args:
+        fn (Callable[..., T]): The write.
+
+    Returns:
+        Callable[..., T]: The wrapped write, with the same arguments and result.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs) -> T:
+        connection: BaseDatabaseWrapper = connections["default"]
+        if (getattr(settings, "SQLITE_SINGLE_WRITER", False) and connection.vendor == "sqlite"
+                and not connection.in_atomic_block):
+            return getDatabaseWriter().run(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,167 @@
+"""
+This file contains the live device status broadcaster for the health status app.
+Each web process runs a single broadcaster task while any client is connected.
+It watches the device data version, which the collector bumps on every stored poll,
+and pushes the devices whose status changed to every connected client.
+Upstream and database load therefore depend on the poll rate, not on the number of clients.
+"""
+from healthstatus.models import Device
+from healthstatus.versions import getVersions, DEVICES
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+def readDevices() -> Dict[int, dict]:
+    """
+    Read the latest status of every device from the Device table.
+
+    Args:
+        None
+
+    Returns:
+        Dict[int, dict]: Device records by id, in id order.
+    """
+    return {
+        r["device_id"]: {"id": r["device_id"], "name": r["name"], "ip_address": r["ip_address"], "status": r["status"]}
+        for r in Device.objects.order_by("device_id").values("device_id", "name", "ip_address", "status")
+    }
+
+class StatusBroadcaster:
+    """
+    Fans device status changes out to subscribed clients.
+    Every subscriber has a bounded queue of (event, devices) messages,
+    a subscriber which falls behind is sent a fresh snapshot instead of its backlog.
+
+    Attributes:
+        interval (float): Seconds between checks of the device data version.
+        queueSize (int): Maximum messages waiting for each subscriber.
+    """
+    def __init__(self, interval: float = 1.0, queueSize: int = 16) -> None:
+        """
+        Constructor for the StatusBroadcaster object.
+
+        Args:
+            interval (float): Seconds between checks of the device data version.
+            queueSize (int): Maximum messages waiting for each subscriber.
+
+        Returns:
+            None
+        """
+        self.interval: float = interval
+        self.queueSize: int = queueSize
+        self.__subscribers: Set[asyncio.Queue] = set()
+        self.__devices: Optional[Dict[int, dict]] = None
+        self.__version: Optional[int] = None
+        self.__task: Optional[asyncio.Task] = None
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        """
+        The number of connected subscribers.
+        """
+        return len(self.__subscribers)
+
+    async def subscribe(self) -> Tuple[asyncio.Queue, List[dict]]:
+        """
+        Start receiving status changes.
+
+        Args:
+            None
+
+        Returns:
+            Tuple[asyncio.Queue, List[dict]]: The subscriber's queue, and a snapshot of every device to start from.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self.__loop: # State from another event loop cannot be reused.
+            self.__loop, self.__subscribers, self.__devices, self.__version, self.__task = loop, set(), None, None, None
+
+        if self.__devices is None:
+            await self.refresh()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queueSize)
+        self.__subscribers.add(queue)
+        if self.__task is None or self.__task.done():
+            self.__task = loop.create_task(self.run())
+        return queue, list(self.__devices.values())
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """
+        Stop receiving status changes.
+
+        Args:
+            queue (asyncio.Queue): The queue returned by subscribe.
+
+        Returns:
+            None
+        """
+        self.__subscribers.discard(queue)
+
+    async def run(self) -> None:
+        """
+        Check for new polls until the last subscriber disconnects.
+        """
+        while self.__subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Error broadcasting device status: %s", e)
+
+    async def refresh(self) -> None:
+        """
+        Publish the devices which changed since the last refresh, if a new poll was stored.
+        """
+        (version,) = await sync_to_async(getVersions)(DEVICES)
+        if version == self.__version and self.__devices is not None:
+            return # The common case, one primary key lookup.
+
+        devices: Dict[int, dict] = await sync_to_async(readDevices)()
+        previous: Optional[Dict[int, dict]] = self.__devices
+        self.__devices, self.__version = devices, version
+        if previous is None:
+            return
+
+        changed: List[dict] = [d for deviceId, d in devices.items() if previous.get(deviceId) != d]
+        if changed:
+            self.publish("changes", changed)
+
+    def publish(self, event: str, devices: List[dict]) -> None:
+        """
+        Queue a message for every subscriber, without waiting on slow ones.
+
+        Args:
+            event (str): The event name, "snapshot" or "changes".
+            devices (List[dict]): The device records.
+
+        Returns:
+            None
+        """
+        for queue in list(self.__subscribers):
+            try:
+                queue.put_nowait((event, devices))
+            except asyncio.QueueFull: # Replace the backlog with the current state.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("snapshot", list(self.__devices.values())))
+
+
+_broadcaster: Optional[StatusBroadcaster] = None
+
+def getBroadcaster() -> StatusBroadcaster:
+    """
+    The process wide StatusBroadcaster, configured from settings on first use.
+
+    Args:
+        None
+
+    Returns:
+        StatusBroadcaster: The shared broadcaster.
+    """
+    global _broadcaster
+    if _broadcaster is None: # Only used from the event loop thread, so no lock is needed.
+        _broadcaster = StatusBroadcaster(getattr(settings, "LIVE_POLL_INTERVAL", 1.0))
+    return _broadcaster
@@ -0,0 +1,66 @@
+"""
+Management command to downsample and delete old history.
+
+Usage:
+    python manage.py apply_retention
+    python manage.py apply_retention --interval 3600
+    python manage.py apply_retention --batch-size 1000
+    python manage.py apply_retention --enable-incremental-vacuum
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from healthstatus.retention import applyRetention, enableIncrementalVacuum, reclaimSpace
+import time
+
+class Command(BaseCommand):
+    help = "Apply settings.HISTORY_RETENTION, downsampling and deleting old history in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Seconds between runs. Runs once and exits if not given.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "RETENTION_BATCH_SIZE", 5000),
+            help="Maximum rows processed in each transaction.",
+        )
+        parser.add_argument(
+            "--enable-incremental-vacuum",
+            action="store_true",
+            help="Rebuild the SQLite database once so that freed space can be reclaimed after each run.",
+        )
+
+    def handle(self, *args, **options):
+        if options["enable_incremental_vacuum"]:
+            if connection.vendor != "sqlite":
+                self.stderr.write("Incremental vacuum is only supported on SQLite.")
+                return
+            enableIncrementalVacuum()
+            self.stdout.write("Enabled incremental vacuum.")
+
+        try:
+            while True:
+                started: float = time.monotonic()
+                self.apply(options["batch_size"])
+
+                if options["interval"] is None:
+                    return
+                time.sleep(max(0.0, options["interval"] - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            self.stdout.write("Retention stopped.")
+
+    def apply(self, batchSize: int) -> None:
+        """
+        Run the retention policy once, then return freed space to the file system.
+        """
+        close_old_connections() # Long running process, drop stale DB connections.
+        results = applyRetention(batchSize=batchSize)
+        for step, count in results.items():
+            self.stdout.write(f"{step}: {count}")
+        if reclaimSpace():
+            self.stdout.write("Reclaimed free space.")
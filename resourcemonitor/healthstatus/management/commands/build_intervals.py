@@ -0,0 +1,84 @@
+"""
+Management command to convert stored device samples into DeviceInterval rows.
+Used once when switching DEVICE_STORAGE_MODE to "intervals" on an existing database.
+Samples are read through the SampleStore, so this works with any TIMESERIES_BACKEND.
+
+Usage:
+    python manage.py build_intervals
+    python manage.py build_intervals --replace --delete-samples
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from healthstatus.models import Device, DeviceInterval
+from healthstatus.storage import SampleStore, getSampleStore
+from datetime import datetime, timezone as tz
+from typing import List, Optional
+import pandas as pd
+
+EPOCH: datetime = datetime(1970, 1, 1, tzinfo=tz.utc)
+
+class Command(BaseCommand):
+    help = "Convert the stored device samples into DeviceInterval rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Devices converted per transaction, and rows per INSERT.")
+        parser.add_argument("--replace", action="store_true", help="Discard any existing intervals first.")
+        parser.add_argument(
+            "--delete-samples",
+            action="store_true",
+            help="Delete the converted samples afterwards to reclaim space.",
+        )
+
+    def handle(self, *args, **options):
+        batchSize: int = options["batch_size"]
+        store: SampleStore = getSampleStore()
+
+        if DeviceInterval.objects.exists():
+            if not options["replace"]:
+                raise CommandError("Intervals already exist, use --replace to rebuild them.")
+            DeviceInterval.objects.all().delete()
+
+        cutoff: datetime = timezone.now() # Ignore polls stored while converting.
+        deviceIds: List[int] = list(Device.objects.order_by("device_id").values_list("device_id", flat=True))
+        created: int = 0
+        for lower in range(0, len(deviceIds), batchSize): # A short transaction per batch of devices.
+            created += self.convert(store, deviceIds[lower:lower + batchSize], cutoff, batchSize)
+
+        if not created:
+            self.stdout.write("No samples to convert.")
+            return
+        self.stdout.write(f"Created {created} intervals.")
+
+        if options["delete_samples"]:
+            deleted: int = store.prune(cutoff, batchSize) # Bounded batches keep each write lock short.
+            self.stdout.write(f"Deleted {deleted} samples.")
+
+    def convert(self, store: SampleStore, deviceIds: List[int], cutoff: datetime, batchSize: int) -> int:
+        """
+        Convert the samples of a batch of devices into intervals, in one transaction.
+        A device's intervals only depend on its own samples, so batches convert independently.
+        """
+        samples: pd.DataFrame = (
+            store.queryRange(EPOCH, cutoff, deviceIds=deviceIds)
+            .sort_values(["device_id", "timestamp"], kind="stable") # Stable keeps the stored order of equal times.
+        )
+
+        intervals: List[DeviceInterval] = []
+        current: Optional[DeviceInterval] = None
+
+        with transaction.atomic():
+            for deviceId, status, timestamp in samples[["device_id", "status", "timestamp"]].itertuples(index=False):
+                deviceId, status, timestamp = int(deviceId), bool(status), timestamp.to_pydatetime()
+                if current is not None and current.device_id == deviceId:
+                    if current.status == status:
+                        continue # Same status, the interval carries on.
+                    current.end = timestamp # Status changed, close at the first differing sample.
+
+                if current is not None:
+                    intervals.append(current)
+                current = DeviceInterval(device_id=deviceId, status=status, start=timestamp)
+
+            if current is not None:
+                intervals.append(current) # The latest interval of each device stays open.
+            return len(DeviceInterval.objects.bulk_create(intervals, batch_size=batchSize))
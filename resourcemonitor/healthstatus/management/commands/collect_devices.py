@@ -0,0 +1,75 @@
+"""
+Management command to poll the Flask API on a fixed interval.
+
+Usage:
+    python manage.py collect_devices
+    python manage.py collect_devices --interval 10
+    python manage.py collect_devices --once
+    python manage.py collect_devices --mode per-device
+    python manage.py collect_devices --mode bitset
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from healthstatus.collector import pollDevices, pollDeviceBitset, pollDeviceChanges
+from healthstatus.poller import pollDevicesConcurrently
+from healthstatus.utils import generateLog
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MODES: dict = {
+    # Every mode persists only status transitions and the per device availability rollups.
+    "stream": pollDevices,                  # Stream the whole fleet, compared with the stored state.
+    "per-device": pollDevicesConcurrently,  # Poll each device endpoint, compared with the stored state.
+    "delta": pollDeviceChanges,             # Fetch only the devices which changed since the last poll.
+    "bitset": pollDeviceBitset,             # Fetch one bit per device, compared with the stored state.
+}
+
+class Command(BaseCommand):
+    help = "Poll the device API on a fixed interval and store each poll."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=getattr(settings, "DEVICE_POLL_INTERVAL", 5),
+            help="Seconds between the start of each poll.",
+        )
+        parser.add_argument("--once", action="store_true", help="Poll a single time and exit.")
+        parser.add_argument(
+            "--mode",
+            choices=MODES,
+            default=getattr(settings, "DEVICE_COLLECTOR_MODE", "delta"),
+            help="How devices are polled and stored.",
+        )
+
+    def handle(self, *args, **options):
+        interval: float = options["interval"]
+        self.poll = MODES[options["mode"]]
+
+        try:
+            while True:
+                started: float = time.monotonic()
+                self.collect()
+
+                if options["once"]:
+                    return
+                time.sleep(max(0.0, interval - (time.monotonic() - started))) # Keep a fixed cadence.
+        except KeyboardInterrupt:
+            self.stdout.write("Collector stopped.")
+
+    def collect(self) -> None:
+        """
+        Run a single poll, recording the outcome in SystemMetric.
+        """
+        close_old_connections() # Long running process, drop stale DB connections.
+        try:
+            stored: int = self.poll()
+            generateLog("/collector", 200, True)
+            self.stdout.write(f"Stored {stored} records")
+        except Exception as e:
+            logger.error("Error collecting device data: %s", e)
+            status = getattr(getattr(e, "response", None), "status_code", 500) # Log 500 if empty response.
+            generateLog("/collector", status, False)
@@ -0,0 +1,34 @@
+"""
+Management command to set the availability SLO target of devices.
+Devices without a target of their own are held to settings.AVAILABILITY_SLO_TARGET.
+
+Usage:
+    python manage.py set_slo_target 99.5 --device 1 2 3
+    python manage.py set_slo_target --clear --device 1
+"""
+from django.core.management.base import BaseCommand, CommandError
+from healthstatus.models import Device
+from healthstatus.versions import bumpVersion, DEVICES
+from django.db import transaction
+
+class Command(BaseCommand):
+    help = "Set the availability % each device is expected to meet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", type=float, nargs="?", help="Availability %, at least 0 and below 100.")
+        parser.add_argument("--device", type=int, nargs="+", required=True, help="Ids of the devices to set.")
+        parser.add_argument("--clear", action="store_true", help="Use settings.AVAILABILITY_SLO_TARGET again.")
+
+    def handle(self, *args, **options):
+        target = options["target"]
+        if options["clear"] == (target is not None):
+            raise CommandError("Give either a target or --clear.")
+        if target is not None and not 0 <= target < 100:
+            raise CommandError("The target must be at least 0 and below 100, 100% leaves no error budget.")
+
+        with transaction.atomic():
+            updated: int = Device.objects.filter(device_id__in=options["device"]).update(slo_target=target)
+            bumpVersion(DEVICES) # Cached availability carries the targets.
+
+        missing: int = len(set(options["device"])) - updated
+        self.stdout.write(f"Updated {updated} devices." + (f" {missing} were not found." if missing else ""))
@@ -0,0 +1,279 @@
+"""
+This file contains the buffered writer for SystemMetric logs, and other metric rows.
+Requests only append their log to an in-process queue, and a background
+thread writes the queue to the database in batches, so page views never
+wait on (or contend for) an SQLite write lock to record themselves.
+"""
+from django.conf import settings
+from healthstatus.database import serializedWrite
+from healthstatus.models import SystemMetric
+from healthstatus.storage import getMetricStore
+from django.db import connections, models, transaction
+from typing import Dict, Iterable, List, Optional
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("newest", "oldest") # Which log is dropped when the buffer is full.
+
+class MetricWriter:
+    """
+    A bounded buffer of metric rows, such as SystemMetric logs, flushed to the database in batches.
+    A batch is written once batchSize logs are waiting or flushInterval seconds
+    after its first log, whichever comes first.
+
+    Attributes:
+        maxSize (int): Maximum logs held in memory.
+        batchSize (int): Maximum logs written per INSERT.
+        flushInterval (float): Maximum seconds a log waits before being written.
+        policy (str): "newest" drops incoming logs when full, "oldest" discards the oldest buffered log.
+        dropped (int): Number of logs dropped, because the buffer was full, a write failed,
+            or the writer was closed.
+    """
+    def __init__(self, maxSize: int = 10000, batchSize: int = 500, flushInterval: float = 1.0,
+                 policy: str = "newest", background: bool = True) -> None:
+        """
+        Constructor for the MetricWriter object.
+
+        Args:
+            maxSize (int): Maximum logs held in memory.
+            batchSize (int): Maximum logs written per INSERT.
+            flushInterval (float): Maximum seconds a log waits before being written.
+            policy (str): Drop policy when full, "newest" or "oldest".
+            background (bool): Start a background thread to flush. If False logs are only written by flush().
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If a size is less than 1, or the policy is unknown.
+        """
+        if maxSize < 1 or batchSize < 1:
+            raise ValueError("maxSize and batchSize must be at least 1.")
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+
+        self.maxSize: int = maxSize
+        self.batchSize: int = batchSize
+        self.flushInterval: float = flushInterval
+        self.policy: str = policy
+        self.dropped: int = 0
+        self.__background: bool = background
+        self.__queue: queue.Queue = queue.Queue(maxsize=maxSize)
+        self.__lock: threading.Lock = threading.Lock()
+        self.__stop: threading.Event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__pid: Optional[int] = None
+
+    def __len__(self) -> int:
+        """
+        The number of logs waiting to be written.
+        """
+        return self.__queue.qsize()
+
+    def write(self, metric: models.Model) -> bool:
+        """
+        Buffer an unsaved metric row to be written later.
+        Never blocks, when the buffer is full a log is dropped by the drop policy.
+        Once the writer is closed nothing would write the log, so it is dropped.
+
+        Args:
+            metric (models.Model): The row to write, e.g. a SystemMetric.
+
+        Returns:
+            bool: False if the new log was dropped.
+        """
+        if self.__stop.is_set():
+            with self.__lock:
+                self.dropped += 1
+            return False
+
+        self.__ensureThread()
+        try:
+            self.__queue.put_nowait(metric)
+            return True
+        except queue.Full:
+            pass
+
+        with self.__lock:
+            self.dropped += 1
+        if self.policy == "newest":
+            return False
+
+        try:
+            self.__queue.get_nowait() # Make room by discarding the oldest log.
+        except queue.Empty:
+            pass
+        try:
+            self.__queue.put_nowait(metric)
+            return True
+        except queue.Full: # Refilled by another request in between.
+            return False
+
+    def flush(self) -> int:
+        """
+        Write every buffered log from the calling thread.
+
+        Args:
+            None
+
+        Returns:
+            int: The number of logs written.
+        """
+        written: int = 0
+        while batch := self.__take(self.batchSize, timeout=0):
+            written += self.__save(batch)
+        return written
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the background thread and write any logs left in the buffer.
+        Logs written after the writer is closed are dropped.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the thread. Defaults to two flush intervals.
+
+        Returns:
+            None
+        """
+        self.__stop.set()
+        thread = self.__thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(self.flushInterval * 2 if timeout is None else timeout)
+        self.flush()
+
+    def __ensureThread(self) -> None:
+        """
+        Start the background thread on first use, and again in a forked worker.
+        """
+        if not self.__background or self.__stop.is_set() or self.__pid == os.getpid():
+            return
+        with self.__lock:
+            if self.__pid == os.getpid():
+                return
+            self.__pid = os.getpid()
+            self.__thread = threading.Thread(target=self.__run, name="MetricWriter", daemon=True)
+            self.__thread.start()
+
+    def __run(self) -> None:
+        """
+        Background loop writing batches until stopped.
+        """
+        try:
+            while not self.__stop.is_set():
+                batch = self.__take(self.batchSize, timeout=self.flushInterval)
+                if batch:
+                    self.__save(batch)
+        finally:
+            connections.close_all() # Connections are per thread.
+
+    def __take(self, count: int, timeout: float) -> List[models.Model]:
+        """
+        Take up to count logs, waiting at most timeout seconds after the first.
+        """
+        try:
+            batch: List[models.Model] = [self.__queue.get(timeout=timeout) if timeout else self.__queue.get_nowait()]
+        except queue.Empty:
+            return []
+
+        deadline: float = time.monotonic() + timeout
+        while len(batch) < count:
+            remaining: float = deadline - time.monotonic()
+            try:
+                batch.append(self.__queue.get(timeout=remaining) if remaining > 0 else self.__queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def __save(self, batch: List[models.Model]) -> int:
+        """
+        Write a batch, one INSERT per model, dropping it if the database write fails.
+        """
+        try:
+            insertMetrics(batch)
+            return len(batch)
+        except Exception as e:
+            with self.__lock:
+                self.dropped += len(batch)
+            logger.error("Dropped %d system metrics: %s", len(batch), e)
+            return 0
+
+
+@serializedWrite
+def insertMetrics(rows: List[models.Model]) -> None:
+    """
+    Insert unsaved rows, one INSERT per model, in one transaction.
+    SystemMetric logs are written to the MetricStore, which may keep them outside the database.
+    Request logs do not bump the metrics version, or every request would invalidate
+    the cached timeline, which instead refreshes every TIMELINE_REFRESH seconds.
+
+    Args:
+        rows (List[models.Model]): The rows to insert.
+
+    Returns:
+        None
+    """
+    byModel: Dict[type, List[models.Model]] = {}
+    for row in rows:
+        byModel.setdefault(type(row), []).append(row)
+
+    with transaction.atomic():
+        for model, group in byModel.items():
+            if model is SystemMetric:
+                getMetricStore().writeMetrics(group)
+            else:
+                model.objects.bulk_create(group)
+
+
+_writer: Optional[MetricWriter] = None
+_writerLock: threading.Lock = threading.Lock()
+
+def getMetricWriter() -> MetricWriter:
+    """
+    The process wide MetricWriter, configured from settings on first use.
+    Remaining logs are written when the process exits.
+
+    Args:
+        None
+
+    Returns:
+        MetricWriter: The shared writer.
+    """
+    global _writer
+    if _writer is None:
+        with _writerLock:
+            if _writer is None:
+                _writer = MetricWriter(
+                    maxSize=getattr(settings, "METRIC_BUFFER_SIZE", 10000),
+                    batchSize=getattr(settings, "METRIC_BATCH_SIZE", 500),
+                    flushInterval=getattr(settings, "METRIC_FLUSH_INTERVAL", 1.0),
+                    policy=getattr(settings, "METRIC_DROP_POLICY", "newest"),
+                )
+                atexit.register(_writer.close)
+    return _writer
+
+def writeMetrics(rows: Iterable[models.Model]) -> None:
+    """
+    Write unsaved metric rows through the shared MetricWriter,
+    or immediately when settings.METRIC_BUFFER_SIZE is 0.
+
+    Args:
+        rows (Iterable[models.Model]): The rows to write.
+
+    Returns:
+        None
+    """
+    if getattr(settings, "METRIC_BUFFER_SIZE", 10000) == 0:
+        rows = list(rows)
+        if rows:
+            insertMetrics(rows)
+        return
+
+    writer: MetricWriter = getMetricWriter()
+    for row in rows:
+        writer.write(row)
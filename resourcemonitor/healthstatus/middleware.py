@@ -0,0 +1,239 @@
+"""
+This file contains the request metrics middleware for the health status app.
+Every request is logged to SystemMetric with the status it actually returned,
+and its latency is counted into a fixed bucket histogram per endpoint.
+Histograms are held in memory and written to RequestLatency once per
+LATENCY_FLUSH_INTERVAL, so recording a request costs a few integer increments.
+"""
+from healthstatus.metricwriter import getMetricWriter, writeMetrics
+from healthstatus.models import RequestLatency
+from healthstatus.utils import generateLog
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from bisect import bisect_left
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import atexit
+import threading
+import time
+
+# Upper bound of each latency bucket in milliseconds, the last bucket counts everything slower.
+LATENCY_BUCKETS: Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+class LatencyHistogram:
+    """
+    Request counts per latency bucket for one endpoint.
+
+    Attributes:
+        counts (List[int]): Requests per bucket of LATENCY_BUCKETS, plus one overflow bucket.
+        requests (int): Total requests.
+        errors (int): Requests answered outside of 2xx.
+        bytes (int): Total response payload size.
+        max (float): Slowest request in milliseconds.
+    """
+    def __init__(self) -> None:
+        """
+        Constructor for an empty LatencyHistogram.
+        """
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.requests: int = 0
+        self.errors: int = 0
+        self.bytes: int = 0
+        self.max: float = 0.0
+
+    def add(self, latency: float, status: int, size: int) -> None:
+        """
+        Count a single request.
+
+        Args:
+            latency (float): Request latency in milliseconds.
+            status (int): HTTP status code of the response.
+            size (int): Response payload size in bytes.
+
+        Returns:
+            None
+        """
+        self.counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.requests += 1
+        self.errors += not 200 <= status < 300
+        self.bytes += size
+        if latency > self.max:
+            self.max = latency
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a latency percentile, interpolating within its bucket.
+
+        Args:
+            q (float): The percentile as a fraction, e.g. 0.95.
+
+        Returns:
+            float: The estimated latency in milliseconds, 0 if empty.
+        """
+        if not self.requests:
+            return 0.0
+
+        rank: float = q * self.requests
+        seen: int = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower: float = LATENCY_BUCKETS[i - 1] if i else 0.0
+                upper: float = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class LatencyRecorder:
+    """
+    Per endpoint LatencyHistograms for the current flush period.
+    The period is written to RequestLatency by the first request after it ends, and at exit.
+
+    Attributes:
+        flushInterval (float): Seconds per flush period.
+    """
+    def __init__(self, flushInterval: float = 60.0) -> None:
+        """
+        Constructor for the LatencyRecorder object.
+
+        Args:
+            flushInterval (float): Seconds per flush period.
+
+        Returns:
+            None
+        """
+        self.flushInterval: float = flushInterval
+        self.__lock: threading.Lock = threading.Lock()
+        self.__histograms: Dict[str, LatencyHistogram] = {}
+        self.__start: datetime = timezone.now()
+        self.__due: float = time.monotonic() + flushInterval
+
+    def record(self, endpoint: str, latency: float, status: int, size: int) -> None:
+        """
+        Count a request, flushing the period if it has ended.
+
+        Args:
+            endpoint (str): The matched URL route.
+            latency (float): Request latency in milliseconds.
+            status (int): HTTP status code of the response.
+            size (int): Response payload size in bytes.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            histogram: Optional[LatencyHistogram] = self.__histograms.get(endpoint)
+            if histogram is None:
+                histogram = self.__histograms[endpoint] = LatencyHistogram()
+            histogram.add(latency, status, size)
+            due: bool = time.monotonic() >= self.__due
+
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        End the current period and write its histograms.
+
+        Args:
+            None
+
+        Returns:
+            int: The number of endpoints written.
+        """
+        with self.__lock:
+            histograms, start, end = self.__histograms, self.__start, timezone.now()
+            self.__histograms, self.__start = {}, end
+            self.__due = time.monotonic() + self.flushInterval
+
+        writeMetrics([
+            RequestLatency(
+                endpoint=endpoint, start=start, end=end,
+                requests=h.requests, errors=h.errors, bytes=h.bytes,
+                p50=h.percentile(0.5), p95=h.percentile(0.95), p99=h.percentile(0.99), max=h.max,
+                counts=h.counts,
+            )
+            for endpoint, h in histograms.items()
+        ])
+        return len(histograms)
+
+
+_recorder: Optional[LatencyRecorder] = None
+_recorderLock: threading.Lock = threading.Lock()
+
+def getLatencyRecorder() -> LatencyRecorder:
+    """
+    The process wide LatencyRecorder, configured from settings on first use.
+
+    Args:
+        None
+
+    Returns:
+        LatencyRecorder: The shared recorder.
+    """
+    global _recorder
+    if _recorder is None:
+        with _recorderLock:
+            if _recorder is None:
+                if getattr(settings, "METRIC_BUFFER_SIZE", 10000):
+                    getMetricWriter() # Exit handlers run in reverse, so the writer closes after the final flush.
+                _recorder = LatencyRecorder(getattr(settings, "LATENCY_FLUSH_INTERVAL", 60.0))
+                atexit.register(_recorder.flush)
+    return _recorder
+
+
+class RequestMetricsMiddleware:
+    """
+    Logs every request to SystemMetric and records its latency.
+    Should be first in MIDDLEWARE, so the time spent in other middleware is included.
+    Runs natively under both WSGI and ASGI, so async views are not forced onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Union[HttpResponse, Awaitable[HttpResponse]]]) -> None:
+        self.get_response = get_response
+        self.isAsync: bool = iscoroutinefunction(get_response)
+        if self.isAsync:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> Union[HttpResponse, Awaitable[HttpResponse]]:
+        if self.isAsync:
+            return self.__acall(request)
+
+        started: float = time.perf_counter()
+        response: HttpResponse = self.get_response(request)
+        self.record(request, response, started)
+        return response
+
+    async def __acall(self, request: HttpRequest) -> HttpResponse:
+        started: float = time.perf_counter()
+        response: HttpResponse = await self.get_response(request)
+        await sync_to_async(self.record)(request, response, started)
+        return response
+
+    def record(self, request: HttpRequest, response: HttpResponse, started: float) -> None:
+        """
+        Log a finished request and record its latency.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+            response (HttpResponse): The response returned for it.
+            started (float): perf_counter() when the request arrived.
+
+        Returns:
+            None
+        """
+        latency: float = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        endpoint: str = f"/{match.route}" if match else "unmatched" # Routes keep the number of histograms bounded.
+        if response.streaming:
+            size: int = int(response.get("Content-Length", 0))
+        else:
+            size: int = len(response.content)
+
+        generateLog(endpoint, response.status_code, 200 <= response.status_code < 300)
+        getLatencyRecorder().record(endpoint, latency, response.status_code, size)
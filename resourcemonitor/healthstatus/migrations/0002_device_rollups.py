@@ -0,0 +1,94 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:20
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncHour
+
+
+def backfillRollups(apps, schema_editor):
+    """
+    Build the rollup tables from the existing DeviceStatus history.
+    """
+    DeviceStatus = apps.get_model('healthstatus', 'DeviceStatus')
+    Device = apps.get_model('healthstatus', 'Device')
+    DeviceHourlyAvailability = apps.get_model('healthstatus', 'DeviceHourlyAvailability')
+
+    totals = list(
+        DeviceStatus.objects.values('device_id').annotate(
+            successful=Count('id', filter=Q(status=True)),
+            total=Count('id'),
+            latest=Max('id'),
+        )
+    )
+    latest = DeviceStatus.objects.in_bulk([t['latest'] for t in totals]) # Most recent row per device.
+
+    Device.objects.bulk_create(
+        [
+            Device(
+                device_id=t['device_id'],
+                name=latest[t['latest']].name,
+                ip_address=latest[t['latest']].ip_address,
+                status=latest[t['latest']].status,
+                successful_attempts=t['successful'],
+                total_attempts=t['total'],
+                last_seen=latest[t['latest']].timestamp,
+            )
+            for t in totals
+        ],
+        batch_size=500,
+    )
+
+    hourly = DeviceStatus.objects.annotate(bucket=TruncHour('timestamp')).values('device_id', 'bucket').annotate(
+        successful=Count('id', filter=Q(status=True)),
+        total=Count('id'),
+    )
+    DeviceHourlyAvailability.objects.bulk_create(
+        (
+            DeviceHourlyAvailability(
+                device_id=h['device_id'],
+                hour=h['bucket'],
+                successful_attempts=h['successful'],
+                total_attempts=h['total'],
+            )
+            for h in hourly.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthstatus', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Device',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('status', models.BooleanField()),
+                ('successful_attempts', models.BigIntegerField(default=0)),
+                ('total_attempts', models.BigIntegerField(default=0)),
+                ('last_seen', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeviceHourlyAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.IntegerField()),
+                ('hour', models.DateTimeField()),
+                ('successful_attempts', models.BigIntegerField(default=0)),
+                ('total_attempts', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='devicehourlyavailability',
+            constraint=models.UniqueConstraint(fields=('device_id', 'hour'), name='unique_device_hour'),
+        ),
+        migrations.RunPython(backfillRollups, migrations.RunPython.noop),
+    ]
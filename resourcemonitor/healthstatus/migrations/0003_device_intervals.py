@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthstatus', '0002_device_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.BooleanField()),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField(null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intervals', to='healthstatus.device', to_field='device_id')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['device', 'start'], name='interval_device_start'), models.Index(fields=['end'], name='interval_end')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthstatus', '0003_device_intervals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=200)),
+                ('resolution', models.IntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('total_requests', models.BigIntegerField(default=0)),
+                ('successful_requests', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='systemmetricrollup',
+            constraint=models.UniqueConstraint(fields=('endpoint', 'resolution', 'bucket'), name='unique_metric_bucket'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthstatus', '0004_system_metric_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='devicehourlyavailability',
+            index=models.Index(fields=['hour'], name='hourly_hour'),
+        ),
+        migrations.AddIndex(
+            model_name='devicestatus',
+            index=models.Index(fields=['device_id', 'timestamp'], name='status_device_time'),
+        ),
+        migrations.AddIndex(
+            model_name='devicestatus',
+            index=models.Index(fields=['timestamp'], name='status_time'),
+        ),
+        migrations.AddIndex(
+            model_name='systemmetric',
+            index=models.Index(fields=['endpoint', 'timestamp'], name='metric_endpoint_time'),
+        ),
+        migrations.AddIndex(
+            model_name='systemmetric',
+            index=models.Index(fields=['timestamp'], name='metric_time'),
+        ),
+        migrations.AddIndex(
+            model_name='systemmetricrollup',
+            index=models.Index(fields=['resolution', 'bucket'], name='rollup_resolution_bucket'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthstatus', '0006_metric_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestLatency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=200)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('requests', models.IntegerField()),
+                ('errors', models.IntegerField()),
+                ('bytes', models.BigIntegerField()),
+                ('p50', models.FloatField()),
+                ('p95', models.FloatField()),
+                ('p99', models.FloatField()),
+                ('max', models.FloatField()),
+                ('counts', models.JSONField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['endpoint', 'start'], name='latency_endpoint_start'), models.Index(fields=['start'], name='latency_start')],
+            },
+        ),
+    ]
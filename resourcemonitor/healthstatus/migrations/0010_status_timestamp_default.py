@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:54
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthstatus', '0009_data_version_updated'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='devicestatus',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthstatus', '0010_status_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='slo_target',
+            field=models.FloatField(null=True),
+        ),
+    ]
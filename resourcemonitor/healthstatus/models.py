@@ -3,6 +3,7 @@ This file defines the data models for the app.
 The database for this app is left as default SQLite.
 """
 from django.db import models
+from django.utils import timezone
 
 class DeviceStatus(models.Model):
     """
@@ -12,7 +13,13 @@ class DeviceStatus(models.Model):
     name = models.CharField(max_length=100)
     ip_address = models.GenericIPAddressField()
     status = models.BooleanField()
-    timestamp = models.DateTimeField(auto_now_add=True)  # Inserted timestamp
+    timestamp = models.DateTimeField(default=timezone.now)  # Poll timestamp, set by the sample store
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["device_id", "timestamp"], name="status_device_time"),
+            models.Index(fields=["timestamp"], name="status_time"),
+        ]
 
 class SystemMetric(models.Model):
     """
@@ -21,4 +28,109 @@ class SystemMetric(models.Model):
     endpoint = models.CharField(max_length=200)   # The main dashboard, metrics dashboard, or the devices page.
     status_code = models.IntegerField()           # HTTP status code
     success = models.BooleanField()               # Did it succeed (2xx = True, else False)
-    timestamp = models.DateTimeField(auto_now_add=True) # Inserted timestamp
+    timestamp = models.DateTimeField(default=timezone.now) # Logged timestamp, kept when writes are buffered
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["endpoint", "timestamp"], name="metric_endpoint_time"),
+            models.Index(fields=["timestamp"], name="metric_time"),
+        ]
+
+class Device(models.Model):
+    """
+    One row per monitored device.
+    Holds the latest reported status and running availability counters,
+    which are updated as each poll is ingested.
+    """
+    device_id = models.IntegerField(unique=True)
+    name = models.CharField(max_length=100)
+    ip_address = models.GenericIPAddressField()
+    status = models.BooleanField()                        # Status reported by the latest poll
+    successful_attempts = models.BigIntegerField(default=0)
+    total_attempts = models.BigIntegerField(default=0)
+    last_seen = models.DateTimeField()                    # Timestamp of the latest poll
+    slo_target = models.FloatField(null=True)             # Availability % target, settings.AVAILABILITY_SLO_TARGET if null
+
+class DeviceHourlyAvailability(models.Model):
+    """
+    Availability counters for one device over one hour.
+    """
+    device_id = models.IntegerField()
+    hour = models.DateTimeField()                         # Start of the hour bucket
+    successful_attempts = models.BigIntegerField(default=0)
+    total_attempts = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device_id", "hour"], name="unique_device_hour"),
+        ]
+        indexes = [
+            models.Index(fields=["hour"], name="hourly_hour"),
+        ]
+
+class DeviceInterval(models.Model):
+    """
+    A period during which a device held one status.
+    Replaces per-poll samples when DEVICE_STORAGE_MODE is "intervals".
+    """
+    device = models.ForeignKey(Device, to_field="device_id", on_delete=models.CASCADE, related_name="intervals")
+    status = models.BooleanField()
+    start = models.DateTimeField()
+    end = models.DateTimeField(null=True)                 # Null while the device still holds this status
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["device", "start"], name="interval_device_start"),
+            models.Index(fields=["end"], name="interval_end"),
+        ]
+
+class SystemMetricRollup(models.Model):
+    """
+    SystemMetric counts for one endpoint over one time bucket.
+    Raw metrics are downsampled into these by the apply_retention command.
+    """
+    endpoint = models.CharField(max_length=200)
+    resolution = models.IntegerField()                    # Bucket length in seconds (60 or 3600)
+    bucket = models.DateTimeField()                       # Start of the bucket
+    total_requests = models.BigIntegerField(default=0)
+    successful_requests = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["endpoint", "resolution", "bucket"], name="unique_metric_bucket"),
+        ]
+        indexes = [
+            models.Index(fields=["resolution", "bucket"], name="rollup_resolution_bucket"),
+        ]
+
+class RequestLatency(models.Model):
+    """
+    Latency histogram for one endpoint over one flush period.
+    Recorded by the RequestMetricsMiddleware for every request.
+    """
+    endpoint = models.CharField(max_length=200)           # The matched URL route
+    start = models.DateTimeField()                        # Start of the flush period
+    end = models.DateTimeField()                          # End of the flush period
+    requests = models.IntegerField()
+    errors = models.IntegerField()                        # Responses outside of 2xx
+    bytes = models.BigIntegerField()                      # Total response payload size
+    p50 = models.FloatField()                             # Latency percentiles in milliseconds
+    p95 = models.FloatField()
+    p99 = models.FloatField()
+    max = models.FloatField()
+    counts = models.JSONField()                           # Requests per bucket of LATENCY_BUCKETS
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["endpoint", "start"], name="latency_endpoint_start"),
+            models.Index(fields=["start"], name="latency_start"),
+        ]
+
+class DataVersion(models.Model):
+    """
+    A counter per dataset, bumped whenever new data for it is written.
+    Cached dashboard fragments are keyed by these, so they are rebuilt once per change.
+    """
+    name = models.CharField(max_length=100, unique=True) # The dataset, e.g. "device" or "systemmetric"
+    version = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(default=timezone.now) # When the version was last bumped
@@ -0,0 +1,104 @@
+"""
+This file contains the concurrent per-device poller for the health status app.
+Each device is polled on its own endpoint through the shared DeviceApiClient,
+with a bounded number of requests in flight on its pooled keep-alive connections,
+so every request gets the clients retries and circuit breaker.
+"""
+from healthstatus.models import Device
+from .utils import ingestDevices
+from .client import CircuitOpenError, DeviceApiClient, getDeviceClient
+from .collector import pollDevices
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from typing import Iterable, List, Optional, Tuple
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+def fetchDevice(client: DeviceApiClient, deviceId: int, timeout: float) -> Optional[dict]:
+    """
+    Poll a single device endpoint.
+
+    Args:
+        client (DeviceApiClient): The shared client holding the connection pool.
+        deviceId (int): The device to poll.
+        timeout (float): Seconds to wait for the device.
+
+    Returns:
+        dict | None: The device record, or None if the device could not be reached.
+
+    Raises:
+        CircuitOpenError: If the circuit breaker is open, as the API itself is down.
+    """
+    try:
+        resp: requests.Response = client.get(f"/{deviceId}", timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+    except CircuitOpenError:
+        raise
+    except (requests.RequestException, ValueError) as e:
+        logger.debug("Device %d unreachable: %s", deviceId, e)
+        return None
+
+def pollFleet(client: DeviceApiClient, deviceIds: Iterable[int], concurrency: int = 10,
+              timeout: float = 2.0) -> Tuple[List[dict], List[int]]:
+    """
+    Poll every device endpoint concurrently.
+    At most one request per pooled connection of the client is in flight,
+    so every request reuses a keep-alive connection.
+
+    Args:
+        client (DeviceApiClient): The shared client holding the connection pool.
+        deviceIds (Iterable[int]): The devices to poll.
+        concurrency (int): Maximum number of requests in flight.
+        timeout (float): Seconds to wait for each device.
+
+    Returns:
+        Tuple[List[dict], List[int]]: The device records received, and the ids of unreachable devices.
+
+    Raises:
+        CircuitOpenError: If the circuit breaker opens during the poll, so the poll is not stored.
+    """
+    deviceIds = list(deviceIds)
+    with ThreadPoolExecutor(max(1, min(concurrency, client.poolSize)), thread_name_prefix="DevicePoller") as pool:
+        results: List[Optional[dict]] = list(pool.map(lambda deviceId: fetchDevice(client, deviceId, timeout), deviceIds))
+
+    devices: List[dict] = [r for r in results if r is not None]
+    failed: List[int] = [deviceId for deviceId, r in zip(deviceIds, results) if r is None]
+    return devices, failed
+
+def pollDevicesConcurrently(concurrency: Optional[int] = None, timeout: Optional[float] = None) -> int:
+    """
+    Poll every known device on its own endpoint and store the poll.
+    Devices which do not answer within the timeout are recorded as down.
+    If no devices are known yet, the inventory is discovered with a single fleet poll.
+
+    Args:
+        concurrency (int, optional): Defaults to settings.DEVICE_POLL_CONCURRENCY.
+        timeout (float, optional): Defaults to settings.DEVICE_POLL_TIMEOUT.
+
+    Returns:
+        int: The number of devices polled.
+
+    Raises:
+        CircuitOpenError: If the device API is down, nothing is stored.
+    """
+    if concurrency is None:
+        concurrency = getattr(settings, "DEVICE_POLL_CONCURRENCY", 10)
+    if timeout is None:
+        timeout = getattr(settings, "DEVICE_POLL_TIMEOUT", 2.0)
+
+    inventory = {d["device_id"]: d for d in Device.objects.values("device_id", "name", "ip_address")}
+    if not inventory:
+        return pollDevices()
+
+    devices, failed = pollFleet(getDeviceClient(), inventory, concurrency, timeout)
+    devices += [
+        {"id": i, "name": inventory[i]["name"], "ip_address": inventory[i]["ip_address"], "status": False}
+        for i in failed
+    ]
+
+    stored: int = ingestDevices(devices)
+    logger.info("Polled %d devices, %d unreachable", stored, len(failed))
+    return stored
@@ -0,0 +1,306 @@
+"""
+This file contains the retention policy for the health status app.
+Old history is downsampled into rollups and deleted in bounded batches,
+each in its own short transaction, so collectors and page views are never
+blocked behind one long write lock.
+
+Tiers (configured by settings.HISTORY_RETENTION):
+    RAW: Device samples (in the SampleStore) and request logs (in the MetricStore).
+    MINUTE: 1 minute SystemMetricRollup rows.
+    INTERVALS: Closed DeviceInterval rows.
+    HOURLY: DeviceHourlyAvailability and hourly SystemMetricRollup rows.
+"""
+from healthstatus.database import serializedWrite
+from healthstatus.models import SystemMetric, SystemMetricRollup, DeviceInterval, DeviceHourlyAvailability
+from healthstatus.storage import getMetricStore, getSampleStore
+from healthstatus.versions import bumpVersion, DEVICES, METRICS
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, QuerySet, Sum
+from django.db.models.functions import TruncHour, TruncMinute
+from django.utils import timezone
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+MINUTE: int = 60
+HOUR: int = 3600
+
+DEFAULT_RETENTION: Dict[str, Optional[timedelta]] = {
+    "RAW": timedelta(hours=24),
+    "MINUTE": timedelta(days=30),
+    "INTERVALS": timedelta(days=90),
+    "HOURLY": None, # Kept forever
+}
+
+def getRetention() -> Dict[str, Optional[timedelta]]:
+    """
+    The retention period of each tier, from settings.HISTORY_RETENTION.
+
+    Args:
+        None
+
+    Returns:
+        Dict[str, timedelta | None]: Retention per tier, None keeps a tier forever.
+    """
+    return {**DEFAULT_RETENTION, **getattr(settings, "HISTORY_RETENTION", {})}
+
+def nextBatch(queryset: QuerySet, batchSize: int) -> Optional[QuerySet]:
+    """
+    Narrow a queryset to its next batch of rows by primary key range.
+
+    Args:
+        queryset (QuerySet): The rows still to process.
+        batchSize (int): Maximum rows in the batch.
+
+    Returns:
+        QuerySet | None: The batch, or None when no rows remain.
+    """
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batchSize])
+    if not ids:
+        return None
+    return queryset.filter(pk__gte=ids[0], pk__lte=ids[-1])
+
+def deleteInBatches(queryset: QuerySet, batchSize: int) -> int:
+    """
+    Delete rows in bounded batches, committing after each.
+
+    Args:
+        queryset (QuerySet): The rows to delete.
+        batchSize (int): Maximum rows deleted per transaction.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    deleted: int = 0
+    while count := deleteBatch(queryset, batchSize):
+        deleted += count
+    return deleted
+
+@serializedWrite
+def deleteBatch(queryset: QuerySet, batchSize: int) -> int:
+    """
+    Delete the next batch of rows in one transaction.
+
+    Args:
+        queryset (QuerySet): The rows still to delete.
+        batchSize (int): Maximum rows deleted.
+
+    Returns:
+        int: The number of rows deleted, 0 when none remain.
+    """
+    with transaction.atomic():
+        batch: Optional[QuerySet] = nextBatch(queryset, batchSize)
+        return batch.delete()[0] if batch is not None else 0
+
+def addMetricRollups(buckets: Iterable[dict], resolution: int) -> None:
+    """
+    Add counts into SystemMetricRollup, incrementing any existing bucket.
+
+    Args:
+        buckets (Iterable[dict]): Rows of endpoint, bucket, total and successful.
+        resolution (int): Bucket length in seconds.
+
+    Returns:
+        None
+    """
+    table: str = connection.ops.quote_name(SystemMetricRollup._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"""
+            INSERT INTO {table} (endpoint, resolution, bucket, total_requests, successful_requests)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (endpoint, resolution, bucket) DO UPDATE SET
+                total_requests = {table}.total_requests + excluded.total_requests,
+                successful_requests = {table}.successful_requests + excluded.successful_requests
+            """,
+            [
+                (b["endpoint"], resolution, connection.ops.adapt_datetimefield_value(b["bucket"]),
+                 b["total"], b["successful"])
+                for b in buckets
+            ],
+        )
+
+@serializedWrite
+def saveRollups(buckets: Iterable[dict], resolution: int) -> None:
+    """
+    Add counts into SystemMetricRollup in one transaction.
+    Used by stores outside the database, whose raw rows are deleted separately.
+
+    Args:
+        buckets (Iterable[dict]): Rows of endpoint, bucket, total and successful.
+        resolution (int): Bucket length in seconds.
+
+    Returns:
+        None
+    """
+    with transaction.atomic():
+        addMetricRollups(buckets, resolution)
+
+def downsampleMetrics(cutoff: datetime, batchSize: int) -> int:
+    """
+    Move SystemMetric rows older than cutoff into 1 minute rollups.
+
+    Args:
+        cutoff (datetime): Rows logged before this are downsampled.
+        batchSize (int): Maximum rows processed per transaction.
+
+    Returns:
+        int: The number of raw rows downsampled.
+    """
+    return downsampleInBatches(
+        SystemMetric.objects.filter(timestamp__lt=cutoff),
+        lambda batch: (
+            batch.values("endpoint", bucket=TruncMinute("timestamp"))
+            .annotate(total=Count("id"), successful=Count("id", filter=Q(success=True)))
+            .order_by()
+        ),
+        MINUTE,
+        batchSize,
+    )
+
+def downsampleRollups(cutoff: datetime, batchSize: int) -> int:
+    """
+    Move 1 minute SystemMetricRollup rows older than cutoff into hourly rollups.
+
+    Args:
+        cutoff (datetime): Buckets starting before this are downsampled.
+        batchSize (int): Maximum rows processed per transaction.
+
+    Returns:
+        int: The number of minute rollups downsampled.
+    """
+    return downsampleInBatches(
+        SystemMetricRollup.objects.filter(resolution=MINUTE, bucket__lt=cutoff),
+        lambda batch: (
+            batch.values("endpoint", hour=TruncHour("bucket"))
+            .annotate(total=Sum("total_requests"), successful=Sum("successful_requests"))
+            .values("endpoint", "total", "successful", bucket=F("hour"))
+            .order_by()
+        ),
+        HOUR,
+        batchSize,
+    )
+
+def downsampleInBatches(queryset: QuerySet, buckets: Callable[[QuerySet], Iterable[dict]],
+                        resolution: int, batchSize: int) -> int:
+    """
+    Move rows into SystemMetricRollup in bounded batches, committing after each.
+
+    Args:
+        queryset (QuerySet): The rows to downsample.
+        buckets (Callable[[QuerySet], Iterable[dict]]): Counts a batch into rows of endpoint, bucket, total and successful.
+        resolution (int): Bucket length in seconds.
+        batchSize (int): Maximum rows processed per transaction.
+
+    Returns:
+        int: The number of rows downsampled.
+    """
+    moved: int = 0
+    while count := downsampleBatch(queryset, buckets, resolution, batchSize):
+        moved += count
+    return moved
+
+@serializedWrite
+def downsampleBatch(queryset: QuerySet, buckets: Callable[[QuerySet], Iterable[dict]],
+                    resolution: int, batchSize: int) -> int:
+    """
+    Move the next batch of rows into SystemMetricRollup in one transaction.
+
+    Args:
+        queryset (QuerySet): The rows still to downsample.
+        buckets (Callable[[QuerySet], Iterable[dict]]): Counts a batch into rows of endpoint, bucket, total and successful.
+        resolution (int): Bucket length in seconds.
+        batchSize (int): Maximum rows processed.
+
+    Returns:
+        int: The number of rows downsampled, 0 when none remain.
+    """
+    with transaction.atomic():
+        batch: Optional[QuerySet] = nextBatch(queryset, batchSize)
+        if batch is None:
+            return 0
+        addMetricRollups(buckets(batch), resolution)
+        return batch.delete()[0]
+
+def applyRetention(now: Optional[datetime] = None, batchSize: Optional[int] = None) -> Dict[str, int]:
+    """
+    Apply every tier of the retention policy.
+    Device samples need no downsampling, they are already counted
+    in DeviceHourlyAvailability as they are ingested.
+
+    Args:
+        now (datetime, optional): The time retention is measured from. Defaults to now.
+        batchSize (int, optional): Defaults to settings.RETENTION_BATCH_SIZE.
+
+    Returns:
+        Dict[str, int]: Rows processed in each step.
+    """
+    now = now or timezone.now()
+    batchSize = batchSize or getattr(settings, "RETENTION_BATCH_SIZE", 5000)
+    retention = getRetention()
+    results: Dict[str, int] = {}
+
+    if retention["RAW"] is not None:
+        results["device_samples_deleted"] = getSampleStore().prune(now - retention["RAW"], batchSize)
+        results["metrics_downsampled"] = getMetricStore().downsample(now - retention["RAW"], batchSize)
+
+    if retention["MINUTE"] is not None:
+        results["minute_rollups_downsampled"] = downsampleRollups(now - retention["MINUTE"], batchSize)
+
+    if retention["INTERVALS"] is not None:
+        results["intervals_deleted"] = deleteInBatches(
+            DeviceInterval.objects.filter(end__lt=now - retention["INTERVALS"]), batchSize
+        )
+
+    if retention["HOURLY"] is not None:
+        results["hourly_deleted"] = deleteInBatches(
+            DeviceHourlyAvailability.objects.filter(hour__lt=now - retention["HOURLY"]), batchSize
+        ) + deleteInBatches(
+            SystemMetricRollup.objects.filter(resolution=HOUR, bucket__lt=now - retention["HOURLY"]), batchSize
+        )
+
+    if any(results.values()):
+        bumpVersion(DEVICES, METRICS)
+    logger.info("Applied retention: %s", results)
+    return results
+
+def reclaimSpace(pages: Optional[int] = None) -> bool:
+    """
+    Return pages freed by deleted rows to the file system.
+    Only applies to SQLite databases using incremental auto vacuum,
+    where each call frees a bounded number of pages without a long lock.
+
+    Args:
+        pages (int, optional): Maximum pages to free. Defaults to all free pages.
+
+    Returns:
+        bool: True if space was reclaimed.
+    """
+    if connection.vendor != "sqlite":
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2: # 2 is INCREMENTAL
+            return False
+        cursor.execute(f"PRAGMA incremental_vacuum({int(pages)})" if pages else "PRAGMA incremental_vacuum")
+        cursor.fetchall() # Steps the pragma until complete.
+    return True
+
+def enableIncrementalVacuum() -> None:
+    """
+    Switch an SQLite database to incremental auto vacuum.
+    This rebuilds the whole file once with VACUUM, so it should be run while the app is stopped.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
@@ -0,0 +1,106 @@
+// Fetch dashboard data from the metrics API and render the table and timeline.
+document.addEventListener("DOMContentLoaded", () => {
+  const timeWindow = document.body.dataset.window;
+  let page = 1;
+
+  // Revalidate with the server every time, unchanged data is answered with 304 and read from the browser cache.
+  async function getJSON(url) {
+    const resp = await fetch(url, { cache: "no-cache" });
+    if (!resp.ok) throw new Error(`${url} returned ${resp.status}`);
+    return resp.json();
+  }
+
+  const SLO_WINDOWS = ["1h", "24h", "30d"];
+  const percent = value => value === null ? "-" : value.toFixed(1) + "%";
+
+  // Burn rates above 1 exhaust the error budget before the window ends.
+  function burnRate(value) {
+    if (value === null) return "<td>-</td>";
+    return `<td class="${value > 1 ? "text-danger fw-bold" : ""}">${value.toFixed(2)}</td>`;
+  }
+
+  async function fetchAvailability() {
+    const params = new URLSearchParams({ window: timeWindow, page: page, page_size: 100 });
+    const devices = document.getElementById("deviceFilter").value.trim();
+    if (devices) params.set("device", devices);
+
+    try {
+      const data = await getJSON(`/api/metrics/availability?${params}`);
+      page = data.page;
+
+      const tbody = document.querySelector("#availTable tbody");
+      tbody.innerHTML = ""; // Reset Table
+
+      if (data.results.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="12">No device records available</td></tr>';
+      }
+      data.results.forEach(d => {
+        const row = document.createElement("tr");
+        row.innerHTML = `
+          <td><strong></strong></td>
+          <td>${d.successful_attempts}</td>
+          <td>${d.total_attempts}</td>
+          <td>${percent(d.availability)}</td>
+          <td>${percent(d.uptime)}</td>
+          <td>${percent(d.slo_target)}</td>
+          ${SLO_WINDOWS.map(w => `<td>${percent(d[`availability_${w}`])}</td>`).join("")}
+          ${SLO_WINDOWS.map(w => burnRate(d[`burn_rate_${w}`])).join("")}`;
+        row.querySelector("strong").textContent = d.name; // Device names are not trusted as HTML.
+        tbody.appendChild(row);
+      });
+
+      document.getElementById("pageInfo").textContent = `Page ${data.page} of ${data.pages} (${data.count} devices)`;
+      document.getElementById("prevPage").disabled = data.page <= 1;
+      document.getElementById("nextPage").disabled = data.page >= data.pages;
+    } catch (err) {
+      console.error("Error fetching availability:", err);
+    }
+  }
+
+  async function fetchTimeline() {
+    try {
+      const data = await getJSON(`/api/metrics/timeline?window=${timeWindow}`);
+      const chart = document.getElementById("systemChart");
+
+      if (data.points.length === 0) {
+        chart.innerHTML = "<p>No system metrics yet</p>";
+        return;
+      }
+      if (chart.querySelector("p")) chart.innerHTML = ""; // Clear the placeholder before plotting.
+
+      // One point per endpoint per bucket, sized by requests and coloured by success rate.
+      const maxRequests = Math.max(...data.points.map(p => p.requests));
+      Plotly.react(chart, [{
+        type: "scatter",
+        mode: "markers",
+        x: data.points.map(p => p.bucket),
+        y: data.points.map(p => p.endpoint),
+        text: data.points.map(p => `${p.requests} requests, ${p.success_rate.toFixed(1)}% successful`),
+        marker: {
+          size: data.points.map(p => 6 + 24 * Math.sqrt(p.requests / maxRequests)),
+          color: data.points.map(p => p.success_rate),
+          colorscale: "RdYlGn",
+          cmin: 0,
+          cmax: 100,
+          showscale: true,
+        },
+      }], {
+        title: `System Events Timeline (${data.bucket_seconds / 60} minute buckets)`,
+        height: 250,
+        margin: { l: 10, r: 10, t: 40, b: 10 },
+        yaxis: { automargin: true },
+      });
+    } catch (err) {
+      console.error("Error fetching timeline:", err);
+    }
+  }
+
+  // Pagination and filter controls
+  document.getElementById("prevPage").addEventListener("click", () => { page -= 1; fetchAvailability(); });
+  document.getElementById("nextPage").addEventListener("click", () => { page += 1; fetchAvailability(); });
+  document.getElementById("deviceFilter").addEventListener("change", () => { page = 1; fetchAvailability(); });
+
+  // Initial load
+  fetchAvailability();
+  fetchTimeline();
+});
@@ -1,43 +1,210 @@
-// Fetch device data from API and generate HTML table based on response.
+// Fetch device data from API and keep the device table up to date.
+// Rows are keyed by device id and patched in place, and only the rows scrolled
+// into view are in the DOM, so refreshing a large fleet touches a few dozen elements.
 document.addEventListener("DOMContentLoaded", () => {
+  const OVERSCAN = 10; // Rows rendered above and below the visible ones.
+
+  const viewport = document.getElementById("deviceViewport");
+  const tbody = document.getElementById("deviceRows");
+  const topSpacer = document.querySelector("#topSpacer td");
+  const bottomSpacer = document.querySelector("#bottomSpacer td");
+  const statusFilter = document.getElementById("statusFilter");
+  const sortOrder = document.getElementById("sortOrder");
+
+  const devices = new Map(); // Devices matching the filter by id.
+  let order = []; // Ids of those devices in display order.
+  const rendered = new Map(); // Rows in the DOM by device id.
+  let rowHeight = 0;
+
+  // Mirrors selectDevices on the server, for devices which change while shown.
+  function matches(d) {
+    return !statusFilter.value || d.status === (statusFilter.value === "up");
+  }
+
+  function compare(a, b) {
+    const keys = {
+      id: d => [d.id],
+      name: d => [d.name, d.id],
+      status: d => [d.status, d.name, d.id], // Down devices first.
+    }[sortOrder.value];
+    const ka = keys(a), kb = keys(b);
+    for (let i = 0; i < ka.length; i++) {
+      if (ka[i] < kb[i]) return -1;
+      if (ka[i] > kb[i]) return 1;
+    }
+    return 0;
+  }
+
+  function query() {
+    return new URLSearchParams({ status: statusFilter.value, sort: sortOrder.value }).toString();
+  }
+
+  function createRow() {
+    const row = document.createElement("tr");
+    row.innerHTML = "<td></td><td></td><td><span></span></td>";
+    return row;
+  }
+
+  // Write a device into its row, only touching the cells which changed.
+  function patchRow(row, d) {
+    const [name, ip, status] = row.cells;
+    if (name.textContent !== d.name) name.textContent = d.name;
+    if (ip.textContent !== d.ip_address) ip.textContent = d.ip_address;
+    const label = d.status === true ? "Up" : "Down"; // If device status is true, device is up, otherwise down.
+    const badge = status.firstChild;
+    if (badge.textContent !== label) {
+      badge.textContent = label;
+      badge.className = d.status === true ? "text-success" : "text-danger";
+    }
+  }
+
+  // Render the rows in view, reusing the rows of devices which were already shown.
+  function renderWindow() {
+    const height = rowHeight || 41;
+    let first = Math.max(0, Math.floor(viewport.scrollTop / height) - OVERSCAN);
+    first -= first % 2; // Keep the stripes from swapping as rows scroll past.
+    const last = Math.min(order.length, Math.ceil((viewport.scrollTop + viewport.clientHeight) / height) + OVERSCAN);
+    const visible = order.slice(first, last);
+
+    const keep = new Set(visible);
+    rendered.forEach((row, id) => {
+      if (!keep.has(id)) {
+        row.remove();
+        rendered.delete(id);
+      }
+    });
+
+    let previous = null;
+    visible.forEach(id => {
+      let row = rendered.get(id);
+      if (!row) {
+        row = createRow();
+        patchRow(row, devices.get(id));
+        rendered.set(id, row);
+      }
+      const expected = previous ? previous.nextSibling : tbody.firstChild;
+      if (expected !== row) tbody.insertBefore(row, expected);
+      previous = row;
+    });
+
+    if (!rowHeight && tbody.firstChild) rowHeight = tbody.firstChild.offsetHeight;
+    topSpacer.style.height = `${first * height}px`;
+    bottomSpacer.style.height = `${(order.length - last) * height}px`;
+    document.getElementById("deviceCount").textContent = `${order.length} devices`;
+  }
+
+  // Replace every device, for a full response or snapshot, already filtered and sorted by the server.
+  function setDevices(data) {
+    devices.clear();
+    data.forEach(d => devices.set(d.id, d));
+    order = data.map(d => d.id);
+    rendered.forEach((row, id) => {
+      if (devices.has(id)) patchRow(row, devices.get(id));
+    });
+    renderWindow();
+  }
+
+  // Apply the devices which changed, re-sorting only if the shown devices or their order changed.
+  function updateDevices(data) {
+    let reorder = false;
+    data.forEach(d => {
+      if (matches(d)) {
+        reorder = reorder || !devices.has(d.id) || sortOrder.value === "status";
+        devices.set(d.id, d);
+        if (rendered.has(d.id)) patchRow(rendered.get(d.id), d);
+      } else if (devices.delete(d.id)) {
+        reorder = true;
+      }
+    });
+    if (reorder) {
+      order = [...devices.values()].sort(compare).map(d => d.id);
+    }
+    renderWindow();
+  }
+
   async function fetchDevices() {
     try {
-      const resp = await fetch("/devices");
-      const data = await resp.json();
-
-      const tbody = document.querySelector("#deviceTable tbody");
-      tbody.innerHTML = ""; // Reset Table
-
-      data.forEach(d => {
-        const row = document.createElement("tr");
-        row.innerHTML = `
-          <td>${d.name}</td>
-          <td>${d.ip_address}</td>
-          <td>${d.status === true // If device status is true, device is up, otherwise down.
-              ? '<span class="text-success">Up</span>'
-              : '<span class="text-danger">Down</span>'}
-          </td>`;
-        tbody.appendChild(row);
-      });
+      const resp = await fetch(`/devices?${query()}`);
+      setDevices(await resp.json());
     } catch (err) {
       console.error("Error fetching devices:", err);
     }
   }
 
+  let scheduled = false;
+  viewport.addEventListener("scroll", () => {
+    if (!scheduled) {
+      scheduled = true;
+      requestAnimationFrame(() => {
+        scheduled = false;
+        renderWindow();
+      });
+    }
+  });
+
   // Manual refresh button
   document.getElementById("refreshBtn").addEventListener("click", fetchDevices);
 
-  // Auto refresh toggle
+  // Live updates are pushed by the server, polling every 5 seconds is the fallback
+  // when the event stream is unavailable (e.g. the app is served over WSGI).
+  let source = null;
   let intervalId = null;
-  document.getElementById("autoRefreshSwitch").addEventListener("change", (e) => {
+
+  function startPolling() {
+    fetchDevices(); // refresh immediately when enabled
+    intervalId = setInterval(fetchDevices, 5000); // 5 seconds
+  }
+
+  function startLive() {
+    if (!window.EventSource) {
+      startPolling();
+      return;
+    }
+    let opened = false;
+    source = new EventSource(`/devices/live?${query()}`);
+    source.addEventListener("open", () => { opened = true; });
+    source.addEventListener("snapshot", e => setDevices(JSON.parse(e.data)));
+    source.addEventListener("changes", e => updateDevices(JSON.parse(e.data)));
+    source.addEventListener("error", () => {
+      if (!opened) { // Never connected, so the browser would keep retrying in vain.
+        source.close();
+        source = null;
+        startPolling();
+      } // Otherwise the browser reconnects and receives a fresh snapshot.
+    });
+  }
+
+  function stopLive() {
+    if (source) {
+      source.close();
+      source = null;
+    }
+    clearInterval(intervalId);
+    intervalId = null;
+  }
+
+  const liveSwitch = document.getElementById("autoRefreshSwitch");
+  liveSwitch.addEventListener("change", (e) => {
     if (e.target.checked) {
-      fetchDevices(); // refresh immediately when enabled
-      intervalId = setInterval(fetchDevices, 5000); // 5 seconds
+      startLive();
     } else {
-      clearInterval(intervalId);
+      stopLive();
     }
   });
 
+  // A new filter or order is a new selection from the server.
+  function reload() {
+    viewport.scrollTop = 0;
+    if (liveSwitch.checked) {
+      stopLive();
+      startLive();
+    } else {
+      fetchDevices();
+    }
+  }
+  statusFilter.addEventListener("change", reload);
+  sortOrder.addEventListener("change", reload);
+
   // Initial load
   fetchDevices();
 });
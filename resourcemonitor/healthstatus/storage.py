@@ -0,0 +1,716 @@
+"""
+This file contains the time-series storage backends for device samples and request logs.
+Device samples, one status per device per transition, and request logs (SystemMetric)
+are the app's append heavy data. They are written and read through a SampleStore and a
+MetricStore, chosen by settings.TIMESERIES_BACKEND and TIMESERIES_METRIC_BACKEND,
+so they can be kept somewhere better suited to them than the relational database.
+Current device state, the availability counters and request rollups stay in the database either way.
+
+Backends:
+    OrmSampleStore: The DeviceStatus table (the default).
+    ParquetSampleStore: Append-only Parquet segments, one directory per day (needs pyarrow).
+    OrmMetricStore: The SystemMetric table (the default).
+    ParquetMetricStore: Append-only Parquet segments, one directory per day (needs pyarrow).
+"""
+from healthstatus.models import DeviceStatus, SystemMetric
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time as dtime, timedelta, timezone as tz
+from itertools import count
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import threading
+import time
+import pandas as pd
+
+SAMPLE_COLUMNS: List[str] = ["timestamp", "device_id", "name", "ip_address", "status"]
+AVAILABILITY_COLUMNS: List[str] = ["device_id", "name", "successful_attempts", "total_attempts", "availability"]
+REQUEST_COUNT_COLUMNS: List[str] = ["endpoint", "slot", "requests", "successful"]
+
+# Slot lengths in seconds requests can be counted by, and the database function truncating to each.
+TRUNCATIONS: Dict[int, type] = {60: TruncMinute, 3600: TruncHour, 86400: TruncDay}
+
+def afterCommit(write: Callable[[], None]) -> None:
+    """
+    Run a write to storage outside the database once the caller's transaction commits,
+    or immediately outside of a transaction, so a rolled back write leaves nothing behind.
+
+    Args:
+        write (Callable[[], None]): The write.
+
+    Returns:
+        None
+    """
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(write)
+    else:
+        write()
+
+class SampleStore(ABC):
+    """
+    Storage for device samples.
+    Every backend returns the same columns, in the same order, for the same samples.
+    """
+    @abstractmethod
+    def writeSamples(self, samples: Iterable[dict], timestamp: Optional[datetime] = None,
+                     batchSize: Optional[int] = None) -> int:
+        """
+        Append a poll of device samples.
+        Samples written inside a transaction are only kept if it commits.
+
+        Args:
+            samples (Iterable[dict]): Device records as returned by the Flask API ({"id", "name", "ip_address", "status"}).
+            timestamp (datetime, optional): Time of the poll. Defaults to now.
+            batchSize (int, optional): Maximum samples per INSERT, where it applies.
+
+        Returns:
+            int: The number of samples written.
+        """
+
+    @abstractmethod
+    def queryRange(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None,
+                   limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+        """
+        Read the samples taken in [start, end).
+
+        Args:
+            start (datetime): Start of the range, inclusive.
+            end (datetime): End of the range, exclusive.
+            deviceIds (List[int], optional): Only include these devices. Defaults to every device.
+            limit (int, optional): Maximum samples read. Defaults to every sample.
+            offset (int): Samples skipped, in the returned order, before reading.
+
+        Returns:
+            pd.DataFrame: SAMPLE_COLUMNS ordered by timestamp then device_id, with UTC timestamps.
+        """
+
+    @abstractmethod
+    def countRange(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None) -> int:
+        """
+        Count the samples taken in [start, end), without reading them.
+
+        Args:
+            start (datetime): Start of the range, inclusive.
+            end (datetime): End of the range, exclusive.
+            deviceIds (List[int], optional): Only include these devices. Defaults to every device.
+
+        Returns:
+            int: The number of samples.
+        """
+
+    @abstractmethod
+    def availability(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None) -> pd.DataFrame:
+        """
+        Per device availability over the samples taken in [start, end).
+
+        Args:
+            start (datetime): Start of the range, inclusive.
+            end (datetime): End of the range, exclusive.
+            deviceIds (List[int], optional): Only include these devices. Defaults to every device.
+
+        Returns:
+            pd.DataFrame: AVAILABILITY_COLUMNS, availability as a %, best performing devices first.
+        """
+
+    @abstractmethod
+    def prune(self, before: datetime, batchSize: Optional[int] = None) -> int:
+        """
+        Delete samples taken before a time, as the retention policy expires them.
+
+        Args:
+            before (datetime): Samples older than this may be deleted.
+            batchSize (int, optional): Maximum samples deleted per transaction, where it applies.
+
+        Returns:
+            int: The number of samples deleted.
+        """
+
+    @staticmethod
+    def finishAvailability(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add the availability % to per device counts and apply the shared order.
+        """
+        df = df.astype({"device_id": "int64", "successful_attempts": "int64", "total_attempts": "int64"})
+        df["availability"] = df["successful_attempts"] * 100.0 / df["total_attempts"]
+        return (
+            df.sort_values(["availability", "device_id"], ascending=[False, True])
+            .reset_index(drop=True)[AVAILABILITY_COLUMNS]
+        )
+
+
+class MetricStore(ABC):
+    """
+    Storage for request logs.
+    Every backend returns the same columns, in the same order, for the same logs.
+    """
+    @abstractmethod
+    def writeMetrics(self, metrics: Iterable[SystemMetric]) -> int:
+        """
+        Append timestamped request logs.
+        Logs written inside a transaction are only kept if it commits.
+
+        Args:
+            metrics (Iterable[SystemMetric]): Unsaved logs.
+
+        Returns:
+            int: The number of logs written.
+        """
+
+    @abstractmethod
+    def countRequests(self, start: datetime, end: datetime, resolution: int) -> pd.DataFrame:
+        """
+        Count the requests logged in [start, end) per endpoint per time slot.
+
+        Args:
+            start (datetime): Start of the range, inclusive.
+            end (datetime): End of the range, exclusive.
+            resolution (int): Slot length in seconds, a key of TRUNCATIONS.
+
+        Returns:
+            pd.DataFrame: REQUEST_COUNT_COLUMNS, with UTC slot start times, in no particular order.
+        """
+
+    @abstractmethod
+    def downsample(self, before: datetime, batchSize: Optional[int] = None) -> int:
+        """
+        Move logs taken before a time into 1 minute SystemMetricRollup rows, as the retention policy expires them.
+
+        Args:
+            before (datetime): Logs older than this may be downsampled.
+            batchSize (int, optional): Maximum logs moved per transaction, where it applies.
+
+        Returns:
+            int: The number of logs downsampled.
+        """
+
+
+class OrmSampleStore(SampleStore):
+    """
+    Samples stored as DeviceStatus rows in the default database.
+    Writes join the caller's transaction.
+    """
+    def writeSamples(self, samples: Iterable[dict], timestamp: Optional[datetime] = None,
+                     batchSize: Optional[int] = None) -> int:
+        timestamp = timestamp or timezone.now()
+        rows: List[DeviceStatus] = DeviceStatus.objects.bulk_create(
+            [
+                DeviceStatus(device_id=d["id"], name=d["name"], ip_address=d["ip_address"],
+                             status=d["status"], timestamp=timestamp)
+                for d in samples
+            ],
+            batch_size=batchSize or getattr(settings, "DEVICE_INGEST_BATCH_SIZE", 500),
+        )
+        return len(rows)
+
+    def __range(self, start: datetime, end: datetime, deviceIds: Optional[List[int]]):
+        query = DeviceStatus.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        if deviceIds is not None:
+            query = query.filter(device_id__in=deviceIds)
+        return query
+
+    def queryRange(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None,
+                   limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+        rows = self.__range(start, end, deviceIds).order_by("timestamp", "device_id").values_list(*SAMPLE_COLUMNS)
+        rows = rows[offset:offset + limit] if limit is not None else rows[offset:] # LIMIT and OFFSET in the query.
+        df: pd.DataFrame = pd.DataFrame.from_records(list(rows), columns=SAMPLE_COLUMNS)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        return df.astype({"device_id": "int64", "status": "bool"})
+
+    def countRange(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None) -> int:
+        return self.__range(start, end, deviceIds).count()
+
+    def availability(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None) -> pd.DataFrame:
+        rows = (
+            self.__range(start, end, deviceIds)
+            .values("device_id")
+            .annotate(name=Max("name"), successful_attempts=Count("id", filter=Q(status=True)), total_attempts=Count("id"))
+            .values_list("device_id", "name", "successful_attempts", "total_attempts")
+            .order_by()
+        )
+        return self.finishAvailability(pd.DataFrame.from_records(list(rows), columns=AVAILABILITY_COLUMNS[:4]))
+
+    def prune(self, before: datetime, batchSize: Optional[int] = None) -> int:
+        from healthstatus.retention import deleteInBatches # Retention imports this module.
+        return deleteInBatches(
+            DeviceStatus.objects.filter(timestamp__lt=before),
+            batchSize or getattr(settings, "RETENTION_BATCH_SIZE", 5000),
+        )
+
+
+class OrmMetricStore(MetricStore):
+    """
+    Request logs stored as SystemMetric rows in the default database.
+    Writes join the caller's transaction.
+    """
+    def writeMetrics(self, metrics: Iterable[SystemMetric]) -> int:
+        return len(SystemMetric.objects.bulk_create(list(metrics)))
+
+    def countRequests(self, start: datetime, end: datetime, resolution: int) -> pd.DataFrame:
+        if resolution not in TRUNCATIONS:
+            raise ValueError(f"resolution must be one of {', '.join(map(str, TRUNCATIONS))}.")
+        rows = (
+            SystemMetric.objects
+            .filter(timestamp__gte=start, timestamp__lt=end)
+            .values("endpoint", slot=TRUNCATIONS[resolution]("timestamp"))
+            .annotate(requests=Count("id"), successful=Count("id", filter=Q(success=True)))
+            .values_list(*REQUEST_COUNT_COLUMNS)
+            .order_by()
+        )
+        df: pd.DataFrame = pd.DataFrame.from_records(list(rows), columns=REQUEST_COUNT_COLUMNS)
+        df["slot"] = pd.to_datetime(df["slot"], utc=True)
+        return df
+
+    def downsample(self, before: datetime, batchSize: Optional[int] = None) -> int:
+        from healthstatus.retention import downsampleMetrics # Retention imports this module.
+        return downsampleMetrics(before, batchSize or getattr(settings, "RETENTION_BATCH_SIZE", 5000))
+
+
+class ParquetSegments:
+    """
+    Append-only Parquet segments sharing one schema, one directory per UTC day.
+    Each write adds a new segment file, written to a temporary name and renamed,
+    so readers never see a partial segment.
+
+    Attributes:
+        root (Path): Directory holding the day partitions.
+        schema (pyarrow.Schema): A UTC "timestamp" column, then the given columns.
+    """
+    def __init__(self, root: str, columns: Dict[str, str]) -> None:
+        """
+        Constructor for the ParquetSegments object.
+
+        Args:
+            root (str): Directory holding the day partitions, created if missing.
+            columns (Dict[str, str]): pyarrow type name of each column after the timestamp, e.g. {"status": "bool"}.
+
+        Returns:
+            None
+
+        Raises:
+            ImproperlyConfigured: If pyarrow is not installed.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImproperlyConfigured("Parquet storage requires pyarrow, pip install pyarrow.") from e
+        self.pa, self.ds, self.pq = pa, ds, pq # Imported here, pyarrow is only needed by these backends.
+
+        self.root: Path = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.schema = pa.schema(
+            [("timestamp", pa.timestamp("us", tz="UTC"))] + [(n, pa.type_for_alias(t)) for n, t in columns.items()]
+        )
+        self.__lock: threading.Lock = threading.Lock()
+        self.__sequence = count()
+
+    def partition(self, day: date) -> Path:
+        """
+        The directory of a UTC day.
+        """
+        return self.root / f"day={day.isoformat()}"
+
+    def days(self) -> List[date]:
+        """
+        The UTC days holding segments, oldest first.
+        """
+        return sorted(date.fromisoformat(p.name[len("day="):]) for p in self.root.glob("day=*") if p.is_dir())
+
+    def files(self, start: datetime, end: datetime) -> List[str]:
+        """
+        Segment files of the days overlapping [start, end).
+        """
+        first: date = start.astimezone(tz.utc).date()
+        last: date = (end - timedelta(microseconds=1)).astimezone(tz.utc).date()
+        return [
+            str(p)
+            for day in self.days() if first <= day <= last
+            for p in sorted(self.partition(day).glob("*.parquet"))
+        ]
+
+    def table(self, rows: Dict[str, list]):
+        """
+        A pyarrow table of the schema from columns of values.
+        """
+        return self.pa.table(rows, schema=self.schema)
+
+    def write(self, table, day: date) -> None:
+        """
+        Write a table as a new segment of a day.
+        """
+        partition: Path = self.partition(day)
+        partition.mkdir(exist_ok=True)
+        with self.__lock:
+            name: str = f"{time.time_ns()}-{os.getpid()}-{next(self.__sequence)}"
+        temporary: Path = partition / f".{name}.tmp"
+        self.pq.write_table(table, temporary, compression="zstd")
+        os.replace(temporary, partition / f"{name}.parquet")
+
+    def __scan(self, start: datetime, end: datetime, condition):
+        """
+        The dataset of the days overlapping [start, end) and the filter selecting its rows, or None without segments.
+        """
+        files: List[str] = self.files(start, end)
+        if not files:
+            return None
+
+        field = self.ds.field
+        timestamp = self.schema.field("timestamp").type
+        inRange = (field("timestamp") >= self.pa.scalar(start, timestamp)) & (field("timestamp") < self.pa.scalar(end, timestamp))
+        if condition is not None:
+            inRange &= condition
+        return self.ds.dataset(files, schema=self.schema, format="parquet"), inRange
+
+    def read(self, start: datetime, end: datetime, columns: List[str], condition=None):
+        """
+        Read columns of the rows in [start, end), skipping row groups outside it by their statistics.
+
+        Args:
+            start (datetime): Start of the range, inclusive.
+            end (datetime): End of the range, exclusive.
+            columns (List[str]): The columns to read.
+            condition (pyarrow.dataset.Expression, optional): A further filter on the rows.
+
+        Returns:
+            pyarrow.Table: The rows, in no particular order.
+        """
+        scan = self.__scan(start, end, condition)
+        if scan is None:
+            return self.schema.empty_table().select(columns)
+        dataset, rows = scan
+        return dataset.to_table(columns=columns, filter=rows)
+
+    def count(self, start: datetime, end: datetime, condition=None) -> int:
+        """
+        Count the rows in [start, end) without reading their columns.
+
+        Args:
+            start (datetime): Start of the range, inclusive.
+            end (datetime): End of the range, exclusive.
+            condition (pyarrow.dataset.Expression, optional): A further filter on the rows.
+
+        Returns:
+            int: The number of rows.
+        """
+        scan = self.__scan(start, end, condition)
+        if scan is None:
+            return 0
+        dataset, rows = scan
+        return dataset.count_rows(filter=rows)
+
+    def dayRanges(self, start: datetime, end: datetime) -> Iterator[Tuple[datetime, datetime]]:
+        """
+        The part of [start, end) within each day holding segments, oldest first.
+        """
+        for day in self.days():
+            dayStart: datetime = datetime.combine(day, dtime.min, tzinfo=tz.utc)
+            lower, upper = max(start, dayStart), min(end, dayStart + timedelta(days=1))
+            if lower < upper:
+                yield lower, upper
+
+    def readDay(self, day: date, columns: List[str]):
+        """
+        Read columns of every row of a UTC day.
+        """
+        start: datetime = datetime.combine(day, dtime.min, tzinfo=tz.utc)
+        return self.read(start, start + timedelta(days=1), columns)
+
+    def compact(self, day: date, sortBy: List[str]) -> None:
+        """
+        Merge the segments of a day into one, so reads open one file per day.
+        Only days which can no longer be written to should be compacted.
+
+        Args:
+            day (date): The UTC day.
+            sortBy (List[str]): Columns the merged segment is ordered by.
+
+        Returns:
+            None
+        """
+        partition: Path = self.partition(day)
+        segments: List[Path] = sorted(partition.glob("*.parquet"))
+        if len(segments) < 2:
+            return
+        table = self.ds.dataset([str(p) for p in segments], schema=self.schema, format="parquet").to_table()
+        self.write(table.sort_by([(c, "ascending") for c in sortBy]), day)
+        for segment in segments: # The merged segment is in place before the originals are removed.
+            segment.unlink()
+
+    def drop(self, day: date) -> int:
+        """
+        Delete every segment of a day.
+
+        Args:
+            day (date): The UTC day.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        partition: Path = self.partition(day)
+        deleted: int = 0
+        for segment in partition.glob("*.parquet"):
+            deleted += self.pq.ParquetFile(segment).metadata.num_rows
+            segment.unlink()
+        for leftover in partition.iterdir(): # Temporary files of interrupted writes.
+            leftover.unlink()
+        partition.rmdir()
+        return deleted
+
+
+class ParquetSampleStore(SampleStore):
+    """
+    Samples stored as append-only Parquet segments, one directory per UTC day.
+    Days before today are compacted into a single segment when pruned,
+    and whole days are deleted once expired.
+    Segments are written once the caller's transaction commits, and never if it rolls back.
+
+    Attributes:
+        segments (ParquetSegments): The day partitions.
+    """
+    ORDER: List[str] = ["timestamp", "device_id"]
+
+    def __init__(self, root: str) -> None:
+        """
+        Constructor for the ParquetSampleStore object.
+
+        Args:
+            root (str): Directory holding the day partitions, created if missing.
+
+        Returns:
+            None
+
+        Raises:
+            ImproperlyConfigured: If pyarrow is not installed.
+        """
+        self.segments: ParquetSegments = ParquetSegments(
+            root, {"device_id": "int64", "name": "string", "ip_address": "string", "status": "bool"}
+        )
+
+    def writeSamples(self, samples: Iterable[dict], timestamp: Optional[datetime] = None,
+                     batchSize: Optional[int] = None) -> int:
+        timestamp = (timestamp or timezone.now()).astimezone(tz.utc)
+        samples = list(samples)
+        if not samples:
+            return 0
+
+        table = self.segments.table({
+            "timestamp": [timestamp] * len(samples),
+            "device_id": [d["id"] for d in samples],
+            "name": [d["name"] for d in samples],
+            "ip_address": [d["ip_address"] for d in samples],
+            "status": [d["status"] for d in samples],
+        })
+        afterCommit(lambda: self.segments.write(table, timestamp.date()))
+        return len(samples)
+
+    def __devices(self, deviceIds: Optional[List[int]]):
+        return self.segments.ds.field("device_id").isin(deviceIds) if deviceIds is not None else None
+
+    def queryRange(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None,
+                   limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+        """
+        Days are in timestamp order, so a page only reads the days it overlaps,
+        skipping earlier days by their row counts.
+        """
+        condition = self.__devices(deviceIds)
+        tables: list = []
+        for lower, upper in self.segments.dayRanges(start, end):
+            if limit is not None and limit <= 0:
+                break
+            if offset or limit is not None: # Skip whole days without reading them.
+                rows: int = self.segments.count(lower, upper, condition)
+                if offset >= rows:
+                    offset -= rows
+                    continue
+
+            table = self.segments.read(lower, upper, SAMPLE_COLUMNS, condition).sort_by([(c, "ascending") for c in self.ORDER])
+            table = table.slice(offset, limit)
+            offset = 0
+            if limit is not None:
+                limit -= table.num_rows
+            tables.append(table)
+
+        table = self.segments.pa.concat_tables(tables) if tables else self.segments.schema.empty_table().select(SAMPLE_COLUMNS)
+        return table.to_pandas().astype({"device_id": "int64", "status": "bool"})
+
+    def countRange(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None) -> int:
+        return self.segments.count(start, end, self.__devices(deviceIds))
+
+    def availability(self, start: datetime, end: datetime, deviceIds: Optional[List[int]] = None) -> pd.DataFrame:
+        table = self.segments.read(start, end, ["device_id", "name", "status"], self.__devices(deviceIds))
+        counts = table.group_by("device_id").aggregate([
+            ("name", "max"), ("status", "sum"), ("status", "count"),
+        ]).rename_columns(["device_id", "name", "successful_attempts", "total_attempts"])
+        df: pd.DataFrame = counts.to_pandas()
+        df["successful_attempts"] = df["successful_attempts"].fillna(0)
+        return self.finishAvailability(df[AVAILABILITY_COLUMNS[:4]])
+
+    def compact(self, day: date) -> None:
+        """
+        Merge the segments of a day into one, see ParquetSegments.compact.
+
+        Args:
+            day (date): The UTC day.
+
+        Returns:
+            None
+        """
+        self.segments.compact(day, self.ORDER)
+
+    def prune(self, before: datetime, batchSize: Optional[int] = None) -> int:
+        """
+        Delete the days which end before a time, and compact the days before today.
+        Samples in the day containing before are kept until the whole day expires.
+        """
+        cutoff: date = before.astimezone(tz.utc).date()
+        today: date = timezone.now().astimezone(tz.utc).date()
+        deleted: int = 0
+
+        for day in self.segments.days():
+            if day < cutoff:
+                deleted += self.segments.drop(day)
+            elif day < today:
+                self.compact(day)
+        return deleted
+
+
+class ParquetMetricStore(MetricStore):
+    """
+    Request logs stored as append-only Parquet segments, one directory per UTC day.
+    Whole days are downsampled into rollups and deleted once expired,
+    logs in the day containing the cutoff are counted raw until then.
+    Segments are written once the caller's transaction commits, and never if it rolls back.
+
+    Attributes:
+        segments (ParquetSegments): The day partitions.
+    """
+    ORDER: List[str] = ["timestamp", "endpoint"]
+
+    def __init__(self, root: str) -> None:
+        """
+        Constructor for the ParquetMetricStore object.
+
+        Args:
+            root (str): Directory holding the day partitions, created if missing.
+
+        Returns:
+            None
+
+        Raises:
+            ImproperlyConfigured: If pyarrow is not installed.
+        """
+        self.segments: ParquetSegments = ParquetSegments(
+            root, {"endpoint": "string", "status_code": "int32", "success": "bool"}
+        )
+
+    def writeMetrics(self, metrics: Iterable[SystemMetric]) -> int:
+        byDay: Dict[date, List[SystemMetric]] = {} # A buffered batch may span midnight.
+        for metric in metrics:
+            byDay.setdefault(metric.timestamp.astimezone(tz.utc).date(), []).append(metric)
+
+        for day, group in byDay.items():
+            table = self.segments.table({
+                "timestamp": [m.timestamp for m in group],
+                "endpoint": [m.endpoint for m in group],
+                "status_code": [m.status_code for m in group],
+                "success": [m.success for m in group],
+            })
+            afterCommit(lambda table=table, day=day: self.segments.write(table, day))
+        return sum(len(group) for group in byDay.values())
+
+    def countRequests(self, start: datetime, end: datetime, resolution: int) -> pd.DataFrame:
+        if resolution not in TRUNCATIONS:
+            raise ValueError(f"resolution must be one of {', '.join(map(str, TRUNCATIONS))}.")
+        return self.count(self.segments.read(start, end, ["timestamp", "endpoint", "success"]).to_pandas(), resolution)
+
+    @staticmethod
+    def count(df: pd.DataFrame, resolution: int) -> pd.DataFrame:
+        """
+        Count logs per endpoint per slot of resolution seconds.
+        """
+        if df.empty:
+            return pd.DataFrame(columns=REQUEST_COUNT_COLUMNS)
+        df["slot"] = df["timestamp"].dt.floor(f"{resolution}s")
+        return (
+            df.groupby(["endpoint", "slot"], as_index=False)
+            .agg(requests=("success", "size"), successful=("success", "sum"))
+            .astype({"requests": "int64", "successful": "int64"})[REQUEST_COUNT_COLUMNS]
+        )
+
+    def downsample(self, before: datetime, batchSize: Optional[int] = None) -> int:
+        """
+        Move the days which end before a time into 1 minute rollups, and compact the days before today.
+        The rollups of a day are committed before its segments are deleted, so a crash in between
+        counts that day twice rather than losing it.
+        """
+        from healthstatus.retention import MINUTE, saveRollups # Retention imports this module.
+
+        cutoff: date = before.astimezone(tz.utc).date()
+        today: date = timezone.now().astimezone(tz.utc).date()
+        moved: int = 0
+
+        for day in self.segments.days():
+            if day < cutoff:
+                counts: pd.DataFrame = self.count(self.segments.readDay(day, ["timestamp", "endpoint", "success"]).to_pandas(), MINUTE)
+                saveRollups(
+                    [
+                        {"endpoint": e, "bucket": s.to_pydatetime(), "total": t, "successful": ok}
+                        for e, s, t, ok in counts[REQUEST_COUNT_COLUMNS].itertuples(index=False)
+                    ],
+                    MINUTE,
+                )
+                moved += self.segments.drop(day)
+            elif day < today:
+                self.segments.compact(day, self.ORDER)
+        return moved
+
+
+_store: Optional[SampleStore] = None
+_storeLock: threading.Lock = threading.Lock()
+
+def getSampleStore() -> SampleStore:
+    """
+    The process wide SampleStore, built from settings.TIMESERIES_BACKEND and TIMESERIES_OPTIONS.
+
+    Args:
+        None
+
+    Returns:
+        SampleStore: The configured store.
+    """
+    global _store
+    if _store is None:
+        with _storeLock:
+            if _store is None:
+                backend = import_string(getattr(settings, "TIMESERIES_BACKEND", "healthstatus.storage.OrmSampleStore"))
+                _store = backend(**getattr(settings, "TIMESERIES_OPTIONS", {}))
+    return _store
+
+_metricStore: Optional[MetricStore] = None
+_metricStoreLock: threading.Lock = threading.Lock()
+
+def getMetricStore() -> MetricStore:
+    """
+    The process wide MetricStore, built from settings.TIMESERIES_METRIC_BACKEND and TIMESERIES_METRIC_OPTIONS.
+
+    Args:
+        None
+
+    Returns:
+        MetricStore: The configured store.
+    """
+    global _metricStore
+    if _metricStore is None:
+        with _metricStoreLock:
+            if _metricStore is None:
+                backend = import_string(getattr(settings, "TIMESERIES_METRIC_BACKEND", "healthstatus.storage.OrmMetricStore"))
+                _metricStore = backend(**getattr(settings, "TIMESERIES_METRIC_OPTIONS", {}))
+    return _metricStore
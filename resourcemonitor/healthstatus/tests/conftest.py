@@ -0,0 +1,99 @@
+"""
+Shared fixtures for the healthstatus test suite.
+"""
+import json
+import pytest
+from django.core.cache import cache
+from healthstatus import client, collector, database, metricwriter, middleware
+
+
+@pytest.fixture(autouse=True)
+def resetCollector():
+    """
+    Ensure no test is served a device snapshot, or continues a delta sequence or bitset, from an earlier test.
+    """
+    collector.clearSnapshot()
+    collector._changes["seq"] = 0
+    collector._bitset.update(version=None, devices=None, ids=None, status=None, polls=0)
+    yield
+    collector.clearSnapshot()
+    collector._changes["seq"] = 0
+    collector._bitset.update(version=None, devices=None, ids=None, status=None, polls=0)
+
+
+@pytest.fixture(autouse=True)
+def deviceClient(monkeypatch):
+    """
+    Give each test its own device API client, so no test starts with an open circuit breaker.
+    """
+    monkeypatch.setattr(client, "_client", None)
+
+
+@pytest.fixture(autouse=True)
+def clearCache():
+    """
+    Data versions restart with each test database, so cached fragments must not outlive a test.
+    """
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def metricWriter(monkeypatch):
+    """
+    Give each test its own MetricWriter without a background thread,
+    so buffered logs are only written when the test flushes them, and never leak into another test.
+    """
+    writer = metricwriter.MetricWriter(background=False)
+    monkeypatch.setattr(metricwriter, "_writer", writer)
+    return writer
+
+
+@pytest.fixture
+def syncMetrics(settings):
+    """
+    Write SystemMetric logs during the request, for tests which read them straight back.
+    """
+    settings.METRIC_BUFFER_SIZE = 0
+
+
+@pytest.fixture(autouse=True)
+def databaseWriter(monkeypatch):
+    """
+    Give each test its own DatabaseWriter, stopped when the test ends.
+    Writes keep the SQLITE_SINGLE_WRITER setting of production: inside a django_db test's
+    transaction they run inline, as part of it, and transaction=True tests use the writer thread.
+    """
+    writer = database.DatabaseWriter()
+    monkeypatch.setattr(database, "_writer", writer)
+    yield writer
+    writer.close()
+
+
+@pytest.fixture(autouse=True)
+def latencyRecorder(monkeypatch):
+    """
+    Give each test its own LatencyRecorder, which is never flushed at exit.
+    """
+    recorder = middleware.LatencyRecorder()
+    monkeypatch.setattr(middleware, "_recorder", recorder)
+    return recorder
+
+
+@pytest.fixture
+def deviceApi(mocker):
+    """
+    Replace the Flask API with a fake response.
+    Returns a function taking the device records to serve, which returns the mocked Session.get.
+    """
+    def serve(devices, ndjson=True):
+        mockResp = mocker.MagicMock()
+        mockResp.__enter__.return_value = mockResp
+        mockResp.status_code = 200
+        mockResp.raise_for_status.return_value = None
+        mockResp.headers = {"Content-Type": "application/x-ndjson" if ndjson else "application/json"}
+        mockResp.iter_lines.return_value = [json.dumps(d).encode() for d in devices]
+        mockResp.json.return_value = devices
+        return mocker.patch("healthstatus.client.requests.Session.get", return_value=mockResp)
+    return serve
@@ -0,0 +1,163 @@
+"""
+This file is a test suite for the JSON metrics API.
+"""
+import pytest
+from datetime import timedelta
+from django.test import Client
+from django.utils import timezone
+from healthstatus import storage
+from healthstatus.models import SystemMetric
+from healthstatus.utils import generateLog, ingestDevices, getMetricTimeline
+
+
+@pytest.fixture
+def devices():
+    """
+    Ingest two polls of three devices, with device 2 down once and device 3 down twice.
+    """
+    for poll in range(2):
+        ingestDevices([
+            {"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": i == 1 or (i == 2 and poll == 0)}
+            for i in (1, 2, 3)
+        ])
+
+
+@pytest.mark.django_db
+def testAvailability(devices):
+    """
+    Test that availability is served best performing first, one page at a time.
+    """
+    client = Client()
+
+    first = client.get("/api/metrics/availability", {"page_size": 2}).json()
+    second = client.get("/api/metrics/availability", {"page_size": 2, "page": 2}).json()
+
+    assert (first["count"], first["pages"], second["page"]) == (3, 2, 2)
+    assert [(d["device_id"], d["name"], d["availability"]) for d in first["results"] + second["results"]] == [
+        (1, "Router_1", 100.0), (2, "Router_2", 50.0), (3, "Router_3", 0.0)
+    ]
+    assert all(d["uptime"] is None for d in first["results"]) # Only measured from intervals.
+
+
+@pytest.mark.django_db
+def testAvailabilitySlo(devices, settings):
+    """
+    Test that each device is served with its availability and error budget burn rate over every SLO window.
+    """
+    settings.AVAILABILITY_SLO_TARGET = 99.0
+
+    results = Client().get("/api/metrics/availability", {"window": "1h"}).json()["results"]
+
+    assert [(d["slo_target"], d["availability_30d"], round(d["burn_rate_1h"], 6), round(d["burn_rate_30d"], 6))
+            for d in results] == [(99.0, 100.0, 0.0, 0.0), (99.0, 50.0, 50.0, 50.0), (99.0, 0.0, 100.0, 100.0)]
+
+
+@pytest.mark.django_db
+def testAvailabilityUptime(settings):
+    """
+    Test that devices are served with their uptime when history is stored as intervals.
+    """
+    settings.DEVICE_STORAGE_MODE = "intervals"
+    for up in (True, False):
+        ingestDevices([
+            {"id": 1, "name": "Router_1", "ip_address": "192.168.0.1", "status": True},
+            {"id": 2, "name": "Router_2", "ip_address": "192.168.0.2", "status": up},
+        ])
+
+    results = Client().get("/api/metrics/availability", {"window": "1h"}).json()["results"]
+
+    assert results[0]["uptime"] == 100.0
+    assert 0.0 < results[1]["uptime"] < 100.0 # Up until the second poll, then down.
+
+
+@pytest.mark.django_db
+def testAvailabilityFilters(devices):
+    """
+    Test the device and time range filters.
+    """
+    client = Client()
+    future = (timezone.now() + timedelta(hours=2)).isoformat()
+
+    filtered = client.get("/api/metrics/availability", {"device": "1,3"}).json()
+    empty = client.get("/api/metrics/availability", {"start": future, "end": future.replace("T", " ") + "0"})
+
+    assert [d["device_id"] for d in filtered["results"]] == [1, 3]
+    assert empty.status_code == 400 # start is not before end.
+    assert client.get("/api/metrics/availability", {"start": future}).status_code == 400
+    assert client.get("/api/metrics/availability", {"device": "router"}).status_code == 400
+
+
+@pytest.mark.django_db
+def testHistory(devices):
+    """
+    Test that stored status changes are served oldest first, filtered by device, one page at a time.
+    """
+    client = Client()
+
+    first = client.get("/api/metrics/history", {"page_size": 3}).json()
+    filtered = client.get("/api/metrics/history", {"device": "2"}).json()
+
+    assert (first["count"], first["pages"]) == (4, 2)
+    assert [(d["device_id"], d["status"]) for d in first["results"]] == [(1, True), (2, True), (3, False)]
+    assert [(d["device_id"], d["status"], d["name"]) for d in filtered["results"]] == [(2, True, "Router_2"), (2, False, "Router_2")]
+    assert client.get("/api/metrics/history", {"device": "x"}).status_code == 400
+
+
+@pytest.mark.django_db
+def testHistoryReadsOnlyPage(devices, mocker):
+    """
+    Test that a page of history reads only its own samples from the store, and counts the rest.
+    """
+    store = storage.getSampleStore()
+    queryRange = mocker.spy(store, "queryRange")
+    countRange = mocker.spy(store, "countRange")
+
+    page = Client().get("/api/metrics/history", {"page_size": 1, "page": 3}).json()
+
+    assert (page["count"], page["pages"], [d["device_id"] for d in page["results"]]) == (4, 4, [3])
+    assert queryRange.call_args.kwargs == {"limit": 1, "offset": 2}
+    assert countRange.call_count == 1
+
+
+@pytest.mark.django_db
+def testTimeline(syncMetrics):
+    """
+    Test that the timeline is served as one point per endpoint per bucket.
+    """
+    for success in (True, True, False):
+        generateLog("/devices", 200 if success else 500, success)
+    SystemMetric.objects.create(endpoint="/", status_code=200, success=True, timestamp=timezone.now() - timedelta(days=2))
+
+    data = Client().get("/api/metrics/timeline", {"window": "1h", "endpoint": "/devices"}).json()
+
+    assert data["bucket_seconds"] == 60
+    assert [(p["endpoint"], p["requests"], p["successful"]) for p in data["points"]] == [("/devices", 3, 2)]
+
+
+@pytest.mark.django_db
+def testConditionalRequests(devices, mocker, settings, syncMetrics):
+    """
+    Test that unchanged data is answered with 304, without being queried again, and new data is not.
+    Each request is logged by the middleware, which must not change the ETag it is revalidated against.
+    """
+    build = mocker.patch("healthstatus.api.getMetricTimeline", wraps=getMetricTimeline)
+    client = Client()
+    generateLog("/devices", 200, True)
+
+    first = client.get("/api/metrics/timeline")
+    etag, modified = first["ETag"], first["Last-Modified"]
+
+    assert client.get("/api/metrics/timeline", HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert client.get("/api/metrics/timeline", HTTP_IF_MODIFIED_SINCE=modified).status_code == 304
+    assert build.call_count == 1
+    assert SystemMetric.objects.filter(endpoint="/api/metrics/timeline").count() == 3
+
+    generateLog("/devices", 200, True) # New logs are shown once the refresh period turns.
+    assert client.get("/api/metrics/timeline", HTTP_IF_NONE_MATCH=etag).status_code == 304
+    mocker.patch("healthstatus.api.timezone.now", return_value=timezone.now() + timedelta(seconds=settings.TIMELINE_REFRESH))
+    refreshed = client.get("/api/metrics/timeline", HTTP_IF_NONE_MATCH=etag)
+    assert refreshed.status_code == 200
+    assert sum(p["requests"] for p in refreshed.json()["points"] if p["endpoint"] == "/devices") == 2
+
+    availability = client.get("/api/metrics/availability")
+    assert client.get("/api/metrics/availability", HTTP_IF_NONE_MATCH=availability["ETag"]).status_code == 304
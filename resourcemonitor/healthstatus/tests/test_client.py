@@ -0,0 +1,138 @@
+"""
+This file is a test suite for the device API client.
+"""
+import pytest
+import requests
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from healthstatus.client import CircuitBreaker, CircuitOpenError, DeviceApiClient, getDeviceClient
+
+
+@pytest.fixture
+def fakeApi():
+    """
+    Serve a local HTTP/1.1 API answering each request with the next status of a list.
+    Yields the server, its statuses list and the client ports of the requests it received.
+    """
+    statuses, ports = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep connections alive.
+
+        def do_GET(self):
+            ports.append(self.client_address[1])
+            body = b"[]"
+            self.send_response(statuses.pop(0) if statuses else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/devices", statuses, ports
+    server.shutdown()
+    server.server_close()
+
+
+def testConnectionsAreReused(fakeApi):
+    """
+    Test that consecutive requests share one keep-alive connection.
+    """
+    url, _, ports = fakeApi
+    client = DeviceApiClient(url)
+
+    for _ in range(3):
+        assert client.get().json() == []
+
+    assert len(ports) == 3
+    assert len(set(ports)) == 1
+    client.close()
+
+
+def testRetriesUnavailable(fakeApi):
+    """
+    Test that 503 responses are retried with backoff until the API answers.
+    """
+    url, statuses, ports = fakeApi
+    statuses.extend([503, 503])
+    client = DeviceApiClient(url, retries=2, backoff=0.01)
+
+    assert client.get().status_code == 200
+    assert len(ports) == 3
+    assert client.breaker.state == "closed"
+    client.close()
+
+
+def testCircuitBreakerFailsFast(fakeApi, mocker):
+    """
+    Test that the breaker opens after repeated failures, then closes after a successful trial request.
+    """
+    url, _, ports = fakeApi
+    clock = mocker.patch("healthstatus.client.time.monotonic", return_value=100.0)
+    client = DeviceApiClient("http://127.0.0.1:1/devices", retries=0, breaker=CircuitBreaker(2, 30))
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.get(timeout=1)
+    assert client.breaker.state == "open"
+
+    client.url = url # The API recovers, but the breaker has not reset yet.
+    with pytest.raises(CircuitOpenError):
+        client.get()
+    assert ports == []
+
+    clock.return_value = 131.0
+    assert client.breaker.state == "half-open"
+    assert client.get().status_code == 200
+    assert client.breaker.state == "closed"
+    client.close()
+
+
+def testHalfOpenAllowsOneTrial(mocker):
+    """
+    Test that only one trial request is let through, and that its failure opens the breaker again.
+    """
+    clock = mocker.patch("healthstatus.client.time.monotonic", return_value=0.0)
+    breaker = CircuitBreaker(1, 10)
+    breaker.failure()
+
+    clock.return_value = 10.0
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.failure()
+    assert breaker.state == "open"
+
+
+def testTrialReleasedOnUnexpectedError(mocker):
+    """
+    Test that a trial request raising something other than a RequestException does not
+    leave the breaker half-open forever.
+    """
+    clock = mocker.patch("healthstatus.client.time.monotonic", return_value=0.0)
+    client = DeviceApiClient("http://127.0.0.1:1/devices", breaker=CircuitBreaker(1, 10))
+    client.breaker.failure()
+    mocker.patch.object(client.session, "get", side_effect=ValueError("Bad Header"))
+
+    clock.return_value = 10.0
+    with pytest.raises(ValueError):
+        client.get()
+
+    assert client.breaker.allow() # The next caller gets a trial of its own.
+    client.close()
+
+
+def testSharedClient(settings):
+    """
+    Test that one client, configured from settings, is shared by the process.
+    """
+    settings.DEVICE_API_BREAKER_THRESHOLD = 3
+
+    assert getDeviceClient() is getDeviceClient()
+    assert getDeviceClient().url.endswith("/devices")
+    assert getDeviceClient().breaker.threshold == 3
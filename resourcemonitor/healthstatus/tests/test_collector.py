@@ -0,0 +1,319 @@
+"""
+This file is a test suite for the device collector in the healthstatus app.
+"""
+import json
+import numpy as np
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from healthstatus.collector import (
+    BITSET_HEADER, decodeBitset, loadSnapshot, getLatestDevices, pollDevices, pollDeviceBitset, pollDeviceChanges, readDevices
+)
+from healthstatus.models import Device, DeviceStatus, SystemMetric
+from healthstatus.utils import ingestDevices
+
+DEVICES = [
+    {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+    {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": False},
+]
+
+@pytest.fixture
+def mockApi(deviceApi):
+    """
+    Replace the Flask API with a fake streamed response containing DEVICES.
+    """
+    return deviceApi(DEVICES)
+
+
+@pytest.mark.django_db
+def testPollDevices(mockApi):
+    """
+    Test that pollDevices stores every device returned by the API.
+    """
+    assert pollDevices() == 2
+    assert DeviceStatus.objects.count() == 2
+    assert Device.objects.count() == 2
+
+    args, kwargs = mockApi.call_args
+    assert kwargs["stream"] is True
+    assert kwargs["headers"]["Accept"] == "application/x-ndjson"
+
+
+@pytest.mark.django_db
+def testPollDevicesJSONFallback(deviceApi):
+    """
+    Test that a plain JSON array is still accepted from servers which do not stream.
+    """
+    deviceApi(DEVICES, ndjson=False)
+
+    assert pollDevices() == 2
+
+
+def testReadDevicesIsLazy(mocker):
+    """
+    Test that streamed records are parsed one line at a time.
+    """
+    lines = iter([json.dumps(d).encode() for d in DEVICES])
+    resp = mocker.Mock(headers={"Content-Type": "application/x-ndjson"})
+    resp.iter_lines.return_value = lines
+
+    records = readDevices(resp)
+    assert next(records) == DEVICES[0]
+    assert next(lines) # The second line has not been consumed yet.
+
+
+@pytest.mark.django_db
+def testLoadSnapshotEmpty():
+    """
+    Test that no snapshot is returned before any poll has been stored.
+    """
+    assert loadSnapshot(maxAge=15) is None
+
+
+@pytest.mark.django_db
+def testLoadSnapshot():
+    """
+    Test that the snapshot matches the schema of the Flask API.
+    """
+    ingestDevices(DEVICES)
+    assert loadSnapshot(maxAge=15) == DEVICES
+
+
+@pytest.mark.django_db
+def testLoadSnapshotStale():
+    """
+    Test that a snapshot older than maxAge is ignored.
+    """
+    ingestDevices(DEVICES)
+    Device.objects.update(last_seen=timezone.now() - timedelta(minutes=5))
+
+    assert loadSnapshot(maxAge=15) is None
+
+
+@pytest.mark.django_db
+def testGetLatestDevicesReusesSnapshot(mockApi, django_assert_num_queries):
+    """
+    Test that repeated calls within the refresh period do not touch the API or database.
+    """
+    ingestDevices(DEVICES)
+    getLatestDevices()
+
+    with django_assert_num_queries(0):
+        assert getLatestDevices() == DEVICES
+    mockApi.assert_not_called()
+
+
+@pytest.mark.django_db
+def testGetLatestDevicesFallback(mockApi):
+    """
+    Test that the API is polled when the collector has not stored a recent poll.
+    """
+    assert getLatestDevices() == DEVICES
+    mockApi.assert_called_once()
+
+
+@pytest.mark.django_db
+def testCollectDevicesCommand(mockApi, syncMetrics):
+    """
+    Test that a single collector run stores the poll and logs it.
+    """
+    call_command("collect_devices", "--once", "--mode", "stream")
+
+    assert DeviceStatus.objects.count() == 2
+    log = SystemMetric.objects.get()
+    assert log.endpoint == "/collector"
+    assert log.success is True
+
+
+@pytest.mark.django_db
+def testCollectDevicesCommandError(mocker, syncMetrics):
+    """
+    Test that an unreachable API is logged rather than stopping the collector.
+    """
+    mocker.patch("healthstatus.client.requests.Session.get", side_effect=Exception("Failed To Fetch Devices"))
+
+    call_command("collect_devices", "--once")
+
+    log = SystemMetric.objects.get()
+    assert log.endpoint == "/collector"
+    assert log.success is False
+
+
+@pytest.fixture
+def changesApi(mocker):
+    """
+    Replace the Flask API with a sequence of ?since= responses.
+    Returns a function taking the payloads to serve, which returns the mocked Session.get.
+    """
+    def serve(*payloads):
+        responses = []
+        for payload in payloads:
+            mockResp = mocker.Mock(status_code=200)
+            mockResp.json.return_value = payload
+            responses.append(mockResp)
+        return mocker.patch("healthstatus.client.requests.Session.get", side_effect=responses)
+    return serve
+
+
+@pytest.mark.django_db
+def testPollDeviceChanges(changesApi):
+    """
+    Test that a snapshot followed by a delta stores only the transitions.
+    """
+    mockGet = changesApi(
+        {"seq": 4, "full": True, "devices": DEVICES},
+        {"seq": 5, "full": False, "devices": [{"id": 2, "status": True}]},
+    )
+
+    assert pollDeviceChanges() == 2 # First sighting of each device.
+    assert pollDeviceChanges() == 1
+
+    assert [c.kwargs["params"] for c in mockGet.call_args_list] == [{"since": 0}, {"since": 4}]
+    assert list(DeviceStatus.objects.order_by("id").values_list("device_id", "status")) == [
+        (1, True), (2, False), (2, True)
+    ]
+    assert Device.objects.get(device_id=2).successful_attempts == 1
+    assert Device.objects.get(device_id=2).total_attempts == 2
+
+
+@pytest.mark.django_db
+def testPollDeviceChangesError(mocker):
+    """
+    Test that a failed poll does not advance the sequence number.
+    """
+    mocker.patch("healthstatus.client.requests.Session.get", side_effect=Exception("Failed To Fetch Devices"))
+
+    with pytest.raises(Exception):
+        pollDeviceChanges()
+
+
+@pytest.mark.django_db
+def testCollectDevicesCommandDelta(changesApi):
+    """
+    Test that the collector fetches changes by default.
+    """
+    mockGet = changesApi({"seq": 1, "full": True, "devices": DEVICES})
+
+    call_command("collect_devices", "--once")
+
+    assert mockGet.call_args.kwargs["params"] == {"since": 0}
+    assert Device.objects.count() == 2
+
+
+def encodeBitset(version, status):
+    """
+    Encode statuses as the Flask API does.
+    """
+    return BITSET_HEADER.pack(b"DVBS", version, len(status)) + np.packbits(status, bitorder="little").tobytes()
+
+
+@pytest.fixture
+def bitsetApi(mocker):
+    """
+    Replace the Flask API with a sequence of bitset and /metadata responses.
+    Returns a function taking (version, statuses) for each bitset or a device list for /metadata,
+    which returns the mocked Session.get.
+    """
+    def serve(*replies, version=7):
+        responses = []
+        for reply in replies:
+            mockResp = mocker.MagicMock(status_code=200)
+            mockResp.__enter__.return_value = mockResp
+            if isinstance(reply, tuple):
+                mockResp.headers = {"Content-Type": "application/x-device-bitset"}
+                mockResp.content = encodeBitset(*reply)
+            else:
+                mockResp.headers = {"Content-Type": "application/json", "X-Device-List-Version": str(version)}
+                mockResp.json.return_value = reply
+            responses.append(mockResp)
+        return mocker.patch("healthstatus.client.requests.Session.get", side_effect=responses)
+    return serve
+
+
+METADATA = [{k: v for k, v in d.items() if k != "status"} for d in DEVICES]
+
+
+def testDecodeBitset():
+    """
+    Test that the version and one status per device are read from the payload.
+    """
+    version, status = decodeBitset(encodeBitset(2 ** 63, [True, False, True] * 5))
+
+    assert version == 2 ** 63
+    assert status.dtype == bool
+    assert status.tolist() == [True, False, True] * 5
+
+
+@pytest.mark.parametrize("payload", [b"DVBS", b"JSON" + bytes(12), encodeBitset(1, [True] * 9)[:-1]])
+def testDecodeBitsetInvalid(payload):
+    """
+    Test that short, truncated or foreign payloads are rejected.
+    """
+    with pytest.raises(ValueError):
+        decodeBitset(payload)
+
+
+@pytest.mark.django_db
+def testPollDeviceBitset(bitsetApi):
+    """
+    Test that the device list is fetched once, then only the transitions of each bitset are stored.
+    """
+    mockGet = bitsetApi((7, [True, False]), METADATA, (7, [True, True]))
+
+    assert pollDeviceBitset() == 2 # First sighting of each device.
+    assert pollDeviceBitset() == 1
+
+    assert [c.args[0].endswith("/devices/metadata") for c in mockGet.call_args_list] == [False, True, False]
+    assert mockGet.call_args_list[0].kwargs["headers"]["Accept"].startswith("application/x-device-bitset")
+    assert list(DeviceStatus.objects.order_by("id").values_list("device_id", "status")) == [
+        (1, True), (2, False), (2, True)
+    ]
+    assert Device.objects.get(device_id=2).total_attempts == 2
+
+
+@pytest.mark.django_db
+def testPollDeviceBitsetNewList(bitsetApi):
+    """
+    Test that a new device list version is fetched before the bitset is stored.
+    """
+    devices = METADATA + [{"id": 3, "name": "Phone", "ip_address": "192.168.0.3"}]
+    bitsetApi((7, [True, False]), METADATA, (8, [True, False, True]), devices, version=8)
+
+    with pytest.raises(ValueError): # The first list does not match the bitset.
+        pollDeviceBitset()
+    assert pollDeviceBitset() == 3
+    assert Device.objects.count() == 3
+
+
+@pytest.mark.django_db
+def testPollDeviceBitsetJSONFallback(deviceApi):
+    """
+    Test that servers which cannot send a bitset are stored from their JSON.
+    """
+    deviceApi(DEVICES)
+
+    assert pollDeviceBitset() == 2
+    assert DeviceStatus.objects.count() == 2
+
+
+@pytest.mark.django_db
+def testGetLatestDevicesBitset(bitsetApi):
+    """
+    Test that the on demand poll decodes a bitset.
+    """
+    bitsetApi((7, [True, False]), METADATA)
+
+    assert getLatestDevices() == DEVICES
+
+
+@pytest.mark.django_db
+def testCollectDevicesCommandBitset(bitsetApi):
+    """
+    Test that the collector can poll for bitsets.
+    """
+    bitsetApi((7, [True, False]), METADATA)
+
+    call_command("collect_devices", "--once", "--mode", "bitset")
+
+    assert Device.objects.count() == 2
@@ -0,0 +1,127 @@
+"""
+This file is a test suite for the SQLite connection profile and the database writer thread.
+"""
+import pytest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from healthstatus import database
+from healthstatus.database import DatabaseWriter, serializedWrite
+from healthstatus.models import Device, DeviceStatus, SystemMetric
+from healthstatus.retention import applyRetention
+from healthstatus.utils import ingestDevices
+from healthstatus.versions import bumpVersion, getVersions, DEVICES
+
+pytestmark = pytest.mark.skipif(connection.vendor != "sqlite", reason="The profile only applies to SQLite.")
+
+
+@pytest.mark.django_db
+def testPragmasOnConnect(tmp_path):
+    """
+    Test that new connections are switched to WAL with the configured pragmas.
+    """
+    wrapper = DatabaseWrapper({**connection.settings_dict, "NAME": str(tmp_path / "wal.sqlite3")}, alias="wal")
+    try:
+        with wrapper.cursor() as cursor:
+            pragmas = {}
+            for name in ("journal_mode", "synchronous", "temp_store", "busy_timeout"):
+                cursor.execute(f"PRAGMA {name}")
+                pragmas[name] = cursor.fetchone()[0]
+    finally:
+        wrapper.close()
+
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "temp_store": 2, "busy_timeout": 20000}
+
+
+def testWritesRunInOrderOnOneThread():
+    """
+    Test that writes from many threads run one at a time on the writer thread, returning their results.
+    """
+    writer = DatabaseWriter()
+    ran, active, overlaps = [], [], []
+
+    def write(i):
+        active.append(i)
+        overlaps.append(len(active) > 1)
+        ran.append(threading.current_thread().name)
+        active.remove(i)
+        return i * 2
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: writer.run(write, i), range(50)))
+    writer.close()
+
+    assert results == [i * 2 for i in range(50)]
+    assert set(ran) == {"DatabaseWriter"}
+    assert not any(overlaps)
+
+
+def testWriteErrorsReachTheCaller():
+    """
+    Test that a failed write raises in its caller, and that nested writes do not deadlock.
+    """
+    writer = DatabaseWriter()
+
+    def fail():
+        raise ValueError("Failed To Write")
+
+    with pytest.raises(ValueError):
+        writer.run(fail)
+    assert writer.run(lambda: writer.run(lambda: "nested")) == "nested"
+
+    writer.close()
+    assert writer.run(threading.current_thread) is threading.current_thread() # Inline after close.
+
+
+@pytest.mark.django_db(transaction=True)
+def testConcurrentPollsAreSerialized(databaseWriter):
+    """
+    Test that polls stored from several threads at once are all written, by the writer thread.
+    """
+    devices = [{"id": i, "name": f"Router_{i}", "ip_address": "192.168.0.1", "status": True} for i in range(20)]
+
+    with ThreadPoolExecutor(4) as pool:
+        stored = list(pool.map(lambda _: ingestDevices(devices), range(8)))
+
+    assert stored == [20] * 8
+    assert DeviceStatus.objects.count() == 20 # Only the first poll changed any status.
+    assert Device.objects.get(device_id=1).total_attempts == 8
+
+
+@pytest.mark.django_db(transaction=True)
+def testWriteInsideTransactionRunsInline(databaseWriter):
+    """
+    Test that a write made inside the caller's transaction joins it, rather than waiting on
+    the writer thread for the write lock the caller holds.
+    """
+    @serializedWrite
+    def write():
+        bumpVersion(DEVICES)
+        return threading.current_thread().name
+
+    assert write() == "DatabaseWriter"
+    with transaction.atomic():
+        # Takes the write lock, which the writer thread would wait on.
+        Device.objects.create(device_id=1, name="Router", ip_address="192.168.0.1", status=True, last_seen=timezone.now())
+        assert write() == threading.current_thread().name
+    assert getVersions(DEVICES) == (2,)
+
+
+@pytest.mark.django_db(transaction=True)
+def testRetentionUsesWriter(databaseWriter, mocker):
+    """
+    Test that each retention batch and the version bump are written by the writer thread.
+    """
+    old = timezone.now() - timedelta(days=2)
+    for i in range(3):
+        SystemMetric.objects.create(endpoint="/devices", status_code=200, success=True)
+    SystemMetric.objects.update(timestamp=old)
+    run = mocker.spy(databaseWriter, "run")
+
+    assert applyRetention(batchSize=2)["metrics_downsampled"] == 3
+
+    writes = {c.args[0].__name__ for c in run.call_args_list}
+    assert {"deleteBatch", "downsampleBatch", "bumpVersion"} <= writes
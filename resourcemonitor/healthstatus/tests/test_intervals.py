@@ -0,0 +1,156 @@
+"""
+This file is a test suite for interval based device history in the healthstatus app.
+"""
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from healthstatus import storage
+from healthstatus.models import Device, DeviceInterval, DeviceStatus
+from healthstatus.utils import ingestDevices, ingestChanges, getIntervalAvail
+
+ROUTER = {"id": 1, "name": "Router", "ip_address": "192.168.0.1"}
+
+
+@pytest.fixture
+def intervalMode(settings):
+    """
+    Store device history as intervals.
+    """
+    settings.DEVICE_STORAGE_MODE = "intervals"
+
+
+@pytest.mark.django_db
+def testIngestDevicesIntervals(intervalMode):
+    """
+    Test that samples only open a new interval when the status changes.
+    """
+    for status in (True, True, False, False, True):
+        ingestDevices([{**ROUTER, "status": status}])
+
+    intervals = list(DeviceInterval.objects.order_by("start").values_list("status", "end"))
+
+    assert DeviceStatus.objects.count() == 0
+    assert [status for status, _ in intervals] == [True, False, True]
+    assert [end is None for _, end in intervals] == [False, False, True] # Only the latest is open.
+    assert Device.objects.get(device_id=1).total_attempts == 5
+
+
+@pytest.mark.django_db
+def testIngestChangesIntervals(intervalMode):
+    """
+    Test that delta polls record transitions as intervals.
+    """
+    ingestChanges([{**ROUTER, "status": True}], full=True)
+    ingestChanges([{"id": 1, "status": False}], full=False)
+    ingestChanges([], full=False)
+
+    assert DeviceStatus.objects.count() == 0
+    assert list(DeviceInterval.objects.order_by("start").values_list("status", flat=True)) == [True, False]
+
+
+@pytest.mark.django_db
+def testGetIntervalAvail():
+    """
+    Test that availability is the share of the window each device spent up.
+    """
+    now = timezone.now()
+    Device.objects.create(device_id=1, name="Router", ip_address="192.168.0.1", status=True, last_seen=now)
+    DeviceInterval.objects.create(device_id=1, status=True, start=now - timedelta(hours=4), end=now - timedelta(hours=1))
+    DeviceInterval.objects.create(device_id=1, status=False, start=now - timedelta(hours=1), end=now - timedelta(minutes=30))
+    DeviceInterval.objects.create(device_id=1, status=True, start=now - timedelta(minutes=30), end=None)
+
+    df = getIntervalAvail(now - timedelta(hours=2), now)
+
+    row = df.iloc[0]
+    assert row["DEVICE_NAME"] == "Router"
+    assert row["TOTAL_SECONDS"] == pytest.approx(7200)
+    assert row["UP_SECONDS"] == pytest.approx(5400) # 1h before the outage and 30m after.
+    assert row["AVAILABILITY"] == pytest.approx(75)
+
+
+@pytest.mark.django_db
+def testGetIntervalAvailAlwaysDown():
+    """
+    Test that a device which was never up in the window has 0% availability.
+    """
+    now = timezone.now()
+    Device.objects.create(device_id=1, name="Router", ip_address="192.168.0.1", status=False, last_seen=now)
+    DeviceInterval.objects.create(device_id=1, status=False, start=now - timedelta(hours=1))
+
+    assert getIntervalAvail(now - timedelta(minutes=10), now).iloc[0]["AVAILABILITY"] == 0
+
+
+@pytest.mark.django_db
+def testGetIntervalAvailEmpty():
+    """
+    Test that a window without intervals returns an empty DataFrame.
+    """
+    assert getIntervalAvail(timezone.now() - timedelta(hours=1)).empty
+
+
+@pytest.mark.django_db
+def testBuildIntervals():
+    """
+    Test that existing samples are converted into intervals.
+    """
+    for status in (True, True, False, True):
+        ingestDevices([{**ROUTER, "status": status}])
+
+    call_command("build_intervals", "--batch-size", "2", "--delete-samples")
+
+    intervals = list(DeviceInterval.objects.order_by("start").values_list("status", "end"))
+    assert [status for status, _ in intervals] == [True, False, True]
+    assert intervals[-1][1] is None
+    assert DeviceStatus.objects.count() == 0
+
+
+@pytest.mark.django_db
+def testBuildIntervalsBatches():
+    """
+    Test that devices converted in separate batches each get their own intervals.
+    """
+    for status in (True, False):
+        ingestDevices([{**ROUTER, "status": status}, {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True}])
+
+    call_command("build_intervals", "--batch-size", "1")
+
+    assert list(DeviceInterval.objects.order_by("device_id", "start").values_list("device_id", "status")) == [
+        (1, True), (1, False), (2, True)
+    ]
+
+
+@pytest.mark.django_db
+def testBuildIntervalsParquet(settings, tmp_path, monkeypatch, django_capture_on_commit_callbacks):
+    """
+    Test that samples are read through the configured SampleStore, not only DeviceStatus.
+    """
+    pytest.importorskip("pyarrow")
+    settings.TIMESERIES_BACKEND = "healthstatus.storage.ParquetSampleStore"
+    settings.TIMESERIES_OPTIONS = {"root": str(tmp_path / "samples")}
+    monkeypatch.setattr(storage, "_store", None)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        for status in (True, False, True):
+            ingestDevices([{**ROUTER, "status": status}])
+
+    call_command("build_intervals")
+
+    assert DeviceStatus.objects.count() == 0
+    assert list(DeviceInterval.objects.order_by("start").values_list("status", flat=True)) == [True, False, True]
+
+
+@pytest.mark.django_db
+def testBuildIntervalsExisting():
+    """
+    Test that existing intervals are only rebuilt when asked.
+    """
+    ingestDevices([{**ROUTER, "status": True}])
+    DeviceInterval.objects.create(device_id=1, status=True, start=timezone.now())
+
+    with pytest.raises(CommandError):
+        call_command("build_intervals")
+
+    call_command("build_intervals", "--replace")
+    assert DeviceInterval.objects.count() == 1
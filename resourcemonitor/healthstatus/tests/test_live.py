@@ -0,0 +1,155 @@
+"""
+This file is a test suite for the live device status stream.
+"""
+import asyncio
+import json
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient, Client
+from healthstatus import live, views
+from healthstatus.utils import ingestDevices
+
+
+def poll(*down):
+    """
+    Ingest a poll of three devices, with the given device ids down.
+    """
+    ingestDevices([
+        {"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": i not in down}
+        for i in (1, 2, 3)
+    ])
+
+
+def parse(chunks):
+    """
+    Split streamed Server-Sent Events into (event, data) pairs, skipping comments.
+    """
+    events = []
+    for message in b"".join(chunks).decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def broadcaster(monkeypatch):
+    """
+    A fresh broadcaster checking for new polls every 10 milliseconds.
+    """
+    instance = live.StatusBroadcaster(interval=0.01)
+    monkeypatch.setattr(live, "_broadcaster", instance)
+    return instance
+
+
+@pytest.mark.django_db
+def testBroadcastsChangedDevices(broadcaster):
+    """
+    Test that subscribers start from a snapshot and are then sent only the devices which changed.
+    """
+    poll()
+
+    async def run():
+        first, snapshot = await broadcaster.subscribe()
+        second, _ = await broadcaster.subscribe()
+        await sync_to_async(poll)(2)
+        messages = [await asyncio.wait_for(q.get(), 1) for q in (first, second)]
+
+        await sync_to_async(poll)(2) # Same statuses, nothing to send.
+        await asyncio.sleep(0.05)
+        idle = first.empty()
+
+        broadcaster.unsubscribe(first)
+        broadcaster.unsubscribe(second)
+        await asyncio.sleep(0.05) # Let the broadcaster stop.
+        return snapshot, messages, idle
+
+    snapshot, messages, idle = async_to_sync(run)()
+
+    assert [d["status"] for d in snapshot] == [True, True, True]
+    assert messages == [("changes", [{"id": 2, "name": "Router_2", "ip_address": "192.168.0.2", "status": False}])] * 2
+    assert idle
+    assert len(broadcaster) == 0
+
+
+@pytest.mark.django_db
+def testSlowSubscriberIsResynced(broadcaster):
+    """
+    Test that a subscriber whose queue is full is sent a fresh snapshot instead of its backlog.
+    """
+    poll()
+    broadcaster.queueSize = 1
+
+    async def run():
+        queue, _ = await broadcaster.subscribe()
+        await sync_to_async(poll)(1)
+        await broadcaster.refresh()
+        await sync_to_async(poll)(1, 3)
+        await broadcaster.refresh()
+        message = queue.get_nowait()
+        broadcaster.unsubscribe(queue)
+        await asyncio.sleep(0.05)
+        return message, queue.empty()
+
+    (event, devices), empty = async_to_sync(run)()
+
+    assert event == "snapshot"
+    assert [d["status"] for d in devices] == [False, True, False]
+    assert empty
+
+
+@pytest.mark.django_db
+def testLiveDevicesStream(broadcaster, settings):
+    """
+    Test that the stream sends a snapshot, then changes, and ends after its lifetime.
+    """
+    settings.LIVE_STREAM_LIFETIME = 0.3
+    poll()
+
+    async def run():
+        response = await AsyncClient().get("/devices/live")
+        chunks = []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk)
+            if len(chunks) == 1:
+                await sync_to_async(poll)(3)
+        await asyncio.sleep(0.05)
+        return response, chunks
+
+    response, chunks = async_to_sync(run)()
+
+    assert response["Content-Type"] == "text/event-stream"
+    assert response["Cache-Control"] == "no-cache"
+    assert parse(chunks) == [
+        ("snapshot", [{"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": True} for i in (1, 2, 3)]),
+        ("changes", [{"id": 3, "name": "Router_3", "ip_address": "192.168.0.3", "status": False}]),
+    ]
+    assert len(broadcaster) == 0 # Unsubscribed when the stream ended.
+
+
+def testResentSnapshotIsSelected(broadcaster, settings):
+    """
+    Test that a snapshot resent to a subscriber which fell behind keeps the stream's filter and order.
+    """
+    settings.LIVE_STREAM_LIFETIME = 0.3
+    devices = [{"id": i, "name": f"Router_{4 - i}", "ip_address": f"192.168.0.{i}", "status": i != 2} for i in (1, 2, 3)]
+
+    async def run():
+        queue = asyncio.Queue()
+        queue.put_nowait(("snapshot", devices))
+        return [chunk async for chunk in views.streamEvents(broadcaster, queue, devices, "up", "name")]
+
+    events = parse([chunk.encode() for chunk in async_to_sync(run)()])
+
+    assert [[d["id"] for d in devices] for _, devices in events] == [[3, 1], [3, 1]] # Up devices, by name.
+
+
+@pytest.mark.django_db
+def testLiveDevicesNeedsAsgi():
+    """
+    Test that WSGI requests are refused, rather than holding a worker per client.
+    """
+    response = Client().get("/devices/live")
+
+    assert response.status_code == 501
+    assert "error" in response.json()
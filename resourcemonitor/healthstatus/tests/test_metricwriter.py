@@ -0,0 +1,101 @@
+"""
+This file is a test suite for the buffered SystemMetric writer.
+"""
+import pytest
+import time
+from datetime import timedelta
+from django.utils import timezone
+from healthstatus.metricwriter import MetricWriter
+from healthstatus.models import SystemMetric
+from healthstatus.utils import generateLog
+
+
+def log(endpoint, timestamp=None):
+    """
+    Build an unsaved SystemMetric.
+    """
+    return SystemMetric(endpoint=endpoint, status_code=200, success=True, timestamp=timestamp or timezone.now())
+
+
+@pytest.mark.django_db
+def testFlushWritesBatches():
+    """
+    Test that flush writes every buffered log, keeping the time each was logged.
+    """
+    logged = timezone.now() - timedelta(minutes=5)
+    writer = MetricWriter(batchSize=2, background=False)
+    for i in range(5):
+        writer.write(log(f"/{i}", logged))
+
+    assert SystemMetric.objects.count() == 0
+    assert writer.flush() == 5
+    assert len(writer) == 0
+    assert set(SystemMetric.objects.values_list("timestamp", flat=True)) == {logged}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("policy, kept", [("newest", ["/0", "/1"]), ("oldest", ["/1", "/2"])])
+def testDropPolicy(policy, kept):
+    """
+    Test that a full buffer drops logs by its policy, and never grows past maxSize.
+    """
+    writer = MetricWriter(maxSize=2, policy=policy, background=False)
+    accepted = [writer.write(log(f"/{i}")) for i in range(3)]
+
+    writer.flush()
+
+    assert accepted == [True, True, policy == "oldest"]
+    assert writer.dropped == 1
+    assert sorted(SystemMetric.objects.values_list("endpoint", flat=True)) == kept
+
+
+def testInvalidPolicy():
+    """
+    Test that unknown drop policies are rejected.
+    """
+    with pytest.raises(ValueError):
+        MetricWriter(policy="random")
+
+
+@pytest.mark.django_db(transaction=True)
+def testBackgroundFlush():
+    """
+    Test that the background thread writes logs after the flush interval, and close writes the rest.
+    """
+    writer = MetricWriter(flushInterval=0.05)
+    writer.write(log("/devices"))
+
+    deadline = time.monotonic() + 5
+    while SystemMetric.objects.count() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert SystemMetric.objects.count() == 1
+
+    writer.write(log("/index"))
+    writer.close()
+    assert SystemMetric.objects.count() == 2
+
+
+@pytest.mark.django_db
+def testWriteAfterClose():
+    """
+    Test that logs written after close are dropped, rather than left in a buffer nothing flushes.
+    """
+    writer = MetricWriter(background=False)
+    writer.close()
+
+    assert writer.write(log("/devices")) is False
+    assert (len(writer), writer.dropped) == (0, 1)
+    assert writer.flush() == 0
+    assert SystemMetric.objects.count() == 0
+
+
+@pytest.mark.django_db
+def testGenerateLogBuffered(metricWriter):
+    """
+    Test that generateLog buffers logs instead of writing during the request.
+    """
+    generateLog("/devices", 200, True)
+
+    assert SystemMetric.objects.count() == 0
+    metricWriter.flush()
+    assert SystemMetric.objects.get().endpoint == "/devices"
@@ -0,0 +1,74 @@
+"""
+This file is a test suite for the request metrics middleware.
+"""
+import pytest
+from django.http import HttpResponse
+from django.test import Client
+from healthstatus.middleware import LatencyHistogram, LATENCY_BUCKETS
+from healthstatus.models import RequestLatency, SystemMetric
+
+
+@pytest.mark.django_db
+def testRequestsAreLogged(mocker, syncMetrics):
+    """
+    Test that every request is logged with the route it matched and the status it returned.
+    """
+    mocker.patch("healthstatus.views.render", return_value=HttpResponse("ok"))
+    mocker.patch("healthstatus.client.requests.Session.get", side_effect=Exception("Failed To Fetch Devices"))
+    client = Client()
+
+    client.get("/")
+    client.get("/devices")
+    client.get("/missing")
+
+    assert list(SystemMetric.objects.order_by("id").values_list("endpoint", "status_code", "success")) == [
+        ("/", 200, True),
+        ("/devices", 500, False),
+        ("unmatched", 404, False),
+    ]
+
+
+@pytest.mark.django_db
+def testLatencyFlush(latencyRecorder, syncMetrics):
+    """
+    Test that histograms are written per endpoint when the recorder flushes.
+    """
+    for latency in (3, 3, 40, 400):
+        latencyRecorder.record("/devices", latency, 200, 100)
+    latencyRecorder.record("/", 1, 500, 10)
+
+    assert latencyRecorder.flush() == 2
+    devices = RequestLatency.objects.get(endpoint="/devices")
+
+    assert (devices.requests, devices.errors, devices.bytes, devices.max) == (4, 0, 400, 400)
+    assert sum(devices.counts) == 4 and len(devices.counts) == len(LATENCY_BUCKETS) + 1
+    assert RequestLatency.objects.get(endpoint="/").errors == 1
+    assert latencyRecorder.flush() == 0 # Each period is only written once.
+
+
+@pytest.mark.django_db
+def testLatencyFlushAfterInterval(latencyRecorder, syncMetrics):
+    """
+    Test that the first request after the flush interval writes the period.
+    """
+    latencyRecorder.flushInterval = 0
+    latencyRecorder.flush()
+
+    Client().get("/missing")
+
+    assert RequestLatency.objects.get().endpoint == "unmatched"
+
+
+def testHistogramPercentiles():
+    """
+    Test that percentiles fall within the bucket holding them, and never exceed the slowest request.
+    """
+    histogram = LatencyHistogram()
+    for latency in [3] * 90 + [150] * 9 + [700]:
+        histogram.add(latency, 200, 0)
+
+    assert 2 <= histogram.percentile(0.5) <= 5
+    assert 100 <= histogram.percentile(0.95) <= 200
+    assert histogram.percentile(0.99) <= 700
+    assert histogram.percentile(1.0) == 700
+    assert LatencyHistogram().percentile(0.5) == 0
@@ -0,0 +1,150 @@
+"""
+This file is a test suite for the concurrent per-device poller in the healthstatus app.
+"""
+import json
+import pytest
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from healthstatus.client import CircuitBreaker, CircuitOpenError, DeviceApiClient
+from healthstatus.models import Device, DeviceStatus
+from healthstatus.poller import pollFleet, pollDevicesConcurrently
+from healthstatus.utils import ingestDevices
+
+
+@pytest.fixture
+def fakeApi():
+    """
+    Serve fake per-device endpoints on localhost.
+    Device 3 is missing (404), device 4 never answers within the timeout and devices above 100 answer 503.
+    Yields the URL of /devices and the peak number of requests in flight.
+    """
+    state = {"inFlight": 0, "peak": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep connections alive.
+
+        def do_GET(self):
+            deviceId = int(self.path.rsplit("/", 1)[1])
+            with lock:
+                state["inFlight"] += 1
+                state["peak"] = max(state["peak"], state["inFlight"])
+            try:
+                time.sleep(1 if deviceId == 4 else 0.01)
+                status = 404 if deviceId == 3 else 503 if deviceId > 100 else 200
+                body = json.dumps(
+                    {"id": deviceId, "name": f"Router_{deviceId}", "ip_address": f"192.168.0.{deviceId}", "status": True}
+                ).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError): # The client gave up on device 4.
+                pass
+            finally:
+                with lock:
+                    state["inFlight"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/devices", state
+    server.shutdown()
+    server.server_close()
+
+
+def testPollFleet(fakeApi):
+    """
+    Test that reachable devices are returned and unreachable ones are reported.
+    """
+    url, _ = fakeApi
+    devices, failed = pollFleet(DeviceApiClient(url, retries=0), range(6), concurrency=10, timeout=0.5)
+
+    assert sorted(d["id"] for d in devices) == [0, 1, 2, 5]
+    assert sorted(failed) == [3, 4]
+
+
+def testPollFleetConcurrencyLimit(fakeApi):
+    """
+    Test that no more than the concurrency limit, or the clients pool size, of requests are in flight.
+    """
+    url, state = fakeApi
+    ids = [i for i in range(40) if i not in (3, 4)]
+    devices, failed = pollFleet(DeviceApiClient(url, poolSize=10, retries=0), ids, concurrency=5, timeout=0.5)
+
+    assert len(devices) == 38
+    assert failed == []
+    assert state["peak"] <= 5
+
+    state["peak"] = 0
+    pollFleet(DeviceApiClient(url, poolSize=3, retries=0), ids, concurrency=5, timeout=0.5)
+    assert state["peak"] <= 3
+
+
+def testPollFleetCircuitBreaker(fakeApi):
+    """
+    Test that per-device requests count towards the clients circuit breaker,
+    and a poll stopped by the open breaker raises instead of reporting every device as unreachable.
+    """
+    url, _ = fakeApi
+    client = DeviceApiClient(url, retries=0, breaker=CircuitBreaker(threshold=3, resetTimeout=60))
+
+    with pytest.raises(CircuitOpenError):
+        pollFleet(client, range(101, 121), concurrency=1, timeout=0.5)
+    assert client.breaker.state == "open"
+
+
+@pytest.mark.django_db
+def testPollDevicesConcurrently(mocker):
+    """
+    Test that unreachable devices are stored as down using the known inventory.
+    """
+    ingestDevices([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True},
+    ])
+
+    def fakeFleet(client, deviceIds, concurrency, timeout):
+        return [{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}], [2]
+    mocker.patch("healthstatus.poller.pollFleet", side_effect=fakeFleet)
+
+    stored = pollDevicesConcurrently()
+
+    assert stored == 2
+    assert Device.objects.get(device_id=2).status is False
+    assert DeviceStatus.objects.count() == 3 # Only device 2 changed status.
+
+
+@pytest.mark.django_db
+def testPollDevicesConcurrentlyCircuitOpen(mocker, fakeApi):
+    """
+    Test that a poll stopped by the shared clients circuit breaker stores nothing.
+    """
+    ingestDevices([
+        {"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": True} for i in range(101, 111)
+    ])
+    url, _ = fakeApi
+    client = DeviceApiClient(url, retries=0, breaker=CircuitBreaker(threshold=3, resetTimeout=60))
+    mocker.patch("healthstatus.poller.getDeviceClient", return_value=client)
+
+    with pytest.raises(CircuitOpenError):
+        pollDevicesConcurrently(concurrency=1)
+    assert not Device.objects.filter(status=False).exists()
+    assert DeviceStatus.objects.count() == 10
+
+
+@pytest.mark.django_db
+def testPollDevicesConcurrentlyDiscovery(mocker):
+    """
+    Test that an empty inventory is discovered with a single fleet poll.
+    """
+    mockPoll = mocker.patch("healthstatus.poller.pollDevices", return_value=0)
+
+    pollDevicesConcurrently()
+
+    mockPoll.assert_called_once()
@@ -0,0 +1,71 @@
+"""
+This file is a query plan regression suite for the healthstatus dashboards.
+Every query the metrics dashboard API runs for a time window is explained,
+and the test fails if any of them reads a whole table.
+"""
+import pytest
+import re
+from datetime import timedelta
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from healthstatus.models import DeviceHourlyAvailability, SystemMetric
+from healthstatus.utils import ingestDevices, WINDOWS
+
+FULL_SCAN = re.compile(r"\bSCAN (healthstatus_\w+)") # Index searches are reported as SEARCH.
+FIXED_SIZE = {"healthstatus_dataversion"} # One row per dataset, scanning is as cheap as an index.
+
+pytestmark = pytest.mark.skipif(connection.vendor != "sqlite", reason="Plans are parsed from SQLite output.")
+
+
+def explain(sql):
+    """
+    Get the SQLite query plan of an executed statement.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return "\n".join(row[-1] for row in cursor.fetchall())
+
+
+@pytest.fixture
+def history():
+    """
+    Seed enough history that the planner has a real choice to make.
+    """
+    now = timezone.now()
+    devices = [{"id": i, "name": f"Router_{i}", "ip_address": "192.168.0.1", "status": i % 2 == 0} for i in range(20)]
+    ingestDevices(devices)
+    DeviceHourlyAvailability.objects.bulk_create([
+        DeviceHourlyAvailability(device_id=i, hour=now - timedelta(hours=h + 1), total_attempts=1)
+        for i in range(20) for h in range(48)
+    ])
+    SystemMetric.objects.bulk_create([
+        SystemMetric(endpoint="/devices", status_code=200, success=True) for _ in range(100)
+    ])
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE") # Give the planner statistics, as a long running database would have.
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("window", list(WINDOWS))
+@pytest.mark.parametrize("url, params", [
+    ("/api/metrics/availability", {}),
+    ("/api/metrics/availability", {"device": "1,2", "page": 2, "page_size": 1}),
+    ("/api/metrics/timeline", {}),
+])
+def testDashboardAvoidsFullScans(history, window, url, params):
+    """
+    Test that the dashboard data is read from each table through an index.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        response = Client().get(url, {"window": window, **params})
+
+    assert response.status_code == 200
+    selects = [q["sql"] for q in queries.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+    assert selects
+
+    for sql in selects:
+        plan = explain(sql)
+        scanned = set(FULL_SCAN.findall(plan)) - FIXED_SIZE
+        assert not scanned, f"Full table scan in:\n{sql}\n{plan}"
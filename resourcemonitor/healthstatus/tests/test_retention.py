@@ -0,0 +1,103 @@
+"""
+This file is a test suite for the retention policy in the healthstatus app.
+"""
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from healthstatus.models import (
+    Device, DeviceHourlyAvailability, DeviceInterval, DeviceStatus, SystemMetric, SystemMetricRollup
+)
+from healthstatus.retention import applyRetention, HOUR, MINUTE
+from healthstatus.utils import ingestDevices
+
+
+def logAt(endpoint, success, timestamp):
+    """
+    Create a SystemMetric row with a given timestamp.
+    """
+    SystemMetric.objects.create(
+        endpoint=endpoint, status_code=200 if success else 500, success=success, timestamp=timestamp
+    )
+
+
+@pytest.mark.django_db
+def testDownsampleMetrics():
+    """
+    Test that old request logs become 1 minute rollups, across several batches.
+    """
+    now = timezone.now().replace(second=30, microsecond=0)
+    old = now - timedelta(days=2)
+    for i in range(5):
+        logAt("/devices", i != 0, old)
+    logAt("/devices", True, old + timedelta(minutes=1))
+    logAt("/devices", True, now) # Still raw.
+
+    results = applyRetention(now=now, batchSize=2)
+    rollups = list(SystemMetricRollup.objects.order_by("bucket").values_list(
+        "resolution", "bucket", "total_requests", "successful_requests"
+    ))
+
+    assert results["metrics_downsampled"] == 6
+    assert SystemMetric.objects.count() == 1
+    assert rollups == [
+        (MINUTE, old.replace(second=0), 5, 4),
+        (MINUTE, old.replace(second=0) + timedelta(minutes=1), 1, 1),
+    ]
+
+
+@pytest.mark.django_db
+def testDownsampleRollups():
+    """
+    Test that old minute rollups are merged into hourly rollups.
+    """
+    now = timezone.now()
+    hour = (now - timedelta(days=40)).replace(minute=0, second=0, microsecond=0)
+    for minute in range(3):
+        SystemMetricRollup.objects.create(
+            endpoint="/", resolution=MINUTE, bucket=hour + timedelta(minutes=minute),
+            total_requests=10, successful_requests=9,
+        )
+    SystemMetricRollup.objects.create(endpoint="/", resolution=MINUTE, bucket=now, total_requests=1)
+
+    applyRetention(now=now)
+    hourly = SystemMetricRollup.objects.get(resolution=HOUR)
+
+    assert (hourly.bucket, hourly.total_requests, hourly.successful_requests) == (hour, 30, 27)
+    assert SystemMetricRollup.objects.filter(resolution=MINUTE).count() == 1
+
+
+@pytest.mark.django_db
+def testDeviceHistoryRetention(settings):
+    """
+    Test that old samples and intervals are deleted while the hourly counts are kept.
+    """
+    settings.HISTORY_RETENTION = {"HOURLY": timedelta(days=365)}
+    now = timezone.now()
+    ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}])
+    DeviceStatus.objects.update(timestamp=now - timedelta(days=2))
+    DeviceInterval.objects.create(device_id=1, status=True, start=now - timedelta(days=100), end=now - timedelta(days=95))
+    DeviceInterval.objects.create(device_id=1, status=False, start=now - timedelta(days=95))
+    DeviceHourlyAvailability.objects.create(device_id=1, hour=now - timedelta(days=400), total_attempts=1)
+
+    results = applyRetention(now=now)
+
+    assert results["device_samples_deleted"] == 1
+    assert results["intervals_deleted"] == 1
+    assert results["hourly_deleted"] == 1
+    assert DeviceInterval.objects.get().end is None # Open intervals are kept.
+    assert DeviceHourlyAvailability.objects.count() == 1
+    assert Device.objects.get().total_attempts == 1
+
+
+@pytest.mark.django_db
+def testApplyRetentionCommand():
+    """
+    Test that the management command applies the policy.
+    """
+    logAt("/", True, timezone.now() - timedelta(days=2))
+
+    call_command("apply_retention")
+
+    assert SystemMetric.objects.count() == 0
+    assert SystemMetricRollup.objects.get().total_requests == 1
@@ -0,0 +1,242 @@
+"""
+This file is a test suite shared by every SampleStore and MetricStore backend.
+Each test runs once per backend, and every backend must give the same answers.
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from django.db import transaction
+from healthstatus import storage
+from healthstatus.models import DeviceStatus, SystemMetric, SystemMetricRollup
+from healthstatus.storage import AVAILABILITY_COLUMNS, REQUEST_COUNT_COLUMNS, SAMPLE_COLUMNS, OrmMetricStore, OrmSampleStore, getMetricStore, getSampleStore
+from healthstatus.utils import ingestDevices, saveLog
+
+DAY = datetime(2026, 1, 10, tzinfo=timezone.utc)
+
+
+@pytest.fixture(params=["orm", "parquet"])
+def store(request, tmp_path):
+    """
+    An empty store of each backend.
+    Parquet tests run outside a test transaction, so writes are not held back until it commits.
+    """
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+        return storage.ParquetSampleStore(tmp_path / "samples")
+    request.getfixturevalue("db")
+    return OrmSampleStore()
+
+
+@pytest.fixture(params=["orm", "parquet"])
+def metricStore(request, tmp_path):
+    """
+    An empty request log store of each backend.
+    Both backends roll up into the database, so tests using it are marked django_db(transaction=True).
+    """
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+        return storage.ParquetMetricStore(tmp_path / "metrics")
+    return OrmMetricStore()
+
+
+def poll(store, when, *down, devices=(1, 2, 3)):
+    """
+    Write a poll of devices at a time, with the given device ids down.
+    """
+    return store.writeSamples(
+        [{"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": i not in down} for i in devices],
+        when,
+    )
+
+
+def testQueryRange(store):
+    """
+    Test that samples are read back in time then device order, with the range end excluded.
+    """
+    assert poll(store, DAY + timedelta(hours=1), 2) == 3
+    poll(store, DAY, 1)
+    poll(store, DAY + timedelta(hours=2))
+
+    df = store.queryRange(DAY, DAY + timedelta(hours=2))
+
+    assert list(df.columns) == SAMPLE_COLUMNS
+    assert [(t.hour, i, s) for t, i, s in zip(df["timestamp"], df["device_id"], df["status"])] == [
+        (0, 1, False), (0, 2, True), (0, 3, True), (1, 1, True), (1, 2, False), (1, 3, True),
+    ]
+    assert str(df["timestamp"].dt.tz) == "UTC"
+    assert df.iloc[0][["name", "ip_address"]].tolist() == ["Router_1", "192.168.0.1"]
+
+
+def testQueryRangeAcrossDays(store):
+    """
+    Test that ranges spanning days, and device filters, are applied.
+    """
+    for day in range(3):
+        poll(store, DAY + timedelta(days=day, hours=23))
+
+    df = store.queryRange(DAY + timedelta(hours=12), DAY + timedelta(days=2), deviceIds=[2, 3])
+
+    assert [(t.day, i) for t, i in zip(df["timestamp"], df["device_id"])] == [(10, 2), (10, 3), (11, 2), (11, 3)]
+    assert store.queryRange(DAY - timedelta(days=5), DAY).empty
+
+
+def testQueryRangePages(store):
+    """
+    Test that pages of a range are read in order across days, and counted without reading them.
+    """
+    for day in range(3):
+        poll(store, DAY + timedelta(days=day, hours=23))
+    end = DAY + timedelta(days=3)
+
+    pages = [store.queryRange(DAY, end, limit=2, offset=offset) for offset in range(0, 10, 2)]
+
+    assert [[(t.day, i) for t, i in zip(p["timestamp"], p["device_id"])] for p in pages] == [
+        [(10, 1), (10, 2)], [(10, 3), (11, 1)], [(11, 2), (11, 3)], [(12, 1), (12, 2)], [(12, 3)],
+    ]
+    assert store.queryRange(DAY, end, limit=2, offset=9).empty
+    assert store.queryRange(DAY, end, deviceIds=[2], offset=1)["timestamp"].dt.day.tolist() == [11, 12]
+    assert (store.countRange(DAY, end), store.countRange(DAY, end, deviceIds=[2, 3]), store.countRange(end, end + timedelta(days=1))) == (9, 6, 0)
+
+
+def testAvailability(store):
+    """
+    Test availability per device, best performing first.
+    """
+    poll(store, DAY, 2, 3)
+    poll(store, DAY + timedelta(minutes=5), 3)
+    poll(store, DAY + timedelta(minutes=10), 3, devices=(3, 4))
+    poll(store, DAY + timedelta(days=1), 1) # Outside the range.
+
+    df = store.availability(DAY, DAY + timedelta(hours=1))
+
+    assert list(df.columns) == AVAILABILITY_COLUMNS
+    assert df.values.tolist() == [
+        [1, "Router_1", 2, 2, 100.0],
+        [4, "Router_4", 1, 1, 100.0],
+        [2, "Router_2", 1, 2, 50.0],
+        [3, "Router_3", 0, 3, 0.0],
+    ]
+    assert store.availability(DAY, DAY + timedelta(hours=1), deviceIds=[3])["device_id"].tolist() == [3]
+    assert store.availability(DAY - timedelta(days=1), DAY).empty
+
+
+def testPrune(store):
+    """
+    Test that samples from before a day are deleted and later samples kept.
+    """
+    for day in range(3):
+        poll(store, DAY + timedelta(days=day))
+        poll(store, DAY + timedelta(days=day, hours=6))
+
+    assert store.prune(DAY + timedelta(days=2)) == 12
+    assert store.prune(DAY + timedelta(days=2)) == 0
+
+    remaining = store.queryRange(DAY, DAY + timedelta(days=3))
+    assert len(remaining) == 6
+    assert {t.day for t in remaining["timestamp"]} == {12}
+
+
+@pytest.mark.django_db
+def testIngestWritesToConfiguredStore(settings, tmp_path, monkeypatch, django_capture_on_commit_callbacks):
+    """
+    Test that polls are written to the backend chosen in settings instead of DeviceStatus.
+    """
+    pytest.importorskip("pyarrow")
+    settings.TIMESERIES_BACKEND = "healthstatus.storage.ParquetSampleStore"
+    settings.TIMESERIES_OPTIONS = {"root": str(tmp_path / "samples")}
+    monkeypatch.setattr(storage, "_store", None)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ingestDevices([{"id": 1, "name": "Router_1", "ip_address": "192.168.0.1", "status": True}])
+
+    assert isinstance(getSampleStore(), storage.ParquetSampleStore)
+    assert DeviceStatus.objects.count() == 0
+    now = datetime.now(timezone.utc)
+    assert getSampleStore().queryRange(now - timedelta(minutes=1), now + timedelta(minutes=1))["device_id"].tolist() == [1]
+
+
+@pytest.mark.django_db
+def testParquetWritesAfterCommit(tmp_path, django_capture_on_commit_callbacks):
+    """
+    Test that Parquet samples written in a transaction are only kept once it commits.
+    """
+    pytest.importorskip("pyarrow")
+    store = storage.ParquetSampleStore(tmp_path / "samples")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                poll(store, DAY)
+                raise RuntimeError("Rolled back")
+        with transaction.atomic():
+            poll(store, DAY, devices=(4,))
+            assert store.queryRange(DAY, DAY + timedelta(hours=1)).empty # Not until the commit.
+
+    assert store.queryRange(DAY, DAY + timedelta(hours=1))["device_id"].tolist() == [4]
+
+
+def log(store, when, endpoint="/", success=True):
+    """
+    Write a request log at a time.
+    """
+    return store.writeMetrics([SystemMetric(endpoint=endpoint, status_code=200 if success else 500, success=success, timestamp=when)])
+
+
+@pytest.mark.django_db(transaction=True)
+def testCountRequests(metricStore):
+    """
+    Test that requests are counted per endpoint per slot, with the range end excluded.
+    """
+    log(metricStore, DAY + timedelta(seconds=10))
+    log(metricStore, DAY + timedelta(seconds=50), success=False)
+    log(metricStore, DAY + timedelta(minutes=1))
+    log(metricStore, DAY + timedelta(minutes=1), endpoint="/dashboard")
+    log(metricStore, DAY + timedelta(hours=1)) # Outside the range.
+
+    df = metricStore.countRequests(DAY, DAY + timedelta(hours=1), 60)
+
+    assert list(df.columns) == REQUEST_COUNT_COLUMNS
+    assert sorted((e, s.minute, r, ok) for e, s, r, ok in df.itertuples(index=False)) == [
+        ("/", 0, 2, 1), ("/", 1, 1, 1), ("/dashboard", 1, 1, 1),
+    ]
+    assert str(df["slot"].dt.tz) == "UTC"
+    days = metricStore.countRequests(DAY, DAY + timedelta(days=1), 86400)
+    assert sorted(zip(days["endpoint"], days["requests"], days["successful"])) == [("/", 4, 3), ("/dashboard", 1, 1)]
+    assert metricStore.countRequests(DAY - timedelta(days=1), DAY, 3600).empty
+    with pytest.raises(ValueError):
+        metricStore.countRequests(DAY, DAY + timedelta(hours=1), 300)
+
+
+@pytest.mark.django_db(transaction=True)
+def testDownsample(metricStore):
+    """
+    Test that expired logs are moved into minute rollups, and later logs kept raw.
+    """
+    log(metricStore, DAY + timedelta(seconds=10))
+    log(metricStore, DAY + timedelta(seconds=20), success=False)
+    log(metricStore, DAY + timedelta(days=2))
+
+    assert metricStore.downsample(DAY + timedelta(days=1)) == 2
+    assert metricStore.downsample(DAY + timedelta(days=1)) == 0
+
+    assert list(SystemMetricRollup.objects.values_list("endpoint", "resolution", "bucket", "total_requests", "successful_requests")) == [
+        ("/", 60, DAY, 2, 1),
+    ]
+    assert metricStore.countRequests(DAY, DAY + timedelta(days=3), 86400)["requests"].tolist() == [1]
+
+
+@pytest.mark.django_db(transaction=True)
+def testLogsWriteToConfiguredStore(settings, tmp_path, monkeypatch):
+    """
+    Test that request logs are written to the backend chosen in settings instead of SystemMetric.
+    """
+    pytest.importorskip("pyarrow")
+    settings.TIMESERIES_METRIC_BACKEND = "healthstatus.storage.ParquetMetricStore"
+    settings.TIMESERIES_METRIC_OPTIONS = {"root": str(tmp_path / "metrics")}
+    monkeypatch.setattr(storage, "_metricStore", None)
+
+    saveLog("/", 200, True)
+
+    assert isinstance(getMetricStore(), storage.ParquetMetricStore)
+    assert SystemMetric.objects.count() == 0
+    now = datetime.now(timezone.utc)
+    assert getMetricStore().countRequests(now - timedelta(days=1), now + timedelta(days=1), 86400)["requests"].tolist() == [1]
@@ -2,13 +2,20 @@
 This file is a test suite for the utility functions in the healthstatus app.
 """
 import pytest
-from healthstatus.utils import generateLog, getDeviceAvail, getAvailTable
-from healthstatus.models import SystemMetric, DeviceStatus
+from healthstatus.utils import addSlo, availabilityQuery, generateLog, ingestDevices, ingestChanges, getWindowStart, getMetricTimeline, getTimelineBucket, sloQuery, SLO_COLUMNS, WINDOWS
+from healthstatus.models import SystemMetric, SystemMetricRollup, DeviceStatus, Device, DeviceHourlyAvailability
+from healthstatus.versions import bumpVersion, getVersions, DEVICES, METRICS
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import CommandError
 from unittest.mock import patch
+from datetime import timedelta
+from django.utils import timezone
 
 
 @pytest.mark.django_db
-def testGenerateLogSuccess():
+def testGenerateLogSuccess(syncMetrics):
     """
     Test that generateLog writes a log entry to the DB when successful.
     """
@@ -23,7 +30,7 @@ def testGenerateLogSuccess():
 
 
 @pytest.mark.django_db
-def testGenerateLogFailure():
+def testGenerateLogFailure(syncMetrics):
     """
     Test that generateLog writes a log entry to the DB when unsuccessful.
     """
@@ -36,74 +43,417 @@ def testGenerateLogFailure():
 
 
 @pytest.mark.django_db
-def testGenerateLogMultiCall():
+def testGenerateLogMultiCall(syncMetrics):
     """
     Test multiple calls create multiple records.
-    Uses mock db to reduce impact.
+    Uses a mock store to reduce impact.
     """
-    with patch("healthstatus.utils.SystemMetric.objects.create") as mockDB:
+    with patch("healthstatus.storage.OrmMetricStore.writeMetrics") as mockStore:
         generateLog("/devices", 200, True)
         generateLog("/metrics", 404, False)
 
-        mockDB.assert_any_call(endpoint="/devices", status_code=200, success=True)
-        mockDB.assert_any_call(endpoint="/metrics", status_code=404, success=False)
+        logs = [(m.endpoint, m.status_code, m.success) for call in mockStore.call_args_list for m in call.args[0]]
+        assert logs == [("/devices", 200, True), ("/metrics", 404, False)]
 
 
 @pytest.mark.django_db
-def testGetDeviceAvail():
+def testIngestDevices():
     """
-    Test getDeviceAvail when the database is not empty.
+    Test that ingestDevices stores one DeviceStatus row per device.
     """
+    devices = [
+        {"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": i % 2 == 0}
+        for i in range(10)
+    ]
 
-    DeviceStatus.objects.create(
-                device_id=100,
-                name='TestDevice1',
-                ip_address="192.168.1.1",
-                status=1,
-            )
+    written = ingestDevices(devices, batchSize=3)
 
-    df = getDeviceAvail()
+    assert written == 10
+    assert DeviceStatus.objects.count() == 10
+    assert DeviceStatus.objects.filter(status=True).count() == 5
 
-    assert not df.empty
-    assert (df.columns == ['DEVICE_NAME', 'SUCCESSFUL_ATTEMPTS', 'TOTAL_ATTEMPTS', 'AVAILABILITY']).all()
-    assert len(df) > 0
 
 @pytest.mark.django_db
-def testGetDeviceAvailEmpty():
+def testIngestDevicesBatchSize():
     """
-    Test getDeviceAvail when the database is empty.
+    Test that ingestDevices passes the configured batch size to bulk_create.
     """
-    with patch("healthstatus.models.DeviceStatus.objects.create") as mockDB:
-        df = getDeviceAvail()
+    with patch("healthstatus.utils.DeviceStatus.objects.bulk_create") as mockDB:
+        ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}], batchSize=250)
 
-        assert df.empty
+        args, kwargs = mockDB.call_args
+        assert len(args[0]) == 1
+        assert kwargs["batch_size"] == 250
 
 
 @pytest.mark.django_db
-def testGetAvailTable():
+def testIngestDevicesStream():
     """
-    Test getAvailTable when the database is not empty.
+    Test that ingestDevices consumes a generator one batch at a time.
     """
-    DeviceStatus.objects.create(
-        device_id=100,
-        name='TestDevice1',
-        ip_address="192.168.1.1",
-        status=1,
+    devices = (
+        {"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": True}
+        for i in range(7)
     )
 
-    df = getDeviceAvail()
-    df['AVAILABILITY'] = round(df['AVAILABILITY'], 1).astype(str) + '%'
-    df['DEVICE_NAME'] = "<strong>" + df['DEVICE_NAME'].astype(str) + "</strong>"
+    with patch("healthstatus.utils.DeviceStatus.objects.bulk_create") as mockDB:
+        assert ingestDevices(devices, batchSize=3) == 7
+        assert [len(call.args[0]) for call in mockDB.call_args_list] == [3, 3, 1]
 
-    expected: str = df.to_html(index=False, escape=False, classes="table table-striped table-sm", table_id="availTable")
-    actual: str = getAvailTable()
 
-    assert actual == expected
+@pytest.mark.django_db
+def testIngestDevicesAtomic():
+    """
+    Test that a malformed record rolls back its own batch, and only that batch.
+    """
+    devices = [
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True},
+        {"id": 3, "name": "Server", "ip_address": "192.168.0.3", "status": None}, # NOT NULL violation
+    ]
+
+    with pytest.raises(Exception):
+        ingestDevices(devices, batchSize=2)
+
+    assert list(DeviceStatus.objects.values_list("device_id", flat=True).order_by("device_id")) == [1, 2]
+    assert not Device.objects.filter(device_id=3).exists()
+
+
+@pytest.mark.django_db
+def testIngestDevicesReadsOutsideTransaction():
+    """
+    Test that the device stream is consumed outside of any transaction, so the write lock
+    is not held while the poll is read from the network.
+    """
+    depth = len(connection.atomic_blocks)
+
+    def devices():
+        for i in range(5):
+            assert len(connection.atomic_blocks) == depth
+            yield {"id": i, "name": f"Device {i}", "ip_address": f"10.0.0.{i}", "status": True}
+
+    assert ingestDevices(devices(), batchSize=2) == 5
+    assert DeviceStatus.objects.count() == 5
+
+
+@pytest.mark.django_db
+def testIngestDevicesRollups():
+    """
+    Test that each poll increments the per-device and hourly counters.
+    """
+    ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}])
+    ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": False}])
+    ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}])
+
+    device = Device.objects.get(device_id=1)
+    assert device.successful_attempts == 2
+    assert device.total_attempts == 3
+    assert device.status is True
+
+    hourly = DeviceHourlyAvailability.objects.get(device_id=1)
+    assert hourly.successful_attempts == 2
+    assert hourly.total_attempts == 3
+    assert hourly.hour.minute == 0
+
+
+@pytest.mark.django_db
+def testIngestDevicesStoresTransitions():
+    """
+    Test that a snapshot only stores new devices and status changes, like a delta poll.
+    """
+    devices = [
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True},
+    ]
+    ingestDevices(devices)
+    ingestDevices(devices)
+    ingestDevices([devices[0], {**devices[1], "status": False}])
+
+    assert list(DeviceStatus.objects.order_by("id").values_list("device_id", "status")) == [(1, True), (2, True), (2, False)]
+    assert Device.objects.get(device_id=1).total_attempts == 3
+
+
+@pytest.mark.django_db
+def testIngestChangesSnapshot():
+    """
+    Test that a full snapshot only stores devices whose status differs from the stored state.
+    """
+    ingestDevices([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True},
+    ])
+
+    stored = ingestChanges([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": False},
+        {"id": 3, "name": "Phone", "ip_address": "192.168.0.3", "status": True},
+    ], full=True)
+
+    assert stored == 2
+    assert DeviceStatus.objects.count() == 4
+    assert Device.objects.get(device_id=2).status is False
+    assert Device.objects.get(device_id=3).total_attempts == 1
+
+
+@pytest.mark.django_db
+def testIngestChangesCountsEveryDevice():
+    """
+    Test that unchanged devices are still counted by a delta poll.
+    """
+    ingestChanges([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True},
+    ], full=True)
+
+    assert ingestChanges([{"id": 2, "status": False}], full=False) == 1
+    assert ingestChanges([], full=False) == 0
+
+    router = Device.objects.get(device_id=1)
+    switch = Device.objects.get(device_id=2)
+    assert (router.successful_attempts, router.total_attempts) == (3, 3)
+    assert (switch.successful_attempts, switch.total_attempts) == (1, 3)
+
+    hourly = DeviceHourlyAvailability.objects.get(device_id=2)
+    assert (hourly.successful_attempts, hourly.total_attempts) == (1, 3)
+
+
+@pytest.mark.django_db
+def testIngestChangesSkipsRemovedDevices():
+    """
+    Test that a delta poll only counts the devices in the latest snapshot.
+    """
+    ingestChanges([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True},
+    ], full=True)
+    ingestChanges([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}], full=True)
+
+    ingestChanges([], full=False)
+
+    assert Device.objects.get(device_id=1).total_attempts == 3
+    assert Device.objects.get(device_id=2).total_attempts == 1
+
+
+@pytest.mark.django_db
+def testIngestChangesUnknownDevice():
+    """
+    Test that changes for devices never seen in a snapshot are ignored.
+    """
+    assert ingestChanges([{"id": 9, "status": False}], full=False) == 0
+    assert DeviceStatus.objects.count() == 0
+
+
+@pytest.mark.django_db
+def testAvailabilityQueryByDevice():
+    """
+    Test that availability is aggregated per device, even when devices share a name.
+    """
+    ingestDevices([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": False},
+        {"id": 3, "name": "Router", "ip_address": "192.168.0.3", "status": False},
+    ])
+    ingestDevices([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": False},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": False},
+        {"id": 3, "name": "Router", "ip_address": "192.168.0.3", "status": False},
+    ])
+
+    rows = list(availabilityQuery(timezone.now() - timedelta(hours=1)))
+
+    assert [(r["device_id"], r["name"], r["total_attempts"], r["availability"]) for r in rows] == [
+        (1, "Router", 2, 50.0), (2, "Switch", 2, 0.0), (3, "Router", 2, 0.0) # Best performing first
+    ]
+
+
+@pytest.mark.django_db
+def testAddSlo(settings):
+    """
+    Test availability and error budget burn rates over each SLO window, against per device targets.
+    """
+    settings.AVAILABILITY_SLO_TARGET = 99.0
+    now = timezone.now()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    ingestDevices([
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True},
+        {"id": 2, "name": "Switch", "ip_address": "192.168.0.2", "status": True},
+    ])
+    DeviceHourlyAvailability.objects.bulk_create([
+        DeviceHourlyAvailability(device_id=1, hour=hour - timedelta(hours=5), successful_attempts=98, total_attempts=99),
+        DeviceHourlyAvailability(device_id=1, hour=hour - timedelta(days=10), successful_attempts=891, total_attempts=1000),
+        DeviceHourlyAvailability(device_id=1, hour=hour - timedelta(days=40), successful_attempts=0, total_attempts=100),
+    ])
+    Device.objects.filter(device_id=2).update(slo_target=90)
+
+    first, second = addSlo([{"device_id": 1}, {"device_id": 2}])
+
+    # The poll ingested now is counted in every window.
+    assert [round(first[c], 6) for c in ('slo_target', 'availability_1h', 'availability_24h', 'availability_30d')] == [
+        99.0, 100.0, 99.0, 90.0
+    ]
+    assert [round(first[c], 6) for c in ('burn_rate_1h', 'burn_rate_24h', 'burn_rate_30d')] == [0.0, 1.0, 10.0]
+    assert (second['slo_target'], second['burn_rate_30d']) == (90.0, 0.0)
 
 
 @pytest.mark.django_db
-def testGetAvailTableEmpty():
+def testSloQuery():
     """
-    Test getAvailTable when the database is empty.
+    Test that the SLO columns are computed for every device in one query, and skip devices not polled within 30 days.
     """
-    assert getAvailTable() == '<p>No device records available</p>'
\ No newline at end of file
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    DeviceHourlyAvailability.objects.bulk_create([
+        DeviceHourlyAvailability(device_id=i, hour=hour - timedelta(days=i * 20), successful_attempts=1, total_attempts=2)
+        for i in (1, 2)
+    ])
+
+    rows = list(sloQuery())
+
+    assert [list(r) for r in rows] == [["device_id"] + SLO_COLUMNS]
+    assert rows[0]["device_id"] == 1
+    assert (rows[0]["availability_24h"], rows[0]["availability_30d"], round(rows[0]["burn_rate_30d"], 6)) == (None, 50.0, 500.0)
+    assert list(sloQuery(deviceIds=[2])) == []
+
+
+@pytest.mark.django_db
+def testAvailabilityQueryReadsOnlyWindow():
+    """
+    Test that a short window only reads its own hours, with the SLO windows summed for a page of devices.
+    """
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    DeviceHourlyAvailability.objects.bulk_create([
+        DeviceHourlyAvailability(device_id=i, hour=hour - timedelta(days=d), successful_attempts=i - 1, total_attempts=1)
+        for i in (1, 2) for d in (0, 10)
+    ])
+
+    with CaptureQueriesContext(connection) as queries:
+        rows = list(availabilityQuery(hour))
+    assert [(r["device_id"], r["total_attempts"]) for r in rows] == [(2, 1), (1, 1)]
+    bounds = [p for p in queries.captured_queries[0]["sql"].split("'") if p[:2] == "20"]
+    assert min(bounds) >= hour.strftime("%Y-%m-%d %H:%M:%S")
+
+    page = addSlo(rows[:1])
+    assert (page[0]["device_id"], page[0]["availability_1h"], page[0]["availability_30d"]) == (2, 100.0, 100.0)
+    assert addSlo([{"device_id": 3}])[0]["availability_30d"] is None
+
+
+@pytest.mark.django_db
+def testSetSloTarget():
+    """
+    Test that the set_slo_target command sets and clears per device targets.
+    """
+    ingestDevices([{"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": True} for i in (1, 2)])
+    (before,) = getVersions(DEVICES)
+
+    call_command("set_slo_target", "99.5", "--device", "1", "2")
+    assert list(Device.objects.values_list("slo_target", flat=True)) == [99.5, 99.5]
+    assert getVersions(DEVICES) == (before + 1,)
+
+    call_command("set_slo_target", "--clear", "--device", "2")
+    assert list(Device.objects.values_list("slo_target", flat=True)) == [99.5, None]
+
+    for args in (("100", "--device", "1"), ("--device", "1"), ("99", "--clear", "--device", "1")):
+        with pytest.raises(CommandError):
+            call_command("set_slo_target", *args)
+
+
+@pytest.mark.django_db
+def testAvailabilityQueryWindow():
+    """
+    Test that a window only counts the hours it covers.
+    """
+    now = timezone.now()
+    ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}])
+    DeviceHourlyAvailability.objects.create(device_id=1, hour=now - timedelta(days=3), successful_attempts=0, total_attempts=9)
+
+    day = availabilityQuery(now - timedelta(hours=24)).get()
+    week = availabilityQuery(now - timedelta(days=7)).get()
+
+    assert (day["name"], day["total_attempts"], day["availability"]) == ("Router", 1, 100)
+    assert (week["total_attempts"], week["availability"]) == (10, 10)
+
+
+def testGetWindowStart():
+    """
+    Test that known windows resolve to their start, and unknown ones fall back to 24h.
+    """
+    now = timezone.now()
+
+    assert getWindowStart("1h", now) == ("1h", now - timedelta(hours=1))
+    assert getWindowStart("1y", now) == ("24h", now - timedelta(hours=24))
+
+
+@pytest.mark.django_db
+def testGetMetricTimeline(syncMetrics):
+    """
+    Test that the timeline only contains requests logged within the window.
+    """
+    generateLog("/devices", 200, True)
+    SystemMetric.objects.update(timestamp=timezone.now() - timedelta(days=2))
+    generateLog("/index", 200, True)
+
+    df = getMetricTimeline(timezone.now() - timedelta(hours=1))
+
+    assert list(df["endpoint"]) == ["/index"]
+
+
+@pytest.mark.django_db
+def testGetMetricTimelineBuckets():
+    """
+    Test that requests are counted per endpoint per bucket, including downsampled history.
+    """
+    end = timezone.now().replace(minute=30, second=0, microsecond=0)
+    hour = end.replace(minute=0)
+    for minute, success in ((1, True), (2, False), (20, True)):
+        SystemMetric.objects.create(endpoint="/", status_code=200, success=success, timestamp=hour + timedelta(minutes=minute))
+    SystemMetricRollup.objects.create(
+        endpoint="/", resolution=60, bucket=hour - timedelta(days=3), total_requests=10, successful_requests=5
+    )
+
+    df = getMetricTimeline(end - timedelta(days=7), end)
+
+    assert getTimelineBucket(end - timedelta(days=7), end) == 10800
+    assert list(df["requests"]) == [10, 3]
+    assert list(df["success_rate"].round(1)) == [50.0, 66.7]
+
+
+def testGetTimelineBucket():
+    """
+    Test that the bucket size keeps every dashboard window within TIMELINE_MAX_BUCKETS.
+    """
+    end = timezone.now()
+
+    assert getTimelineBucket(end - timedelta(hours=1), end) == 60
+    assert getTimelineBucket(end - timedelta(hours=24), end) == 900
+    for window in WINDOWS.values():
+        assert window.total_seconds() / getTimelineBucket(end - window, end) <= 120
+
+
+@pytest.mark.django_db
+def testDataVersions():
+    """
+    Test that ingesting a poll bumps the device data version, and request logs bump no version.
+    """
+    assert getVersions(DEVICES, METRICS) == (0, 0)
+
+    ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}])
+    ingestChanges([], full=False)
+    generateLog("/devices", 200, True)
+    assert getVersions(DEVICES, METRICS) == (2, 0)
+
+    bumpVersion(METRICS)
+
+    assert getVersions(DEVICES, METRICS) == (2, 1)
+
+
+@pytest.mark.django_db
+def testDataVersionOncePerPoll():
+    """
+    Test that a poll written in several batches bumps the device data version once.
+    """
+    devices = [{"id": i, "name": f"Router_{i}", "ip_address": f"192.168.0.{i}", "status": True} for i in range(5)]
+
+    ingestDevices(devices, batchSize=2)
+    assert getVersions(DEVICES) == (1,)
+
+    ingestChanges(devices, full=True, batchSize=2)
+    assert getVersions(DEVICES) == (2,)
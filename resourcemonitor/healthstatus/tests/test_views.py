@@ -3,125 +3,125 @@ This file is a test suite for the healthstatus app views.
 """
 import pytest
 from django.http import HttpRequest
+from django.test import Client
 from django.urls import reverse
 from healthstatus import views
+from healthstatus.utils import ingestDevices
+from healthstatus.models import DeviceStatus
 import json
 
 @pytest.mark.django_db
-def testCallDeviceService(mocker):
+def testCallDeviceService(mocker, deviceApi):
     """
-    Test that callDeviceService fetches devices.
+    Test that callDeviceService fetches devices when no snapshot is stored.
     Saves them to the database.
-    Creates logs in another database.
     """
     # Create a fake response to remove dependency on Flask API.
-    mockResp = mocker.Mock()
-    mockResp.status_code = 200
-    mockResp.json.return_value = [
-        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}
-    ]
-    mockResp.raise_for_status.return_value = None
-    mocker.patch("healthstatus.views.requests.get", return_value=mockResp)
-
-    # Create a new entry from the mock object.
-    mockRecord = mocker.patch("healthstatus.views.DeviceStatus.objects.create")
-
-    mockLog = mocker.patch("healthstatus.views.generateLog")
+    devices = [{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}]
+    mockGet = deviceApi(devices)
 
     request = HttpRequest()
     response = views.callDeviceService(request)
 
     assert response.status_code == 200
-    assert json.loads(response.content) == mockResp.json.return_value
-    mockRecord.assert_called_once_with(
-        device_id=1,
-        name="Router",
-        ip_address="192.168.0.1",
-        status=True
-    )
-    mockLog.assert_called_once_with("/devices", 200, True)
+    assert json.loads(response.content) == devices
+    assert DeviceStatus.objects.count() == 1
+    mockGet.assert_called_once()
 
 
 @pytest.mark.django_db
 def testCallDeviceServiceError(mocker):
     """
-    Test that callDeviceService handles exceptions and logs failure.
+    Test that callDeviceService handles exceptions with a 500 response.
     """
-    mocker.patch("healthstatus.views.requests.get", side_effect=Exception("Failed To Fetch Devices"))
-    mockLog = mocker.patch("healthstatus.views.generateLog")
+    mocker.patch("healthstatus.client.requests.Session.get", side_effect=Exception("Failed To Fetch Devices"))
 
     request = HttpRequest()
     response = views.callDeviceService(request)
 
     assert response.status_code == 500
     assert "error" in json.loads(response.content)
-    mockLog.assert_called_once()
-    args, kwargs = mockLog.call_args
-    assert args[0] == "/devices"
-    assert args[2] is False
 
 
 @pytest.mark.django_db
-def testFrontEndRender(mocker):
+def testCallDeviceServiceSnapshot(mocker):
     """
-    Test that frontEnd renders the template, and generates a log.
+    Test that callDeviceService serves the stored snapshot without calling the Flask API.
     """
-    mockLog = mocker.patch("healthstatus.views.generateLog")
-    mockRender = mocker.patch("healthstatus.views.render", return_value="rendered")
+    ingestDevices([{"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}])
+    mockGet = mocker.patch("healthstatus.client.requests.Session.get")
 
-    request = HttpRequest()
-    result = views.frontEnd(request)
+    response = views.callDeviceService(HttpRequest())
+
+    assert response.status_code == 200
+    assert json.loads(response.content) == [
+        {"id": 1, "name": "Router", "ip_address": "192.168.0.1", "status": True}
+    ]
+    mockGet.assert_not_called()
 
-    assert result == "rendered"
-    mockLog.assert_called_once_with("/index", 200, True)
-    mockRender.assert_called_once_with(request, "devices.html")
 
 @pytest.mark.django_db
-def testMetricsDashboardEmpty(mocker):
+def testCallDeviceServiceFilters(mocker):
     """
-    Test that metricsDashboard returns 'No system metrics yet' when db is empty.
+    Test that devices are filtered and sorted on the server, and unknown options are rejected.
     """
-    mocker.patch("healthstatus.views.generateLog")
-    mocker.patch("healthstatus.views.getAvailTable", return_value="<table>mock</table>")
-    mocker.patch("healthstatus.views.SystemMetric.objects.values", return_value=[])
+    ingestDevices([
+        {"id": i, "name": name, "ip_address": "192.168.0.1", "status": i != 2}
+        for i, name in ((1, "Switch_1"), (2, "Router_2"), (3, "Router_3"), (4, "Firewall_4"))
+    ])
+    client = Client()
+
+    down = client.get("/devices", {"status": "down"}).json()
+    byName = client.get("/devices", {"status": "up", "sort": "name"}).json()
+    downFirst = client.get("/devices", {"sort": "status"}).json()
+
+    assert [d["id"] for d in down] == [2]
+    assert [d["name"] for d in byName] == ["Firewall_4", "Router_3", "Switch_1"]
+    assert [d["id"] for d in downFirst] == [2, 4, 3, 1]
+    assert client.get("/devices", {"status": "sideways"}).status_code == 400
+    assert client.get("/devices", {"sort": "ip"}).status_code == 400
+
 
+@pytest.mark.django_db
+def testFrontEndRender(mocker):
+    """
+    Test that frontEnd renders the template.
+    """
     mockRender = mocker.patch("healthstatus.views.render", return_value="rendered")
 
     request = HttpRequest()
-    result = views.metricsDashboard(request)
+    result = views.frontEnd(request)
 
     assert result == "rendered"
-    args, kwargs = mockRender.call_args
-    context = args[2]
-    assert "<p>No system metrics yet</p>" in context["system_chart"]
-
+    mockRender.assert_called_once_with(request, "devices.html")
 
 @pytest.mark.django_db
-def testMetricsDashboard(mocker):
+def testMetricsDashboard(mocker, django_assert_num_queries):
     """
-    Test that metricsDashboard renders metrics.html with table and chart when data exists.
+    Test that metricsDashboard renders the metrics.html shell without querying any data.
     """
-    mocker.patch("healthstatus.views.generateLog")
-    mocker.patch("healthstatus.views.getAvailTable", return_value="<table>mock</table>")
-
-    # Mock SystemMetric.objects.values to return data
-    mocker.patch(
-        "healthstatus.views.SystemMetric.objects.values",
-        return_value=[
-            {"timestamp": "2025-08-30T12:00:00Z", "endpoint": "/devices", "success": True}
-        ]
-    )
-
     mockRender = mocker.patch("healthstatus.views.render", return_value="rendered")
 
     request = HttpRequest()
-    result = views.metricsDashboard(request)
+    request.GET["window"] = "7d"
+    with django_assert_num_queries(0):
+        result = views.metricsDashboard(request)
 
     assert result == "rendered"
     args, kwargs = mockRender.call_args
     assert args[1] == "metrics.html"
     context = args[2]
-    assert "<table>mock</table>" in context["table"]
-    assert "system_chart" in context
+    assert context["window"] == "7d"
+    assert context["windows"] == ["1h", "24h", "7d"]
+
 
+@pytest.mark.django_db
+def testMetricsDashboardRender():
+    """
+    Test that the rendered shell loads its data from the metrics API.
+    """
+    response = Client().get("/dashboard")
 
+    assert response.status_code == 200
+    assert b'data-window="24h"' in response.content
+    assert b"js/metrics.js" in response.content
@@ -1,10 +1,14 @@
 # This file contains URL routing for the health status app.
 
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
     path("devices", views.callDeviceService, name="API"), # Direct API access
+    path("devices/live", views.liveDevices, name="Live Devices"), # Server-Sent Events stream of status changes
     path("", views.frontEnd, name="Network Health Monitor"), # Live Status Viewer
     path("dashboard", views.metricsDashboard, name="Dashboard"), # Plotly Metrics Dashboard
+    path("api/metrics/availability", api.availability, name="Availability API"), # Dashboard table data
+    path("api/metrics/timeline", api.timeline, name="Timeline API"), # Dashboard chart data
+    path("api/metrics/history", api.history, name="History API"), # Stored device status changes
 ]
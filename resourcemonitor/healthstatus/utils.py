@@ -1,13 +1,55 @@
 """
 This file contains utility functions for the health status app.
 """
-from healthstatus.models import DeviceStatus, SystemMetric
+from healthstatus.models import DeviceStatus, SystemMetric, SystemMetricRollup, Device, DeviceHourlyAvailability, DeviceInterval
+from healthstatus.database import serializedWrite
+from healthstatus.metricwriter import getMetricWriter, insertMetrics
+from healthstatus.retention import MINUTE, HOUR
+from healthstatus.storage import REQUEST_COUNT_COLUMNS, TRUNCATIONS, getMetricStore, getSampleStore
+from healthstatus.versions import bumpVersion, DEVICES
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DateTimeField, DurationField, ExpressionWrapper, F, FloatField, Max, OuterRef, Q, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, NullIf
+from django.utils import timezone
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import pandas as pd
 
+# Sizes in seconds the System Events Timeline can be bucketed by.
+TIMELINE_BUCKET_SIZES: Tuple[int, ...] = (60, 300, 600, 900, 1800, 3600, 10800, 21600, 43200, 86400)
+
+# Time windows the dashboards can be filtered to.
+WINDOWS: Dict[str, timedelta] = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+}
+DEFAULT_WINDOW: str = "24h"
+
+# Rolling windows availability is reported over, and error budgets are burned against.
+SLO_WINDOWS: Dict[str, timedelta] = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "30d": timedelta(days=30),
+}
+SLO_COLUMNS: List[str] = ["slo_target"] + [f"{m}_{w}" for w in SLO_WINDOWS for m in ("availability", "burn_rate")]
+
+# Filters and sort orders the device list can be requested with, e.g. /devices?status=down&sort=name.
+DEVICE_STATUSES: Dict[str, bool] = {"up": True, "down": False}
+DEVICE_SORTS: Dict[str, Callable[[dict], tuple]] = {
+    "id": lambda d: (d["id"],),
+    "name": lambda d: (d["name"], d["id"]),
+    "status": lambda d: (d["status"], d["name"], d["id"]), # Down devices first.
+}
+
 def generateLog(endpoint: str, status_code: int, success: bool) -> None:
     """
     Generates a log and writes to SystemMetric.
     Used to monitor network traffic.
+    Logs are buffered and written in the background,
+    unless settings.METRIC_BUFFER_SIZE is 0.
 
     Args:
         endpoint (str): The API endpoint being monitored.
@@ -17,58 +59,654 @@ def generateLog(endpoint: str, status_code: int, success: bool) -> None:
     Returns:
         None
     """
-    SystemMetric.objects.create(
+    if getattr(settings, "METRIC_BUFFER_SIZE", 10000) == 0:
+        saveLog(endpoint, status_code, success)
+        return
+
+    getMetricWriter().write(SystemMetric( # Timestamped now, not when the batch is written.
         endpoint=endpoint,
         status_code=status_code,
         success=success,
+        timestamp=timezone.now(),
+    ))
+
+def saveLog(endpoint: str, status_code: int, success: bool) -> None:
+    """
+    Writes a single log to the MetricStore (SystemMetric by default).
+    Request logs do not bump the metrics version, or every request would invalidate
+    the cached timeline, which instead refreshes every TIMELINE_REFRESH seconds.
+
+    Args:
+        endpoint (str): The API endpoint being monitored.
+        status_code (int): The HTTP status code returned by the endpoint.
+        success (bool): Whether the request was successful (2xx status code).
+
+    Returns:
+        None
+    """
+    insertMetrics([SystemMetric(
+        endpoint=endpoint,
+        status_code=status_code,
+        success=success,
+        timestamp=timezone.now(),
+    )])
+
+def ingestDevices(devices: Iterable[dict], batchSize: Optional[int] = None) -> int:
+    """
+    Writes a single poll of the Flask API, a snapshot of the whole fleet.
+    Devices are read one batch at a time, outside of any transaction, so a streamed
+    poll is written while it is still being read. Each batch is then written in its
+    own short transaction using batched INSERTs, so the write lock is never held
+    while waiting on the network. The device data version is bumped once, after the last batch.
+    Only state transitions are stored, in the SampleStore (DeviceStatus by default)
+    or DeviceInterval depending on DEVICE_STORAGE_MODE, however the poll was made.
+
+    Args:
+        devices (Iterable[dict]): Device records as returned by the Flask API.
+        batchSize (int, optional): Rows per INSERT statement, and devices per transaction.
+            Defaults to settings.DEVICE_INGEST_BATCH_SIZE.
+
+    Returns:
+        int: The number of devices polled.
+    """
+    if batchSize is None:
+        batchSize = getattr(settings, "DEVICE_INGEST_BATCH_SIZE", 500)
+
+    now: datetime = timezone.now()
+    polled: int = 0
+
+    for batch in readBatches(devices, batchSize):
+        storeDevices(batch, now, batchSize)
+        polled += len(batch)
+    if polled:
+        bumpVersion(DEVICES) # Once per poll, as storeChanges does.
+    return polled
+
+def readBatches(devices: Iterable[dict], batchSize: int) -> Iterator[List[dict]]:
+    """
+    Splits a poll into batches, each read in full before it is written.
+
+    Args:
+        devices (Iterable[dict]): Device records as returned by the Flask API.
+        batchSize (int): Devices per batch.
+
+    Returns:
+        Iterator[List[dict]]: The device records, batchSize at a time.
+    """
+    devices = iter(devices)
+    while batch := list(islice(devices, batchSize)):
+        yield batch
+
+@serializedWrite
+def storeDevices(batch: List[dict], now: datetime, batchSize: int) -> int:
+    """
+    Writes one batch of a snapshot in a single transaction, see ingestDevices.
+    The caller bumps the device data version once the whole snapshot is written.
+    New devices and devices whose status changed are stored as transitions,
+    and every device in the batch is counted in its availability.
+
+    Args:
+        batch (List[dict]): Device records as returned by the Flask API.
+        now (datetime): The time of the poll.
+        batchSize (int): Rows per INSERT statement.
+
+    Returns:
+        int: The number of transitions stored.
+    """
+    if not batch:
+        return 0
+
+    records: List[DeviceStatus] = [
+        DeviceStatus(
+            device_id=d["id"],
+            name=d["name"],
+            ip_address=d["ip_address"],
+            status=d["status"],
+        )
+        for d in batch
+    ]
+
+    with transaction.atomic():
+        # Previous status of each device, new devices always store their first status.
+        known: Dict[int, bool] = {
+            deviceId: status for deviceId, (_, _, status) in knownDevices([d["id"] for d in batch]).items()
+        }
+        transitions: List[dict] = []
+        for d in batch:
+            if known.get(d["id"]) != d["status"]:
+                transitions.append(d)
+                known[d["id"]] = d["status"]
+
+        updateRollups(records, now) # Creates any new Device rows first.
+        storeTransitions(transitions, now, batchSize)
+
+    return len(transitions)
+
+def storeTransitions(transitions: List[dict], now: datetime, batchSize: int) -> None:
+    """
+    Stores state transitions in the SampleStore or DeviceInterval, depending on DEVICE_STORAGE_MODE.
+
+    Args:
+        transitions (List[dict]): The full device record of each changed device.
+        now (datetime): The time of the poll.
+        batchSize (int): Rows per INSERT statement.
+
+    Returns:
+        None
+    """
+    if storesIntervals():
+        recordTransitions([(d["id"], d["status"]) for d in transitions], now)
+    elif transitions:
+        getSampleStore().writeSamples(transitions, now, batchSize)
+
+def knownDevices(deviceIds: List[int]) -> Dict[int, Tuple[str, str, bool]]:
+    """
+    The stored name, ip_address and status of devices.
+
+    Args:
+        deviceIds (List[int]): The devices to look up.
+
+    Returns:
+        Dict[int, Tuple[str, str, bool]]: (name, ip_address, status) by device_id, for devices already stored.
+    """
+    known: Dict[int, Tuple[str, str, bool]] = {}
+    for start in range(0, len(deviceIds), 500): # Stay under SQLite's parameter limit.
+        rows = Device.objects.filter(device_id__in=deviceIds[start:start + 500]).values_list(
+            "device_id", "name", "ip_address", "status"
+        )
+        known.update((deviceId, (name, ip, status)) for deviceId, name, ip, status in rows)
+    return known
+
+def updateRollups(records: List[DeviceStatus], now: datetime) -> None:
+    """
+    Adds a poll to the Device and DeviceHourlyAvailability counters.
+    Each counter is incremented in place with an upsert,
+    so the dashboard never needs to scan the DeviceStatus history.
+
+    Args:
+        records (List[DeviceStatus]): The samples from a single poll.
+        now (datetime): The time of the poll.
+
+    Returns:
+        None
+    """
+    if not records:
+        return
+
+    hour: datetime = now.replace(minute=0, second=0, microsecond=0)
+    quote = connection.ops.quote_name
+    deviceTable: str = quote(Device._meta.db_table)
+    hourlyTable: str = quote(DeviceHourlyAvailability._meta.db_table)
+
+    # Combine repeated device ids so each counter row is touched once per poll.
+    perDevice: Dict[int, Tuple[str, str, bool, int, int]] = {}
+    for r in records:
+        _, _, _, successful, total = perDevice.get(r.device_id, (None, None, None, 0, 0))
+        perDevice[r.device_id] = (r.name, r.ip_address, r.status, successful + int(r.status), total + 1)
+
+    lastSeen = connection.ops.adapt_datetimefield_value(now)
+    hourValue = connection.ops.adapt_datetimefield_value(hour)
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"""
+            INSERT INTO {deviceTable}
+                (device_id, name, ip_address, status, successful_attempts, total_attempts, last_seen)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (device_id) DO UPDATE SET
+                name = excluded.name,
+                ip_address = excluded.ip_address,
+                status = excluded.status,
+                successful_attempts = {deviceTable}.successful_attempts + excluded.successful_attempts,
+                total_attempts = {deviceTable}.total_attempts + excluded.total_attempts,
+                last_seen = excluded.last_seen
+            """,
+            [
+                (deviceId, name, ip, status, successful, total, lastSeen)
+                for deviceId, (name, ip, status, successful, total) in perDevice.items()
+            ],
+        )
+        cursor.executemany(
+            f"""
+            INSERT INTO {hourlyTable}
+                (device_id, hour, successful_attempts, total_attempts)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (device_id, hour) DO UPDATE SET
+                successful_attempts = {hourlyTable}.successful_attempts + excluded.successful_attempts,
+                total_attempts = {hourlyTable}.total_attempts + excluded.total_attempts
+            """,
+            [
+                (deviceId, hourValue, successful, total)
+                for deviceId, (_, _, _, successful, total) in perDevice.items()
+            ],
+        )
+
+def storesIntervals() -> bool:
+    """
+    Check if device history is stored as intervals rather than per-poll samples.
+
+    Args:
+        None
+
+    Returns:
+        bool: True if DEVICE_STORAGE_MODE is "intervals".
+    """
+    return getattr(settings, "DEVICE_STORAGE_MODE", "samples") == "intervals"
+
+def recordTransitions(transitions: List[Tuple[int, bool]], now: datetime) -> None:
+    """
+    Closes the open DeviceInterval of each device which changed status,
+    and opens a new interval with its new status.
+
+    Args:
+        transitions (List[Tuple[int, bool]]): (device_id, new status) for each changed device.
+        now (datetime): The time of the poll.
+
+    Returns:
+        None
+    """
+    if not transitions:
+        return
+
+    deviceIds: List[int] = [deviceId for deviceId, _ in transitions]
+    for start in range(0, len(deviceIds), 500): # Stay under SQLite's parameter limit.
+        DeviceInterval.objects.filter(device_id__in=deviceIds[start:start + 500], end__isnull=True).update(end=now)
+
+    DeviceInterval.objects.bulk_create(
+        [DeviceInterval(device_id=deviceId, status=status, start=now) for deviceId, status in transitions],
+        batch_size=500,
     )
-    return
 
-def getDeviceAvail() -> pd.DataFrame:
+def ingestChanges(devices: List[dict], full: bool, batchSize: Optional[int] = None) -> int:
     """
-    Generates an aggregated dataset from the DeviceStatus model.
-    Calculates device availability by
-        number of successful attempts / total attempts.
+    Writes a poll received as status changes to the database.
+    Only state transitions are stored, in the SampleStore or DeviceInterval
+    depending on DEVICE_STORAGE_MODE, while the Device counters
+    still count the poll for every device in the latest snapshot.
 
     Args:
+        devices (List[dict]): Full device records for a snapshot,
+            or {"id", "status"} of each changed device.
+        full (bool): True if devices is a full snapshot of the fleet.
+        batchSize (int, optional): Rows per INSERT statement.
+            Defaults to settings.DEVICE_INGEST_BATCH_SIZE.
+
+    Returns:
+        int: The number of transitions stored.
+    """
+    if batchSize is None:
+        batchSize = getattr(settings, "DEVICE_INGEST_BATCH_SIZE", 500)
+
+    now: datetime = timezone.now()
+
+    if full: # Compare the snapshot with the stored state, as ingestDevices does.
+        stored: int = sum(storeDevices(batch, now, batchSize) for batch in readBatches(devices, batchSize))
+        bumpVersion(DEVICES) # Once per poll, as storeChanges does.
+        return stored
+    return storeChanges(devices, now, batchSize)
+
+@serializedWrite
+def storeChanges(changes: List[dict], now: datetime, batchSize: int) -> int:
+    """
+    Writes the status changes of a poll in a single transaction, see ingestChanges.
+
+    Args:
+        changes (List[dict]): {"id", "status"} of each changed device.
+        now (datetime): The time of the poll.
+        batchSize (int): Rows per INSERT statement.
+
+    Returns:
+        int: The number of transitions stored.
+    """
+    with transaction.atomic(): # One commit for the whole poll.
+        # Devices in the latest snapshot were all last seen by the latest poll.
+        since: Optional[datetime] = Device.objects.aggregate(latest=Max("last_seen"))["latest"]
+        known: Dict[int, Tuple[str, str, bool]] = knownDevices([d["id"] for d in changes])
+
+        transitions: List[dict] = [
+            {"id": d["id"], "name": known[d["id"]][0], "ip_address": known[d["id"]][1], "status": d["status"]}
+            for d in changes if d["id"] in known and known[d["id"]][2] != d["status"]
+        ]
+
+        storeTransitions(transitions, now, batchSize)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {connection.ops.quote_name(Device._meta.db_table)} SET status = %s WHERE device_id = %s",
+                [(d["status"], d["id"]) for d in transitions],
+            )
+        if since is not None:
+            countPoll(now, since)
+        bumpVersion(DEVICES) # Every poll changes the availability counters.
+
+    return len(transitions)
+
+@serializedWrite
+def countPoll(now: datetime, since: datetime) -> None:
+    """
+    Adds a poll to the Device and DeviceHourlyAvailability counters
+    using the latest stored status of every device seen since the given time,
+    so devices missing from the latest snapshot are no longer counted.
+    Two statements cover the whole fleet, however few devices changed.
+
+    Args:
+        now (datetime): The time of the poll.
+        since (datetime): The time of the previous poll.
+
+    Returns:
         None
-    
+    """
+    quote = connection.ops.quote_name
+    deviceTable: str = quote(Device._meta.db_table)
+    hourlyTable: str = quote(DeviceHourlyAvailability._meta.db_table)
+    hour: datetime = now.replace(minute=0, second=0, microsecond=0)
+    seen = connection.ops.adapt_datetimefield_value(since)
+
+    with connection.cursor() as cursor:
+        cursor.execute( # Before last_seen moves on.
+            f"""
+            INSERT INTO {hourlyTable} (device_id, hour, successful_attempts, total_attempts)
+            SELECT device_id, %s, CASE WHEN status THEN 1 ELSE 0 END, 1 FROM {deviceTable}
+            WHERE last_seen >= %s
+            ON CONFLICT (device_id, hour) DO UPDATE SET
+                successful_attempts = {hourlyTable}.successful_attempts + excluded.successful_attempts,
+                total_attempts = {hourlyTable}.total_attempts + excluded.total_attempts
+            """,
+            [connection.ops.adapt_datetimefield_value(hour), seen],
+        )
+        cursor.execute(
+            f"""
+            UPDATE {deviceTable} SET
+                successful_attempts = successful_attempts + CASE WHEN status THEN 1 ELSE 0 END,
+                total_attempts = total_attempts + 1,
+                last_seen = %s
+            WHERE last_seen >= %s
+            """,
+            [connection.ops.adapt_datetimefield_value(now), seen],
+        )
+
+def getWindowStart(window: Optional[str], now: Optional[datetime] = None) -> Tuple[str, datetime]:
+    """
+    Resolves a dashboard time window, such as "1h", to the time it starts.
+    Unknown windows fall back to DEFAULT_WINDOW.
+
+    Args:
+        window (str, optional): A key of WINDOWS.
+        now (datetime, optional): End of the window. Defaults to now.
+
     Returns:
-        pandas.DataFrame: The aggregated DataFrame.
+        Tuple[str, datetime]: The window used, and its start.
     """
-    query = DeviceStatus.objects.all().values()
-    df: pd.DataFrame = pd.DataFrame(query)
+    if window not in WINDOWS:
+        window = DEFAULT_WINDOW
+    return window, (now or timezone.now()) - WINDOWS[window]
 
-    if df.empty:
-        return pd.DataFrame(columns=["DEVICE_NAME", "SUCCESSFUL_ATTEMPTS", "TOTAL_ATTEMPTS", "AVAILABILITY"])
+def selectDevices(devices: List[dict], status: Optional[str] = None, sort: Optional[str] = None) -> List[dict]:
+    """
+    Filter and sort device records, so clients only download the devices they show.
 
-    df = df.groupby('name').agg(
-        SUCCESSFUL_ATTEMPTS=('status', 'sum'),
-        TOTAL_ATTEMPTS=('status', 'count')
+    Args:
+        devices (List[dict]): The device records, in id order.
+        status (str, optional): A key of DEVICE_STATUSES to keep, or None for every device.
+        sort (str, optional): A key of DEVICE_SORTS, or None to keep id order.
+
+    Returns:
+        List[dict]: The selected device records.
+
+    Raises:
+        ValueError: If status or sort is unknown.
+    """
+    if status:
+        if status not in DEVICE_STATUSES:
+            raise ValueError(f"status must be one of {', '.join(DEVICE_STATUSES)}.")
+        devices = [d for d in devices if d["status"] == DEVICE_STATUSES[status]]
+    if sort and sort != "id":
+        if sort not in DEVICE_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(DEVICE_SORTS)}.")
+        devices = sorted(devices, key=DEVICE_SORTS[sort])
+    return devices
+
+def getSloTarget() -> float:
+    """
+    The availability % target of devices without their own Device.slo_target.
+
+    Args:
+        None
+
+    Returns:
+        float: settings.AVAILABILITY_SLO_TARGET.
+    """
+    return float(getattr(settings, "AVAILABILITY_SLO_TARGET", 99.9))
+
+def annotateSlo(query: QuerySet, end: datetime) -> QuerySet:
+    """
+    Adds the SLO columns to a query of hourly rollups grouped by device_id.
+    Each window is a conditional sum, so every window is computed in the same grouped pass.
+    Like the dashboard windows, each one starts at the start of the hour containing end - window.
+    The error budget burn rate is the rate of failed attempts / the rate the SLO target allows,
+    1 spends the budget exactly over the window and above 1 exhausts it early.
+
+    Args:
+        query (QuerySet): DeviceHourlyAvailability rows grouped by device_id, covering every window.
+        end (datetime): End of the windows.
+
+    Returns:
+        QuerySet: The query annotated with SLO_COLUMNS.
+    """
+    target = Device.objects.filter(device_id=OuterRef("device_id")).values("slo_target")[:1]
+    sums: Dict[str, Sum] = {}
+    for window, length in SLO_WINDOWS.items():
+        inWindow = Q(hour__gte=(end - length).replace(minute=0, second=0, microsecond=0))
+        sums[f"successful_{window}"] = Sum("successful_attempts", filter=inWindow)
+        sums[f"total_{window}"] = Sum("total_attempts", filter=inWindow)
+
+    ratios: Dict[str, ExpressionWrapper] = {}
+    for window in SLO_WINDOWS:
+        availability = ExpressionWrapper( # Availability %
+            F(f"successful_{window}") * 100.0 / NullIf(F(f"total_{window}"), 0), output_field=FloatField()
+        )
+        ratios[f"availability_{window}"] = availability
+        ratios[f"burn_rate_{window}"] = ExpressionWrapper( # A target of 100% has no budget to burn.
+            (100.0 - availability) / NullIf(100.0 - F("slo_target"), 0.0), output_field=FloatField()
+        )
+
+    return (
+        query
+        .annotate(**sums)
+        .annotate(slo_target=Coalesce(Subquery(target), Value(getSloTarget()), output_field=FloatField()))
+        .annotate(**ratios)
     )
 
-    df['AVAILABILITY'] = (df['SUCCESSFUL_ATTEMPTS'] / df['TOTAL_ATTEMPTS']) * 100 # Availability %
+def sloQuery(end: Optional[datetime] = None, deviceIds: Optional[List[int]] = None) -> QuerySet:
+    """
+    Builds the query of availability and error budget burn rate over each of SLO_WINDOWS.
 
-    df = df.reset_index().rename(columns={'name': 'DEVICE_NAME'})
-    df = df.sort_values(by='AVAILABILITY', ascending=False) # Rank best performing devices first.
-    return df
+    Args:
+        end (datetime, optional): End of the windows. Defaults to now.
+        deviceIds (List[int], optional): Only include these devices. Defaults to every device.
 
-def getAvailTable() -> str:
+    Returns:
+        QuerySet: Rows of device_id and SLO_COLUMNS, for devices polled within the longest window.
     """
-    Generates an HTML table for device availability.
+    if end is None:
+        end = timezone.now()
+
+    longest: timedelta = max(SLO_WINDOWS.values())
+    query = DeviceHourlyAvailability.objects.filter(
+        hour__gte=(end - longest).replace(minute=0, second=0, microsecond=0), hour__lt=end
+    )
+    if deviceIds is not None:
+        query = query.filter(device_id__in=deviceIds)
+
+    return annotateSlo(query.values("device_id"), end).values("device_id", *SLO_COLUMNS).order_by("device_id")
+
+def availabilityQuery(start: datetime, end: Optional[datetime] = None,
+                      deviceIds: Optional[List[int]] = None) -> QuerySet:
     """
-    df = getDeviceAvail()
+    Builds the per device availability query used by the metrics API.
+    Sums the hourly counters of every hour which starts within the window,
+    from the start of the hour containing start, so only the window's hours are read.
+    The SLO windows are summed separately, for a page of devices at a time, see addSlo.
 
-    if df.empty: return "<p>No device records available</p>"
+    Args:
+        start (datetime): Start of the window.
+        end (datetime, optional): End of the window. Defaults to now.
+        deviceIds (List[int], optional): Only include these devices. Defaults to every device.
 
-    # Table formatting:
-    # Make device names bold and format availability percentages.
-    df['AVAILABILITY'] = round(df['AVAILABILITY'], 1).astype(str) + '%'
-    df['DEVICE_NAME'] = "<strong>" + df['DEVICE_NAME'].astype(str) + "</strong>"
+    Returns:
+        QuerySet: Rows of device_id, name, successful_attempts, total_attempts and availability (%),
+            for devices polled within the window, best performing devices first.
+    """
+    startHour: datetime = start.replace(minute=0, second=0, microsecond=0)
+
+    query = DeviceHourlyAvailability.objects.filter(hour__gte=startHour) # Range read of the hour index.
+    if end is not None:
+        query = query.filter(hour__lt=end)
+    if deviceIds is not None:
+        query = query.filter(device_id__in=deviceIds)
 
-    return df.to_html(
-            classes="table table-striped table-sm",
-            index=False,
-            table_id="availTable",
-            escape=False # Allows bold tags
+    name = Device.objects.filter(device_id=OuterRef("device_id")).values("name")[:1]
+    return (
+        query.values("device_id")
+        .annotate(successful_attempts=Sum("successful_attempts"), total_attempts=Sum("total_attempts"))
+        .annotate(
+            name=Subquery(name),
+            availability=ExpressionWrapper( # Availability %
+                F("successful_attempts") * 100.0 / NullIf(F("total_attempts"), 0), output_field=FloatField()
+            ),
         )
+        .values("device_id", "name", "successful_attempts", "total_attempts", "availability")
+        .order_by("-availability", "device_id") # Stable order for pagination.
+    )
+
+def addSlo(results: List[dict], end: Optional[datetime] = None) -> List[dict]:
+    """
+    Adds availability and error budget burn rate over each of SLO_WINDOWS ending at end
+    to a page of availabilityQuery rows.
+    The longest window is only summed for the devices on the page, however short the page's own window.
+
+    Args:
+        results (List[dict]): A page of availabilityQuery rows.
+        end (datetime, optional): End of the windows. Defaults to now.
+
+    Returns:
+        List[dict]: The rows with SLO_COLUMNS, devices without rollups in any window get the default target.
+    """
+    if not results:
+        return results
+
+    slo: Dict[int, dict] = {
+        row["device_id"]: row for row in sloQuery(end, [r["device_id"] for r in results])
+    }
+    missing: dict = {"slo_target": getSloTarget(), **{c: None for c in SLO_COLUMNS[1:]}}
+    return [
+        {**r, **{c: slo.get(r["device_id"], missing)[c] for c in SLO_COLUMNS}}
+        for r in results
+    ]
+
+def getIntervalAvail(start: datetime, end: Optional[datetime] = None,
+                     deviceIds: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    Generates device availability over a time window from DeviceInterval.
+    Calculates device availability by
+        time spent up / time observed, within the window.
+    One grouped query sums the overlap of every interval with the window.
+
+    Args:
+        start (datetime): Start of the window.
+        end (datetime, optional): End of the window. Defaults to now.
+        deviceIds (List[int], optional): Only include these devices. Defaults to every device.
+
+    Returns:
+        pandas.DataFrame: One row per device observed during the window.
+    """
+    if end is None:
+        end = timezone.now()
+
+    windowStart = Value(start, output_field=DateTimeField())
+    windowEnd = Value(end, output_field=DateTimeField())
+    overlap = ExpressionWrapper( # Part of each interval inside the window, open intervals run until now.
+        Least(Coalesce("end", windowEnd), windowEnd) - Greatest("start", windowStart),
+        output_field=DurationField(),
+    )
+
+    query = DeviceInterval.objects.filter(start__lt=end).filter(Q(end__isnull=True) | Q(end__gt=start))
+    if deviceIds is not None:
+        query = query.filter(device_id__in=deviceIds)
+
+    query = (
+        query
+        .values("device_id", "device__name")
+        .annotate(UP=Sum(overlap, filter=Q(status=True)), TOTAL=Sum(overlap))
+        .order_by()
+    )
+    df: pd.DataFrame = pd.DataFrame(query)
+
+    if df.empty:
+        return pd.DataFrame(columns=["DEVICE_ID", "DEVICE_NAME", "UP_SECONDS", "TOTAL_SECONDS", "AVAILABILITY"])
+
+    df["UP_SECONDS"] = pd.to_timedelta(df["UP"]).dt.total_seconds().fillna(0) # Never up gives no sum.
+    df["TOTAL_SECONDS"] = df["TOTAL"].dt.total_seconds()
+    df["AVAILABILITY"] = (df["UP_SECONDS"] / df["TOTAL_SECONDS"]) * 100 # Availability %
+
+    df = df.rename(columns={"device_id": "DEVICE_ID", "device__name": "DEVICE_NAME"})
+    df = df[["DEVICE_ID", "DEVICE_NAME", "UP_SECONDS", "TOTAL_SECONDS", "AVAILABILITY"]]
+    return df.sort_values(by="AVAILABILITY", ascending=False) # Rank best performing devices first.
+
+def getTimelineBucket(start: datetime, end: datetime) -> int:
+    """
+    Chooses the System Events Timeline bucket size for a window.
+    The smallest of TIMELINE_BUCKET_SIZES giving at most settings.TIMELINE_MAX_BUCKETS buckets.
+
+    Args:
+        start (datetime): Start of the window.
+        end (datetime): End of the window.
+
+    Returns:
+        int: Bucket size in seconds.
+    """
+    maxBuckets: int = getattr(settings, "TIMELINE_MAX_BUCKETS", 120)
+    span: float = (end - start).total_seconds()
+    for size in TIMELINE_BUCKET_SIZES:
+        if span / size <= maxBuckets:
+            return size
+    return TIMELINE_BUCKET_SIZES[-1]
+
+def getMetricTimeline(since: datetime, end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Generates the System Events Timeline dataset, aggregated into time buckets.
+    Requests are counted per endpoint per minute, hour or day, by the MetricStore
+    and from the rollups retention has downsampled older logs into.
+    These are then merged into buckets of getTimelineBucket, so the number of points
+    depends only on the window and the number of endpoints.
+
+    Args:
+        since (datetime): Start of the window.
+        end (datetime, optional): End of the window. Defaults to now.
+
+    Returns:
+        pandas.DataFrame: The requests, successful requests and success rate per endpoint per bucket.
+    """
+    end = end or timezone.now()
+    size: int = getTimelineBucket(since, end)
+    resolution: int = 86400 if size % 86400 == 0 else 3600 if size % 3600 == 0 else 60
+
+    raw: pd.DataFrame = getMetricStore().countRequests(since, end, resolution)
+    rollups = (
+        SystemMetricRollup.objects
+        .filter(resolution__in=(MINUTE, HOUR), bucket__gte=since, bucket__lt=end)
+        .values("endpoint", slot=TRUNCATIONS[resolution]("bucket"))
+        .annotate(requests=Sum("total_requests"), successful=Sum("successful_requests"))
+        .values_list(*REQUEST_COUNT_COLUMNS)
+        .order_by()
+    )
+    rolled: pd.DataFrame = pd.DataFrame(list(rollups), columns=REQUEST_COUNT_COLUMNS)
+    rolled["slot"] = pd.to_datetime(rolled["slot"], utc=True)
+    df: pd.DataFrame = pd.concat([f for f in (raw, rolled) if not f.empty] or [raw], ignore_index=True)
+
+    if df.empty:
+        return pd.DataFrame(columns=["bucket", "endpoint", "requests", "successful", "success_rate"])
+
+    df["bucket"] = pd.to_datetime(df["slot"], utc=True).dt.floor(f"{size}s") # Merge slots into the chosen bucket.
+    df = df.groupby(["bucket", "endpoint"], as_index=False)[["requests", "successful"]].sum()
+    df["success_rate"] = (df["successful"] / df["requests"]) * 100 # Success %
+    return df.sort_values(by=["bucket", "endpoint"], ignore_index=True)
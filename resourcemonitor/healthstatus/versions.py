@@ -0,0 +1,65 @@
+"""
+This file contains the data versions used to invalidate cached dashboards.
+Versions are stored in the database, so a bump by the collector or a
+retention run is seen by every web process. Request logs are not versioned,
+as each request would otherwise invalidate the dashboards it reads.
+"""
+from healthstatus.database import serializedWrite
+from healthstatus.models import DataVersion
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from datetime import datetime
+from typing import Optional, Tuple
+
+DEVICES: str = "device"
+METRICS: str = "systemmetric"
+
+@serializedWrite
+def bumpVersion(*names: str) -> None:
+    """
+    Mark datasets as changed.
+    Call inside the transaction writing the data, or after the last transaction of a write
+    split into batches, so readers never see the new version without it.
+
+    Args:
+        *names (str): The datasets which changed.
+
+    Returns:
+        None
+    """
+    table: str = connection.ops.quote_name(DataVersion._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"""
+            INSERT INTO {table} (name, version, updated) VALUES (%s, 1, %s)
+            ON CONFLICT (name) DO UPDATE SET version = {table}.version + 1, updated = excluded.updated
+            """,
+            [(name, now) for name in names],
+        )
+
+def getVersions(*names: str) -> Tuple[int, ...]:
+    """
+    The current version of each dataset, 0 if it has never changed.
+
+    Args:
+        *names (str): The datasets to read.
+
+    Returns:
+        Tuple[int, ...]: One version per name, in order.
+    """
+    versions = dict(DataVersion.objects.filter(name__in=names).values_list("name", "version"))
+    return tuple(versions.get(name, 0) for name in names)
+
+def getLastModified(*names: str) -> Optional[datetime]:
+    """
+    When any of the datasets last changed.
+
+    Args:
+        *names (str): The datasets to read.
+
+    Returns:
+        datetime | None: The latest bump, or None if none have changed.
+    """
+    return DataVersion.objects.filter(name__in=names).aggregate(updated=Max("updated"))["updated"]
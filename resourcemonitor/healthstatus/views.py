@@ -1,21 +1,24 @@
 from django.shortcuts import render
-from django.http import JsonResponse, HttpRequest
-import requests
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpRequest, StreamingHttpResponse
+import asyncio
+import json
 import logging
-from healthstatus.models import DeviceStatus, SystemMetric
-import plotly.express as px
-import pandas as pd
-from .utils import generateLog, getDeviceAvail, getAvailTable
-import plotly.graph_objects as go
-from django.utils.safestring import mark_safe
-from typing import List
-import os
+import time
+from .utils import getWindowStart, selectDevices, WINDOWS
+from .collector import getLatestDevices
+from .live import getBroadcaster, StatusBroadcaster
+from typing import AsyncIterator, List, Optional
 
 logger = logging.getLogger(__name__)
 
 def callDeviceService(request: HttpRequest) -> JsonResponse:
     """
-    Fetch devices from Flask API and record response in SQLite.
+    Serve the latest status of every device.
+    Devices are polled by the collector, this view only polls the Flask API
+    itself when no recent poll has been stored.
+    ?status=up|down filters the devices, and ?sort=id|name|status orders them.
 
     Args:
         request (HttpRequest): The HTTP request.
@@ -23,38 +26,99 @@ def callDeviceService(request: HttpRequest) -> JsonResponse:
     Returns:
         JsonResponse: The JSON response containing device data or error information.
     """
-
-    # Determine if Django is running as part of Docker compose or not
-    if os.getenv("RUN_ENV") == "docker":
-        DEVICE_API_URL = "http://network_devices_api:8000/devices" # Address of dependant container.
-    else:
-        DEVICE_API_URL = "http://127.0.0.1:8000/devices" # Fallback for local instances.
-
     try:
-        resp: requests.Response = requests.get(DEVICE_API_URL, timeout=5)
-        resp.raise_for_status()
-        devices: List[dict] = resp.json()
-    
-        for d in devices:
-            DeviceStatus.objects.create(
-                device_id=d["id"],
-                name=d["name"],
-                ip_address=d["ip_address"],
-                status=d["status"],
-            )
-
-        generateLog("/devices", resp.status_code, True) # Store status in DeviceStatus
-
-        logger.info("Stored %d device records", len(devices))
+        devices: List[dict] = selectDevices(getLatestDevices(), request.GET.get("status"), request.GET.get("sort"))
         return JsonResponse(devices, safe=False)
 
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     except Exception as e:
         logger.error("Error fetching device data: %s", e)
-        status = getattr(getattr(e, "response", None), "status_code", 500) # Log none if empty response.
-        generateLog("/devices", status, False) # Record error in SystemMetric
         return JsonResponse({"error": str(e)}, status=500)
 
 
+def formatEvent(event: str, devices: List[dict]) -> str:
+    """
+    Format a message in the Server-Sent Events wire format.
+
+    Args:
+        event (str): The event name.
+        devices (List[dict]): The device records sent as the event data.
+
+    Returns:
+        str: The encoded event.
+    """
+    return f"event: {event}\ndata: {json.dumps(devices, separators=(',', ':'))}\n\n"
+
+
+async def streamEvents(broadcaster: StatusBroadcaster, queue: asyncio.Queue, snapshot: List[dict],
+                       status: Optional[str] = None, sort: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Stream a snapshot of the selected devices, then each change published to queue.
+    Every snapshot, including those resent to a subscriber which fell behind,
+    is filtered and sorted with selectDevices.
+    Streams end after LIVE_STREAM_LIFETIME and the browser reconnects,
+    so a client which disconnected unnoticed is only held on to for that long.
+
+    Args:
+        broadcaster (StatusBroadcaster): The broadcaster queue is subscribed to.
+        queue (asyncio.Queue): The client's subscription.
+        snapshot (List[dict]): Every device at the time of subscribing.
+        status (str, optional): A key of DEVICE_STATUSES to keep in snapshots, or None for every device.
+        sort (str, optional): A key of DEVICE_SORTS to order snapshots by, or None to keep id order.
+
+    Returns:
+        AsyncIterator[str]: The encoded events.
+    """
+    keepAlive: float = getattr(settings, "LIVE_KEEPALIVE", 15)
+    closes: float = time.monotonic() + getattr(settings, "LIVE_STREAM_LIFETIME", 300)
+    try:
+        yield "retry: 1000\n" + formatEvent("snapshot", selectDevices(snapshot, status, sort))
+        while (remaining := closes - time.monotonic()) > 0:
+            try:
+                event, devices = await asyncio.wait_for(queue.get(), min(keepAlive, remaining))
+                if event == "snapshot":
+                    devices = selectDevices(devices, status, sort)
+                yield formatEvent(event, devices)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n" # Stops proxies closing an idle connection.
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+async def liveDevices(request: HttpRequest) -> StreamingHttpResponse:
+    """
+    Push device status changes to the client as Server-Sent Events.
+    Clients share one broadcaster per process, so connected tabs add no polling.
+    Needs the ASGI server, a WSGI worker would be held by each client.
+    The snapshot takes the same ?status and ?sort as /devices, changes are sent for
+    every device so the client can tell when one leaves its filter.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        StreamingHttpResponse: The event stream, or a 501 error under WSGI.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Live updates are only served by the ASGI application."}, status=501)
+
+    status, sort = request.GET.get("status"), request.GET.get("sort")
+    try:
+        selectDevices([], status, sort)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    broadcaster: StatusBroadcaster = getBroadcaster()
+    queue, snapshot = await broadcaster.subscribe()
+    return StreamingHttpResponse(
+        streamEvents(broadcaster, queue, snapshot, status, sort),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Deliver each event as it is sent.
+    )
+
+
 def frontEnd(request: HttpRequest) -> JsonResponse:
     """
     Serve the front end to the client.
@@ -65,47 +129,28 @@ def frontEnd(request: HttpRequest) -> JsonResponse:
     Returns:
         JsonResponse: The JSON response containing device data or error information.
     """
-    generateLog("/index", 200, True) # Record serve in SystemMetric
     return render(request, "devices.html") # Devices page connects to API seperately to allow updates without refresh.
 
 
 def metricsDashboard(request: HttpRequest) -> render:
     """
-    Generate and Display Metrics Dashboard.
-    Using Plotly.
+    Serve the Metrics Dashboard.
+    The page is a shell, its table and Plotly chart are loaded from the JSON metrics API.
+    The ?window= parameter selects the time window shown (1h, 24h or 7d).
 
     Args:
         request (HttpRequest): The HTTP request.
 
     Returns:
-        render: Rendered Plotly dashboard.
+        render: Rendered dashboard shell.
     """
-    generateLog('/metrics', 200, True)
-
-    tablehtml: str = getAvailTable()
-
-    # System Metrics Timeline
-    statsDF: pd.DataFrame = pd.DataFrame(list(SystemMetric.objects.values()))
-    if not statsDF.empty:
-        statsDF["timestamp"] = pd.to_datetime(statsDF["timestamp"])
-        sys_fig: go.Figure = px.scatter(
-            statsDF,
-            x="timestamp",
-            y="endpoint",
-            color="success",
-            symbol="success",
-            title="System Events Timeline",
-        )
-        sys_fig.update_layout(height=250, margin=dict(l=10, r=10, t=40, b=10))
-        sys_html: str = sys_fig.to_html(full_html=False)
-    else:
-        sys_html: str = "<p>No system metrics yet</p>"
+    window, _ = getWindowStart(request.GET.get("window"))
 
     return render(
         request,
         "metrics.html",
         {
-            "table": mark_safe(tablehtml), # pass HTML table through to template.
-            "system_chart": mark_safe(sys_html), # pass timeline to template.
+            "window": window,
+            "windows": list(WINDOWS),
         },
-    )
\ No newline at end of file
+    )
@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'healthstatus.middleware.RequestMetricsMiddleware', # First, so its timing covers every other middleware.
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,10 +79,141 @@ WSGI_APPLICATION = 'resourcemonitor.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('RESOURCEMONITOR_DB', BASE_DIR / 'db.sqlite3'), # Overridden by the end-to-end benchmark.
+        'OPTIONS': {
+            'timeout': 20, # Seconds to wait for the write lock before "database is locked".
+        },
+    }
+}
+
+# Pragmas set on every new SQLite connection.
+#   journal_mode WAL lets readers and the writer run concurrently (it persists in the database file),
+#   synchronous NORMAL only syncs at checkpoints, which is safe with WAL,
+#   cache_size (negative is KiB) and mmap_size keep hot pages in memory, temp_store keeps sorts off disk.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+# Run every device and request log write of a process on a single writer thread (SQLite only).
+SQLITE_SINGLE_WRITER = True
+
+# Number of DeviceStatus rows written per INSERT when storing a poll.
+DEVICE_INGEST_BATCH_SIZE = 500
+
+# How device history is stored:
+#   "samples" writes a sample to the SampleStore (see TIMESERIES_BACKEND) per status change,
+#   "intervals" writes a DeviceInterval per status change instead.
+# Every collector mode stores only new devices and status changes.
+DEVICE_STORAGE_MODE = "samples"
+
+# Where device samples are stored (see healthstatus.storage):
+#   "healthstatus.storage.OrmSampleStore" keeps them in the DeviceStatus table,
+#   "healthstatus.storage.ParquetSampleStore" appends them to Parquet files, with TIMESERIES_OPTIONS = {"root": BASE_DIR / "timeseries"}.
+TIMESERIES_BACKEND = "healthstatus.storage.OrmSampleStore"
+TIMESERIES_OPTIONS = {}
+
+# Where request logs are stored (see healthstatus.storage):
+#   "healthstatus.storage.OrmMetricStore" keeps them in the SystemMetric table,
+#   "healthstatus.storage.ParquetMetricStore" appends them to Parquet files, with TIMESERIES_METRIC_OPTIONS = {"root": BASE_DIR / "metrics"}.
+TIMESERIES_METRIC_BACKEND = "healthstatus.storage.OrmMetricStore"
+TIMESERIES_METRIC_OPTIONS = {}
+
+# Seconds between polls made by the collect_devices management command.
+DEVICE_POLL_INTERVAL = 5
+
+# How collect_devices polls the API:
+#   "delta" fetches only changed devices and stores state transitions,
+#   "bitset" fetches one bit per device, with the device list only when it changes, and stores state transitions,
+#   "stream" and "per-device" fetch every device on every poll, and also store only state transitions.
+DEVICE_COLLECTOR_MODE = "delta"
+
+# Maximum requests in flight, and seconds to wait per device, when polling each device separately.
+# Requests go through the shared client below, so at most DEVICE_API_POOL_SIZE are in flight.
+DEVICE_POLL_CONCURRENCY = 10
+DEVICE_POLL_TIMEOUT = 2.0
+
+# URL of the Flask /devices endpoint, resolved from RUN_ENV when not set.
+DEVICE_API_URL = os.getenv("DEVICE_API_URL")
+
+# The shared client used to reach the device API:
+#   DEVICE_API_POOL_SIZE: keep-alive connections held open per process,
+#   DEVICE_API_RETRIES / DEVICE_API_BACKOFF: retries of failed connections and 502/503/504 responses, and seconds before the first,
+#   DEVICE_API_TIMEOUT: seconds to wait for a response,
+#   DEVICE_API_BREAKER_THRESHOLD / DEVICE_API_BREAKER_RESET: failures in a row which stop requests, and seconds until one is tried again.
+DEVICE_API_POOL_SIZE = 10
+DEVICE_API_RETRIES = 2
+DEVICE_API_BACKOFF = 0.2
+DEVICE_API_TIMEOUT = 5.0
+DEVICE_API_BREAKER_THRESHOLD = 5
+DEVICE_API_BREAKER_RESET = 30
+
+# Seconds after which the stored device snapshot is stale and /devices polls the API itself.
+DEVICE_SNAPSHOT_MAX_AGE = 15
+
+# Seconds each process reuses the snapshot before reading it from the database again.
+DEVICE_SNAPSHOT_REFRESH = 1
+
+# How long each tier of history is kept by the apply_retention command (None keeps it forever).
+#   RAW: device samples and request logs, request logs are then kept as 1 minute rollups,
+#   MINUTE: 1 minute request rollups, after which they are kept as hourly rollups,
+#   INTERVALS: closed device status intervals,
+#   HOURLY: hourly device availability and request rollups.
+HISTORY_RETENTION = {
+    "RAW": timedelta(hours=24),
+    "MINUTE": timedelta(days=30),
+    "INTERVALS": timedelta(days=90),
+    "HOURLY": None,
+}
+
+# Maximum rows apply_retention processes in each transaction.
+RETENTION_BATCH_SIZE = 5000
+
+# SystemMetric logs are buffered in memory and written by a background thread.
+#   METRIC_BUFFER_SIZE: maximum logs held in memory (0 writes each log during the request),
+#   METRIC_BATCH_SIZE / METRIC_FLUSH_INTERVAL: a batch is written when this many logs or seconds are reached,
+#   METRIC_DROP_POLICY: when the buffer is full, drop the "newest" log or the "oldest" buffered log.
+METRIC_BUFFER_SIZE = 10000
+METRIC_BATCH_SIZE = 500
+METRIC_FLUSH_INTERVAL = 1.0
+METRIC_DROP_POLICY = "newest"
+
+# Seconds of request latency aggregated into each RequestLatency histogram.
+LATENCY_FLUSH_INTERVAL = 60
+
+# JSON payloads of the metrics API are cached per process, keyed by the data versions in their ETag,
+# so new data is never served stale. The dashboard page itself is a static shell which fetches them.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "healthstatus",
     }
 }
 
+# Upper bound in seconds on how long a cached metrics API payload is kept.
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# Seconds the System Events Timeline is cached for before new request logs are shown.
+TIMELINE_REFRESH = 10
+
+# Maximum time buckets per endpoint on the System Events Timeline, bucket sizes are chosen to fit.
+TIMELINE_MAX_BUCKETS = 120
+
+# Availability % devices are expected to meet over each SLO window (1h, 24h and 30d),
+# unless set per device with the set_slo_target command. Error budget burn rates are measured against it.
+AVAILABILITY_SLO_TARGET = 99.9
+
+# Live device status pushed over /devices/live (served by the ASGI application only).
+#   LIVE_POLL_INTERVAL: seconds between checks for a newly stored poll, shared by every client of a process,
+#   LIVE_KEEPALIVE: seconds of silence before a keep-alive comment is sent,
+#   LIVE_STREAM_LIFETIME: seconds before a stream is ended and the browser reconnects.
+LIVE_POLL_INTERVAL = 1.0
+LIVE_KEEPALIVE = 15
+LIVE_STREAM_LIFETIME = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators